@@ -0,0 +1,218 @@
+# app/analytics.py
+from datetime import date
+from typing import List, Optional
+
+# Daily rollup of Chat_Messages, Price and Feedback per (day, group_name, category, source).
+# Rows are bucketed by the message they belong to: a price or rating always lands in the bucket
+# of its message's day, its user's group and its category. Messages without a group or category
+# are kept under '' (key columns cannot be NULL). When a message's category or its user's group
+# changes later, its whole contribution is moved (recategorize, regroup_user).
+ROLLUP_TABLE = """
+    CREATE TABLE IF NOT EXISTS Analytics_Daily (
+        day DATE NOT NULL,
+        group_name VARCHAR(255) NOT NULL DEFAULT '',
+        category VARCHAR(255) NOT NULL DEFAULT '',
+        source VARCHAR(16) NOT NULL,
+        message_count INT NOT NULL DEFAULT 0,
+        prompt_tokens BIGINT NOT NULL DEFAULT 0,
+        completion_tokens BIGINT NOT NULL DEFAULT 0,
+        cost DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        rating_sum INT NOT NULL DEFAULT 0,
+        rating_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, group_name, category, source)
+    )
+"""
+
+_KEY = "day, group_name, category, source"
+_MEASURES = "message_count, prompt_tokens, completion_tokens, cost, rating_sum, rating_count"
+
+# Target columns are qualified: Price has columns of the same name in the SELECT
+_UPSERT = f"""
+    INSERT INTO Analytics_Daily ({_KEY}, {_MEASURES})
+    {{select}}
+    ON DUPLICATE KEY UPDATE
+        Analytics_Daily.message_count = Analytics_Daily.message_count + VALUES(message_count),
+        Analytics_Daily.prompt_tokens = Analytics_Daily.prompt_tokens + VALUES(prompt_tokens),
+        Analytics_Daily.completion_tokens = Analytics_Daily.completion_tokens + VALUES(completion_tokens),
+        Analytics_Daily.cost = Analytics_Daily.cost + VALUES(cost),
+        Analytics_Daily.rating_sum = Analytics_Daily.rating_sum + VALUES(rating_sum),
+        Analytics_Daily.rating_count = Analytics_Daily.rating_count + VALUES(rating_count)
+"""
+
+# Every contribution in one statement is summed per bucket and applied in primary key order,
+# so concurrent writers updating the same hot buckets lock them in the same order
+_ORDERED = f"""
+    SELECT {_KEY}, SUM(message_count), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost), SUM(rating_sum), SUM(rating_count)
+    FROM ({{deltas}}) AS deltas
+    GROUP BY {_KEY} ORDER BY {_KEY}
+"""
+
+_BUCKET = "DATE(m.created_at) AS day, COALESCE(u.group_name, '') AS group_name, COALESCE(m.category, '') AS category, m.source AS source"
+_GROUP = "GROUP BY DATE(m.created_at), COALESCE(u.group_name, ''), COALESCE(m.category, ''), m.source"
+
+# Contribution of each table to a bucket, multiplied by {sign} (+1 to add, -1 to take out)
+_MESSAGES = f"""
+    SELECT {_BUCKET}, {{sign}} * COUNT(*) AS message_count, 0 AS prompt_tokens, 0 AS completion_tokens,
+        0 AS cost, 0 AS rating_sum, 0 AS rating_count
+    FROM Chat_Messages m LEFT JOIN Users u ON u.user_id = m.user_id
+    WHERE {{where}} {_GROUP}
+"""
+_PRICES = f"""
+    SELECT {_BUCKET}, 0 AS message_count, {{sign}} * COALESCE(SUM(p.prompt_tokens), 0) AS prompt_tokens,
+        {{sign}} * COALESCE(SUM(p.completion_tokens), 0) AS completion_tokens, {{sign}} * SUM(p.completion_price) AS cost,
+        0 AS rating_sum, 0 AS rating_count
+    FROM Price p JOIN Chat_Messages m ON m.message_id = p.message_id LEFT JOIN Users u ON u.user_id = m.user_id
+    WHERE {{where}} {_GROUP}
+"""
+_FEEDBACK = f"""
+    SELECT {_BUCKET}, 0 AS message_count, 0 AS prompt_tokens, 0 AS completion_tokens, 0 AS cost,
+        {{sign}} * COALESCE(SUM(f.rating), 0) AS rating_sum, {{sign}} * COUNT(f.rating) AS rating_count
+    FROM Feedback f JOIN Chat_Messages m ON m.message_id = f.message_id LEFT JOIN Users u ON u.user_id = m.user_id
+    WHERE {{where}} {_GROUP}
+"""
+
+
+def _in(column: str, ids: List[str]) -> str:
+    return f"{column} IN ({', '.join(['%s'] * len(ids))})"
+
+
+def _upsert_query(parts, sign: int = 1):
+    # parts: (select, where, values) per contribution. Returns one ordered upsert, or None if empty.
+    parts = [(select, where, values) for select, where, values in parts if values]
+    if not parts:
+        return None, ()
+    deltas = " UNION ALL ".join(select.format(sign=sign, where=where) for select, where, _ in parts)
+    values = tuple(value for _, _, part_values in parts for value in part_values)
+    return _UPSERT.format(select=_ORDERED.format(deltas=deltas)), values
+
+
+def _apply(cursor, parts, sign: int = 1):
+    query, values = _upsert_query(parts, sign)
+    if query is not None:
+        cursor.execute(query, values)
+
+
+# Incremental updates. Each runs inside the transaction that wrote the rows, so the rollup
+# never drifts from the base tables.
+def add_rows(cursor, message_ids: List[str] = (), price_ids: List[str] = (), feedback_ids: List[str] = ()):
+    _apply(cursor, [
+        (_MESSAGES, _in("m.message_id", message_ids), list(message_ids)),
+        (_PRICES, _in("p.price_id", price_ids), list(price_ids)),
+        (_FEEDBACK, _in("f.feedback_id", feedback_ids), list(feedback_ids)),
+    ])
+
+
+def add_messages(cursor, message_ids: List[str]):
+    add_rows(cursor, message_ids=message_ids)
+
+
+def add_prices(cursor, price_ids: List[str]):
+    add_rows(cursor, price_ids=price_ids)
+
+
+def add_feedback(cursor, feedback_ids: List[str]):
+    add_rows(cursor, feedback_ids=feedback_ids)
+
+
+def _whole_messages(where: str, values: List[str]):
+    # Everything counted for a set of messages: the messages, their prices and their ratings
+    return [(_MESSAGES, where, values), (_PRICES, where, values), (_FEEDBACK, where, values)]
+
+
+def recategorize(cursor, categories: dict):
+    # Moves whole messages (count, prices, ratings) from their current bucket to the bucket of
+    # their new category. The messages are locked first so a price or rating committed for them
+    # concurrently is either already counted in the old bucket or waits and lands in the new one.
+    message_ids = list(categories)
+    placeholders = ", ".join(["%s"] * len(message_ids))
+    cursor.execute(f"SELECT message_id FROM Chat_Messages WHERE message_id IN ({placeholders}) FOR UPDATE", tuple(message_ids))
+    cursor.fetchall()
+    _apply(cursor, _whole_messages(_in("m.message_id", message_ids), message_ids), sign=-1)
+
+    cases = " ".join("WHEN %s THEN %s" for _ in categories)
+    values = [value for item in categories.items() for value in item] + message_ids
+    cursor.execute(f"""
+        UPDATE Chat_Messages
+        SET category = CASE message_id {cases} END
+        WHERE message_id IN ({placeholders})
+    """, tuple(values))
+
+    _apply(cursor, _whole_messages(_in("m.message_id", message_ids), message_ids))
+
+
+def regroup_user(cursor, user_id: str, group_name: str) -> bool:
+    # Sets the group of a user who had none and moves everything already counted for their
+    # messages out of the '' group. The user row is locked first: new messages (foreign key) and
+    # rollups reading the group wait for it, so they land in the new group.
+    cursor.execute("SELECT group_name FROM Users WHERE user_id = %s FOR UPDATE", (user_id,))
+    row = cursor.fetchone()
+    if row is None or row[0]:
+        # Unknown user, or another login assigned the group first
+        return False
+    _apply(cursor, _whole_messages("m.user_id = %s", [user_id]), sign=-1)
+    cursor.execute("UPDATE Users SET group_name = %s WHERE user_id = %s", (group_name, user_id))
+    _apply(cursor, _whole_messages("m.user_id = %s", [user_id]))
+    return True
+
+
+def backfill(cursor):
+    # One-time load of the history that predates the rollup (run by the schema migration)
+    cursor.execute("DELETE FROM Analytics_Daily")
+    for select in (_MESSAGES, _PRICES, _FEEDBACK):
+        cursor.execute(_UPSERT.format(select=select.format(sign=1, where="1 = 1")))
+
+
+# Read side used by the /analytics router
+DIMENSIONS = ("day", "group_name", "category", "source")
+
+
+def _filters(start: Optional[date], end: Optional[date], group_name: Optional[str], category: Optional[str], source: Optional[str]):
+    clauses, values = [], []
+    if start is not None:
+        clauses.append("day >= %s")
+        values.append(start)
+    if end is not None:
+        clauses.append("day <= %s")
+        values.append(end)
+    for column, value in (("group_name", group_name), ("category", category), ("source", source)):
+        if value is not None:
+            clauses.append(f"{column} = %s")
+            values.append(value)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", tuple(values)
+
+
+def summary_query(by: List[str], start=None, end=None, group_name=None, category=None, source=None):
+    # Totals over the date range, grouped by any subset of DIMENSIONS (none means one grand total)
+    unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {', '.join(unknown)}; expected any of {', '.join(DIMENSIONS)}")
+    where, values = _filters(start, end, group_name, category, source)
+    columns = "".join(f"{dimension}, " for dimension in by)
+    group = f"GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}" if by else ""
+    query = f"""
+        SELECT {columns}SUM(message_count), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost), SUM(rating_sum), SUM(rating_count)
+        FROM Analytics_Daily
+        {where}
+        {group}
+    """
+    return query, values
+
+
+def summary_rows(by: List[str], rows) -> List[dict]:
+    results = []
+    for row in rows:
+        keys, (messages, prompt_tokens, completion_tokens, cost, rating_sum, rating_count) = row[:len(by)], row[len(by):]
+        if messages is None:
+            # SUM over no rows
+            continue
+        item = {dimension: (value if value != "" else None) for dimension, value in zip(by, keys)}
+        item.update({
+            "message_count": int(messages),
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "cost": float(cost),
+            "rating_count": int(rating_count),
+            "average_rating": round(float(rating_sum) / int(rating_count), 3) if rating_count else None,
+        })
+        results.append(item)
+    return results
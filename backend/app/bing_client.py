@@ -0,0 +1,132 @@
+# app/bing_client.py
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import httpx
+from config import Config
+
+logger = logging.getLogger("bing_client")
+
+_TAG = re.compile(r"<[^>]*>")
+
+
+def strip_html(text: str) -> str:
+    # Snippets only carry inline markup (<b>, entities), a regex is enough
+    return html.unescape(_TAG.sub("", text or ""))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class BingClient:
+    # Non-blocking Bing Web Search client on a pooled httpx client. Results are cached per
+    # normalized query for BING_CACHE_TTL seconds, and identical queries in flight at the
+    # same time share one upstream request.
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl or Config.BING_CACHE_TTL
+        self.max_entries = max_entries or Config.BING_CACHE_MAX_ENTRIES
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=Config.BING_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(Config.BING_TIMEOUT),
+        )
+        self._cache = OrderedDict()  # (query, count) -> (fetched at, results)
+        self._in_flight = {}
+
+        # Counters exposed through stats()
+        self._hits = 0
+        self._misses = 0
+        self._upstream_requests = 0
+        self._upstream_errors = 0
+        self._upstream_seconds = 0.0
+        self._upstream_max_seconds = 0.0
+
+    async def _fetch(self, query: str, count: int) -> List[dict]:
+        started = time.perf_counter()
+        self._upstream_requests += 1
+        try:
+            response = await self._http.get(
+                Config.BING_SEARCH_ENDPOINT,
+                headers={"Ocp-Apim-Subscription-Key": Config.BING_SEARCH_API_KEY},
+                params={"q": query, "count": count, "textDecorations": False, "textFormat": "Raw"},
+            )
+            response.raise_for_status()
+        except Exception:
+            self._upstream_errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._upstream_seconds += elapsed
+            self._upstream_max_seconds = max(self._upstream_max_seconds, elapsed)
+
+        pages = response.json().get("webPages", {}).get("value", [])
+        return [
+            {"title": strip_html(page.get("name")), "link": page.get("url", ""), "snippet": strip_html(page.get("snippet"))}
+            for page in pages[:count]
+        ]
+
+    async def search(self, query: str, count: int = 3) -> List[dict]:
+        key = (normalize_query(query), count)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] <= self.ttl:
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return cached[1]
+        self._misses += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(query, count))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        results = await asyncio.shield(task)
+
+        self._cache[key] = (time.monotonic(), results)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return results
+
+    async def warm(self):
+        # Opens a pooled connection to the Bing endpoint without running (and paying for) a search
+        await self._http.head(Config.BING_SEARCH_ENDPOINT)
+
+    async def close(self):
+        await self._http.aclose()
+
+    def stats(self):
+        lookups = self._hits + self._misses
+        return {
+            "cache_entries": len(self._cache),
+            "cache_hits": self._hits,
+            "cache_misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "upstream_requests": self._upstream_requests,
+            "upstream_errors": self._upstream_errors,
+            "upstream_avg_ms": round(1000 * self._upstream_seconds / self._upstream_requests, 2) if self._upstream_requests else 0.0,
+            "upstream_max_ms": round(1000 * self._upstream_max_seconds, 2),
+        }
+
+
+# Process-wide client, created on first use and closed on shutdown
+_client: Optional[BingClient] = None
+
+
+def get_bing_client() -> BingClient:
+    global _client
+    if _client is None:
+        _client = BingClient()
+    return _client
+
+
+async def close_bing_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        logger.info("Bing client closed.")
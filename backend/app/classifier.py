@@ -0,0 +1,264 @@
+# app/classifier.py
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import List, Optional
+from config import Config
+from utils import create_azure_client
+from app import analytics
+
+logger = logging.getLogger("classifier")
+
+CATEGORIES = [
+    "Text Summarization",
+    "Creative Content Generation",
+    "Language Translation",
+    "Technical Dialogue",
+    "General Knowledge",
+]
+DEFAULT_CATEGORY = "General Knowledge"
+# Given to messages the LLM failed to classify CLASSIFIER_MAX_ATTEMPTS times, so they stop
+# blocking the newer messages behind them
+FALLBACK_CATEGORY = "Other"
+
+# Keyword rules for the local fast path: (pattern, weight) per category
+KEYWORD_RULES = {
+    "Text Summarization": [
+        (r"\bsummari[sz]e\b|\bsummary\b|\btl;?dr\b", 2),
+        (r"\bkey (points|takeaways)\b|\brecap\b|\bcondense\b|\bshorten\b", 2),
+        (r"\bbrief(ly)?\b|\boverview\b|\bmain ideas?\b", 1),
+    ],
+    "Creative Content Generation": [
+        (r"\b(poem|story|lyrics|slogan|tagline|haiku|limerick|jingle)\b", 2),
+        (r"\b(write|draft|compose|create)\b.*\b(email|letter|blog|post|speech|announcement|article|essay|invitation)\b", 2),
+        (r"\bbrainstorm\b|\bcreative\b|\bcatchy\b", 1),
+    ],
+    "Language Translation": [
+        (r"\btranslat(e|ion|ing)\b", 2),
+        (r"\b(in|into|to) (english|spanish|french|german|chinese|japanese|korean|portuguese|italian|arabic|hindi|russian)\b", 1),
+    ],
+    "Technical Dialogue": [
+        # Lookarounds instead of \b, which cannot match after the + and # in c++ and c#
+        (r"(?<![\w+#])(python|javascript|typescript|java|sql|c\+\+|c#|bash|powershell|regex|docker|kubernetes|react|fastapi)(?![\w+#])", 2),
+        (r"\b(code|function|class|api|debug|bug|error|exception|stack ?trace|compile|deploy|algorithm|database|query)\b", 1),
+        (r"```", 2),
+    ],
+    "General Knowledge": [
+        (r"^(what|who|when|where|why|how) (is|are|was|were|did|does)\b", 1),
+        (r"\b(define|definition|meaning of|history of|explain)\b", 1),
+    ],
+}
+_COMPILED_RULES = {
+    category: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for category, rules in KEYWORD_RULES.items()
+}
+
+
+def keyword_category(message: str, min_score: int = None) -> Optional[str]:
+    # Return a category only when one category clearly wins on keyword score
+    min_score = min_score or Config.CLASSIFIER_MIN_KEYWORD_SCORE
+    text = message.strip()
+    scores = {
+        category: sum(weight for pattern, weight in rules if pattern.search(text))
+        for category, rules in _COMPILED_RULES.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+    if best_score >= min_score and best_score > runner_up:
+        return best
+    return None
+
+
+def _normalize_category(value) -> str:
+    if isinstance(value, str):
+        cleaned = value.strip().strip(".").lower()
+        for category in CATEGORIES:
+            if category.lower() == cleaned:
+                return category
+    return DEFAULT_CATEGORY
+
+
+def _parse_categories(content: str) -> List:
+    # The model is asked for a bare JSON array but may wrap it in a code fence
+    start, end = content.find("["), content.rfind("]")
+    if start == -1 or end == -1:
+        raise ValueError("No JSON array in classification response")
+    return json.loads(content[start:end + 1])
+
+
+# Messages being classified are claimed in Classifier_Claims, so the named lock is held only while
+# rows are claimed or results written, never across the LLM call. A claim expires after
+# CLASSIFIER_CLAIM_TTL, so the rows of a worker that died are picked up again; attempts counts the
+# failed LLM calls per message across all workers.
+def claim_rows(cursor, limit: int, ttl: int) -> List[tuple]:
+    cursor.execute("""
+        SELECT m.message_id, m.user_prompt, COALESCE(c.attempts, 0)
+        FROM Chat_Messages m LEFT JOIN Classifier_Claims c ON c.message_id = m.message_id
+        WHERE m.category IS NULL AND (c.message_id IS NULL OR c.claimed_until < NOW())
+        ORDER BY m.created_at
+        LIMIT %s
+    """, (limit,))
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany("""
+            INSERT INTO Classifier_Claims (message_id, claimed_until) VALUES (%s, NOW() + INTERVAL %s SECOND)
+            ON DUPLICATE KEY UPDATE claimed_until = VALUES(claimed_until)
+        """, [(message_id, ttl) for message_id, _, _ in rows])
+    return rows
+
+
+def write_categories(cursor, results: dict):
+    # Single UPDATE for the whole batch, moving the messages' analytics rollup along with it
+    analytics.recategorize(cursor, results)
+    cursor.executemany("DELETE FROM Classifier_Claims WHERE message_id = %s", [(message_id,) for message_id in results])
+
+
+def release_rows(cursor, message_ids: List[str]):
+    # After a failed LLM call the rows can be claimed again right away, one attempt later
+    cursor.executemany(
+        "UPDATE Classifier_Claims SET claimed_until = NOW() - INTERVAL 1 SECOND, attempts = attempts + 1 WHERE message_id = %s",
+        [(message_id,) for message_id in message_ids],
+    )
+
+
+class MessageClassifier:
+    # Background worker that categorizes Chat_Messages rows with no category yet. Confident
+    # keyword matches skip the LLM; the rest are classified together in one completion call.
+
+    def __init__(self, db, interval: float = None, batch_size: int = None):
+        self.db = db
+        self.interval = interval or Config.CLASSIFIER_INTERVAL
+        self.batch_size = batch_size or Config.CLASSIFIER_BATCH_SIZE
+        self._task = None
+        self._lock_name = f"{Config.MY_SQL_DB}.classifier"
+
+        # Counters exposed through stats()
+        self._fast_path = 0
+        self._fallbacks = 0
+        self._skipped_cycles = 0
+        self._llm_classified = 0
+        self._llm_calls = 0
+        self._failures = 0
+        self._last_batch = 0.0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info("Message classifier started (interval=%ss, batch_size=%s).", self.interval, self.batch_size)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Message classifier stopped.")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.classify_pending()
+            except Exception as e:
+                self._failures += 1
+                logger.error("Error classifying pending messages: %s", str(e))
+            await asyncio.sleep(self.interval)
+
+    async def classify_pending(self):
+        # Every worker process runs this loop; rows are claimed under a MySQL named lock, so no
+        # two workers send the same rows to the LLM (or recategorize them twice)
+        acquired, rows = await self.db.run_with_lock(
+            self._lock_name, lambda cursor: claim_rows(cursor, self.batch_size, Config.CLASSIFIER_CLAIM_TTL)
+        )
+        if not acquired:
+            self._skipped_cycles += 1
+            return
+        if rows:
+            await self._classify_batch(rows)
+
+    async def _classify_batch(self, rows):
+        started = time.perf_counter()
+        results = {}
+        pending = []
+        for message_id, user_prompt, attempts in rows:
+            category = keyword_category(user_prompt)
+            if category:
+                results[message_id] = category
+                self._fast_path += 1
+            elif attempts >= Config.CLASSIFIER_MAX_ATTEMPTS:
+                results[message_id] = FALLBACK_CATEGORY
+                self._fallbacks += 1
+            else:
+                pending.append((message_id, user_prompt))
+
+        # Written before the LLM call so a failing call cannot lose them
+        if results:
+            await self._locked(lambda cursor: write_categories(cursor, results))
+
+        classified = {}
+        if pending:
+            try:
+                categories = await self._classify_with_llm([prompt for _, prompt in pending])
+            except Exception:
+                try:
+                    await self._locked(lambda cursor: release_rows(cursor, [message_id for message_id, _ in pending]))
+                except Exception as e:
+                    # The claims expire on their own; the attempt is just not counted
+                    logger.error("Error releasing classifier claims: %s", str(e))
+                raise
+            classified = {message_id: _normalize_category(category) for (message_id, _), category in zip(pending, categories)}
+            self._llm_classified += len(classified)
+            await self._locked(lambda cursor: write_categories(cursor, classified))
+
+        self._last_batch = time.perf_counter() - started
+        logger.info("Classified %s messages (%s via LLM).", len(results) + len(classified), len(classified))
+
+    async def _locked(self, work):
+        # Results are written under the same lock as claims; waits for a claim in progress
+        acquired, result = await self.db.run_with_lock(self._lock_name, work, Config.CLASSIFIER_LOCK_TIMEOUT)
+        if not acquired:
+            raise TimeoutError(f"Timed out after {Config.CLASSIFIER_LOCK_TIMEOUT}s waiting for the classifier lock")
+        return result
+
+    async def _classify_with_llm(self, messages: List[str]) -> List:
+        # Prompts are truncated so one batch stays well inside the context window
+        numbered = "\n".join(f"{index + 1}. {json.dumps(message[:500])}" for index, message in enumerate(messages))
+        classification_prompt = f"""
+        Classify each of the following messages into one of the following categories:
+        {chr(10).join(f"- {category}" for category in CATEGORIES)}
+
+        Return only a JSON array of {len(messages)} category names, in the same order as the messages.
+
+        Messages:
+        {numbered}
+        """
+
+        classify_completion = create_azure_client(streaming=False, temperature=0.0)
+        response = await classify_completion(messages=[
+            {"role": "system", "content": "Classify the messages into the predefined categories."},
+            {"role": "user", "content": classification_prompt}
+        ])
+        self._llm_calls += 1
+
+        if not response or not response.choices:
+            raise ValueError("Empty classification response")
+        categories = _parse_categories(response.choices[0].message.content)
+        if len(categories) != len(messages):
+            # Categories are matched to messages by position, so a short or padded answer cannot be
+            # trusted at all; the whole batch counts as a failed attempt and is claimed again
+            raise ValueError(f"Classifier returned {len(categories)} categories for {len(messages)} messages")
+        return categories
+
+    def stats(self):
+        return {
+            "fast_path": self._fast_path,
+            "llm_classified": self._llm_classified,
+            "llm_calls": self._llm_calls,
+            "failures": self._failures,
+            "fallbacks": self._fallbacks,
+            "skipped_cycles": self._skipped_cycles,
+            "last_batch_ms": round(self._last_batch * 1000, 3),
+        }
@@ -0,0 +1,126 @@
+# app/context_builder.py
+import asyncio
+import logging
+from typing import List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from config import Config
+from app.token_accounting import count_tokens
+
+logger = logging.getLogger("context_builder")
+
+# Running totals exposed through stats()
+_totals = {"requests": 0, "tokens_before": 0, "tokens_after": 0, "duplicates_removed": 0, "chunks_merged": 0}
+
+
+def _mmr_order(query_vector: np.ndarray, vectors: np.ndarray, lambda_mult: float, dedup_threshold: float) -> Tuple[List[int], int]:
+    # Maximal marginal relevance over the candidates; near-duplicates of an already chosen
+    # chunk are dropped instead of just being pushed down the order.
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+    remaining = list(range(len(vectors)))
+    order, duplicates = [], 0
+    while remaining:
+        if order:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = int(np.argmax(scores))
+        candidate = remaining.pop(best)
+        if order and redundancy[best] >= dedup_threshold:
+            duplicates += 1
+            continue
+        order.append(candidate)
+    return order, duplicates
+
+
+def _merge_adjacent(docs: List[Document]) -> Tuple[List[Document], int]:
+    # Chunks of the same page that overlap (per the splitter's start_index) become one chunk,
+    # so the shared overlap is sent once. Merged chunks take the place of the first piece.
+    merged, merges = [], 0
+    spans = {}  # (source, page) -> [[position in merged, start, end], ...]
+    for doc in docs:
+        start = doc.metadata.get("start_index")
+        if start is None:
+            merged.append(doc)
+            continue
+        end = start + len(doc.page_content)
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        span = next((span for span in spans.get(key, []) if start <= span[2] and end >= span[1]), None)
+        if span is None:
+            spans.setdefault(key, []).append([len(merged), start, end])
+            merged.append(doc)
+            continue
+        position, span_start, span_end = span
+        target = merged[position]
+        if start >= span_start:
+            text = target.page_content + doc.page_content[span_end - start:]
+        else:
+            text = doc.page_content + target.page_content[end - span_start:]
+        span[1], span[2] = min(start, span_start), max(end, span_end)
+        merged[position] = Document(page_content=text, metadata={**target.metadata, "start_index": span[1]})
+        merges += 1
+    return merged, merges
+
+
+def build_context(query_vector, candidates: List[Tuple[Document, float, np.ndarray]], token_budget: int = None) -> Tuple[str, dict]:
+    token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+    if not candidates:
+        return "", {"candidates": 0, "selected": 0, "duplicates_removed": 0, "chunks_merged": 0,
+                    "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+
+    docs = [doc for doc, _, _ in candidates]
+    vectors = np.stack([vector for _, _, vector in candidates]).astype(np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm:
+        query = query / norm
+
+    # Baseline: every retrieved chunk joined as-is
+    chunk_tokens = [count_tokens(doc.page_content) for doc in docs]
+    tokens_before = count_tokens(" ".join(doc.page_content for doc in docs))
+
+    order, duplicates = _mmr_order(query, vectors, Config.CONTEXT_MMR_LAMBDA, Config.CONTEXT_DEDUP_THRESHOLD)
+
+    # Greedy packing in MMR order; a chunk that does not fit is skipped, smaller ones may still fit
+    selected, used = [], 0
+    for index in order:
+        if used + chunk_tokens[index] <= token_budget:
+            selected.append(docs[index])
+            used += chunk_tokens[index]
+
+    merged, merges = _merge_adjacent(selected)
+    context_text = "\n\n".join(doc.page_content for doc in merged)
+    tokens_after = count_tokens(context_text)
+
+    stats = {
+        "candidates": len(docs),
+        "selected": len(selected),
+        "duplicates_removed": duplicates,
+        "chunks_merged": merges,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
+    return context_text, stats
+
+
+async def retrieve_context(retriever, query: str) -> Tuple[str, dict]:
+    vectorstore = retriever.vectorstore
+    k = retriever.search_kwargs.get("k", 20)
+    query_vector, candidates = await vectorstore.asimilarity_search_with_vectors(query, k=k)
+
+    # Tokenizing and reranking the candidates is CPU work, keep it off the event loop
+    loop = asyncio.get_running_loop()
+    context_text, stats = await loop.run_in_executor(None, build_context, query_vector, candidates)
+
+    _totals["requests"] += 1
+    for key in ("tokens_before", "tokens_after", "duplicates_removed", "chunks_merged"):
+        _totals[key] += stats[key]
+    logger.info("Context built: %s", stats)
+    return context_text, stats
+
+
+def stats():
+    return {**_totals, "tokens_saved": _totals["tokens_before"] - _totals["tokens_after"]}
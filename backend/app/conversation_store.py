@@ -0,0 +1,140 @@
+# app/conversation_store.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from config import Config
+
+
+class Turn(NamedTuple):
+    # Same `type` / `content` shape as app.models.chat.Message, without pydantic overhead
+    message_id: str
+    type: str
+    content: str
+
+
+class ConversationAccessError(LookupError):
+    # The chat exists but belongs to another user; callers report it like a missing chat
+    pass
+
+
+class _Conversation:
+    __slots__ = ("owner", "turns", "positions", "last_access")
+
+    def __init__(self, owner: Optional[str]):
+        self.owner = owner  # oid of the user who started the chat
+        self.turns: List[Turn] = []
+        self.positions = {}  # message_id -> index in turns, for keyset lookups
+        self.last_access = time.monotonic()
+
+    def append(self, turn: Turn):
+        self.positions[turn.message_id] = len(self.turns)
+        self.turns.append(turn)
+
+
+class ConversationStore:
+    # Turns of each chat keyed by the Chat-Id header, so clients only send the new message.
+    # Bounded by LRU order and idle TTL like the session store. Chat ids come from the client,
+    # so every access passes the caller's oid and only the user who created a chat can use it.
+
+    def __init__(self, max_chats: int = None, idle_ttl: float = None):
+        self.max_chats = max_chats or Config.CONVERSATION_MAX_CHATS
+        self.idle_ttl = idle_ttl or Config.CONVERSATION_IDLE_TTL
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = 0
+        self._denied = 0
+
+    def _get(self, chat_id: str, owner: Optional[str], create: bool = False) -> Optional[_Conversation]:
+        conversation = self._chats.get(chat_id)
+        if conversation is not None and time.monotonic() - conversation.last_access > self.idle_ttl:
+            del self._chats[chat_id]
+            self._evicted += 1
+            conversation = None
+        if conversation is not None and conversation.owner != owner:
+            self._denied += 1
+            raise ConversationAccessError(chat_id)
+        if conversation is None:
+            if not create:
+                return None
+            conversation = self._chats[chat_id] = _Conversation(owner)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+                self._evicted += 1
+        conversation.last_access = time.monotonic()
+        self._chats.move_to_end(chat_id)
+        return conversation
+
+    def owns(self, chat_id: str, owner: Optional[str]) -> bool:
+        # False only when the chat exists and belongs to someone else
+        with self._lock:
+            conversation = self._chats.get(chat_id)
+            return conversation is None or conversation.owner == owner
+
+    def history(self, chat_id: str, owner: Optional[str]) -> Optional[List[Turn]]:
+        with self._lock:
+            conversation = self._get(chat_id, owner)
+            return list(conversation.turns) if conversation is not None else None
+
+    def replace(self, chat_id: str, owner: Optional[str], messages: List):
+        # Adopt the full history sent by clients still on the old request format
+        with self._lock:
+            self._get(chat_id, owner)
+            self._chats.pop(chat_id, None)
+            conversation = self._get(chat_id, owner, create=True)
+            for message in messages:
+                conversation.append(Turn(str(uuid.uuid4()), message.type, message.content))
+
+    def append(self, chat_id: str, owner: Optional[str], *turns: Turn):
+        with self._lock:
+            conversation = self._get(chat_id, owner, create=True)
+            for turn in turns:
+                conversation.append(turn)
+
+    def truncate_after(self, chat_id: str, owner: Optional[str], message_id: str) -> Optional[List[Turn]]:
+        # History up to and including message_id; later turns are dropped (e.g. a regenerated answer)
+        with self._lock:
+            conversation = self._get(chat_id, owner)
+            if conversation is None or message_id not in conversation.positions:
+                return None
+            keep = conversation.positions[message_id] + 1
+            for turn in conversation.turns[keep:]:
+                del conversation.positions[turn.message_id]
+            del conversation.turns[keep:]
+            return list(conversation.turns)
+
+    def page(self, chat_id: str, owner: Optional[str], after: Optional[str] = None, limit: int = 50) -> Tuple[Optional[List[Turn]], Optional[str]]:
+        # Keyset pagination: the cursor is the message_id of the last turn already returned
+        with self._lock:
+            conversation = self._get(chat_id, owner)
+            if conversation is None:
+                return None, None
+            start = 0
+            if after is not None:
+                if after not in conversation.positions:
+                    raise KeyError(after)
+                start = conversation.positions[after] + 1
+            turns = conversation.turns[start:start + limit]
+            has_more = start + limit < len(conversation.turns)
+        return turns, turns[-1].message_id if turns and has_more else None
+
+    def delete(self, chat_id: str, owner: Optional[str]):
+        # Other users' chats are left alone
+        with self._lock:
+            conversation = self._chats.get(chat_id)
+            if conversation is not None and conversation.owner == owner:
+                del self._chats[chat_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chats": len(self._chats),
+                "turns": sum(len(conversation.turns) for conversation in self._chats.values()),
+                "evicted": self._evicted,
+                "denied": self._denied,
+            }
+
+
+# Process-wide store used by the chat service
+conversation_store = ConversationStore()
@@ -1,228 +1,261 @@
 # app/database.py
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import mysql.connector
-from mysql.connector import Error, pooling
+from mysql.connector import Error, errorcode, errors, pooling
 from config import Config
+from app import migrations
 import logging
 
 logger = logging.getLogger("database")
 
+# Lock conflicts: InnoDB picked this transaction as the deadlock victim, or a lock wait timed out.
+# _transaction reruns the transaction for these itself.
+LOCK_CONFLICT_ERRNOS = {errorcode.ER_LOCK_WAIT_TIMEOUT, errorcode.ER_LOCK_DEADLOCK}
+
+# Lost connections, left for callers that can retry the whole operation
+CONNECTION_ERRNOS = {errorcode.CR_SERVER_GONE_ERROR, errorcode.CR_SERVER_LOST}
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, errors.PoolError):
+        return True
+    return isinstance(error, Error) and error.errno in CONNECTION_ERRNOS
+
 class Database:
-    #def __init__(self):
-    #    self.connection = None
+    # Every operation checks out its own pooled connection and, from async code, runs on a
+    # dedicated thread pool so blocking MySQL calls never stall the event loop.
 
-    def __init__(self):
+    def __init__(self, pool_size: int = None):
+       self.pool_size = pool_size or Config.MY_SQL_POOL_SIZE
        try:
             # Connection pooling setup
             self.pool = pooling.MySQLConnectionPool(
                 pool_name="mypool",
-                pool_size=5,  # Adjust pool size based on expected load
+                pool_size=self.pool_size,
                 host=Config.MY_SQL_HOST,
                 user=Config.MY_SQL_USER,
                 password=Config.MY_SQL_PASSWORD,
                 database=Config.MY_SQL_DB
             )
-            logger.info("MySQL connection pool initialized.")
+            logger.info("MySQL connection pool initialized with %s connections.", self.pool_size)
        except Error as e:
             logger.error("Error initializing connection pool: %s", e)
             raise
-    
-    # def connect(self):
-    #     self.connection = self.pool.get_connection()
-    #      #Ensure the connection is established and ready to be used.
-    #     if self.connection and self.connection.is_connected():
-    #         return  # Avoid reconnecting if already connected
-    #     try:
-    #         self.connection = mysql.connector.connect(
-    #             host=Config.MY_SQL_HOST,
-    #             user=Config.MY_SQL_USER,
-    #             password=Config.MY_SQL_PASSWORD,
-    #             database=Config.MY_SQL_DB 
-    #         )
-    #         if self.connection.is_connected():
-    #             logger.info("Successfully connected to MySQL")
-    #             self.initialize_database()
-    #     except Error as e:
-    #         logger.error("Error while connecting to MySQL: %s", e)
-    #         raise
+
+       # MySQLConnectionPool fails immediately when exhausted, so callers queue on a semaphore instead
+       self._slots = threading.BoundedSemaphore(self.pool_size)
+       self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="mysql")
+
+       # Pool usage counters exposed through stats()
+       self._stats_lock = threading.Lock()
+       self._in_use = 0
+       self._checkouts = 0
+       self._timeouts = 0
+       self._wait_total = 0.0
+       self._wait_max = 0.0
+       self._transaction_retries = 0
 
     def connect(self):
         try:
-            # Get a connection from the pool
-            self.connection = self.pool.get_connection()
-
-            # Ensure connection is valid
-            if not self.connection.is_connected():
-                raise Error("Failed to establish a connection from the pool")
+            # Make sure the pool hands out working connections before serving traffic
+            with self.checkout() as connection:
+                if not connection.is_connected():
+                    raise Error("Failed to establish a connection from the pool")
 
             logger.info("Successfully obtained connection from pool")
-            self.initialize_database()
         except Error as e:
             logger.error("Error while getting connection from pool: %s", e)
             raise
 
-    def reconnect(self):
-        # Attempt to reconnect by obtaining a fresh connection from the pool
-        try:
-            self.connection = self.pool.get_connection()
-            if not self.connection.is_connected():
-                raise Error("Failed to re-establish a connection")
+    @contextmanager
+    def checkout(self):
+        # Borrow a connection from the pool for the duration of one operation
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=Config.MY_SQL_POOL_TIMEOUT):
+            with self._stats_lock:
+                self._timeouts += 1
+            raise errors.PoolError("Timed out waiting for a MySQL connection from the pool")
+        waited = time.perf_counter() - started
 
-            logger.info("Reconnected to MySQL successfully")
-        except Error as e:
-            logger.error("Error reconnecting to MySQL: %s", e)
+        try:
+            connection = self.pool.get_connection()
+        except Error:
+            self._slots.release()
             raise
 
-    def column_exists(self, cursor, table_name, column_name):
-        
-        #Check if a specific column exists in a table.
-        query = f"SHOW COLUMNS FROM {table_name} LIKE '{column_name}'"
-        cursor.execute(query)
-        result = cursor.fetchone()
-        return result is not None
-    
-    def database_exists(self, cursor, db_name):
-        cursor.execute(f"SHOW DATABASES LIKE '{db_name}'")
-        result = cursor.fetchone()
-        return result is not None
-
-    def table_exists(self, cursor, table_name):
-        cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-        result = cursor.fetchone()
-        return result is not None
-
-    def initialize_database(self):
-        cursor = self.connection.cursor()
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
         try:
-            # Check if the database exists
-            if self.database_exists(cursor, Config.MY_SQL_DB):
-                logger.info(f"Database `{Config.MY_SQL_DB}` already exists.")
-            else:
-                cursor.execute(f"CREATE DATABASE `{Config.MY_SQL_DB}`")
-                logger.info(f"Database `{Config.MY_SQL_DB}` created.")
-            self.connection.database = Config.MY_SQL_DB
-
-            # Create Users table
-            if not self.table_exists(cursor, 'Users'):
-                cursor.execute("""
-                    CREATE TABLE Users (
-                        user_id CHAR(36) PRIMARY KEY, 
-                        name VARCHAR(255) NOT NULL,
-                        group_name VARCHAR(255) DEFAULT NULL,       
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
-                    )
-                """)
-                logger.info("Table `Users` created.")
-            else:
-                logger.info("Table `Users` already exists.")
-
-            # Create Chat_Messages table
-            if not self.table_exists(cursor, 'Chat_Messages'):
-                cursor.execute("""
-                    CREATE TABLE Chat_Messages (
-                        message_id CHAR(36) PRIMARY KEY,
-                        user_id CHAR(36),
-                        user_prompt TEXT NOT NULL,
-                        response TEXT NOT NULL,
-                        source ENUM('OpenAI', 'Bing', 'Document') NOT NULL,
-                        category VARCHAR(255) DEFAULT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
-                    )
-                """)
-                logger.info("Table `Chat_Messages` created.")
-            else:
-                logger.info("Table `Chat_Messages` already exists.")
-
-            # Create Feedback table
-            if not self.table_exists(cursor, 'Feedback'):
-                cursor.execute("""
-                    CREATE TABLE Feedback (
-                        feedback_id CHAR(36) PRIMARY KEY,
-                        message_id CHAR(36),
-                        rating INT CHECK (rating >= 1 AND rating <= 5),
-                        comment TEXT,
-                        user_id VARCHAR(255),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-                        FOREIGN KEY (message_id) REFERENCES Chat_Messages(message_id) ON DELETE CASCADE,
-                        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
-                    )
-                """)
-                logger.info("Table `Feedback` created.")
-            else:
-                logger.info("Table `Feedback` already exists.")
-
-            # Create Price table
-            if not self.table_exists(cursor, 'Price'):
-                cursor.execute("""
-                    CREATE TABLE Price (
-                        price_id CHAR(36) PRIMARY KEY,
-                        message_id CHAR(36),
-                        completion_price DECIMAL(10, 2) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-                        FOREIGN KEY (message_id) REFERENCES Chat_Messages(message_id) ON DELETE CASCADE
-                    )
-                """)
-                logger.info("Table `Price` created.")
-            else:
-                logger.info("Table `Price` already exists.")
-
-            logger.info("All tables are initialized and ready.")
-        except Error as e:
-            logger.error("Error while initializing database: %s", e)
-            raise
+            yield connection
         finally:
-            cursor.close()
+            # Closing a pooled connection returns it to the pool
+            connection.close()
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
 
-    def run_migration(self):
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "pool_size": self.pool_size,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "transaction_retries": self._transaction_retries,
+            }
 
-        #Add columns to Users and Chat_Messages tables if they don't already exist.
-        cursor = self.connection.cursor()
+    def migrate(self):
+        # Versioned schema check; a no-op single query when the schema is already current
+        with self.checkout() as connection:
+            return migrations.migrate(connection)
+
+    @staticmethod
+    def _get_lock(connection, name, timeout):
+        cursor = connection.cursor()
         try:
-            # Check and add group_name column to Users table
-            if not self.column_exists(cursor, 'Users', 'group_name'):
-                cursor.execute("ALTER TABLE Users ADD COLUMN group_name VARCHAR(255) DEFAULT NULL;")
-                logger.info("Added `group_name` column to Users table.")
-            else:
-                logger.info("Column `group_name` already exists in Users table.")
-
-            # Check and add category column to Chat_Messages table
-            if not self.column_exists(cursor, 'Chat_Messages', 'category'):
-                cursor.execute("ALTER TABLE Chat_Messages ADD COLUMN category VARCHAR(255) DEFAULT NULL;")
-                logger.info("Added `category` column to Chat_Messages table.")
-            else:
-                logger.info("Column `category` already exists in Chat_Messages table.")
-
-            # Commit changes
-            self.connection.commit()
-        except Error as e:
-            logger.error("Error while running migration: %s", e)
-            raise
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+            return cursor.fetchone()[0] == 1
         finally:
             cursor.close()
-    
-    
-    def execute_query(self, query, values=None):
+
+    @staticmethod
+    def _release_lock(connection, name):
+        cursor = connection.cursor()
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, values)
-            self.connection.commit()
-        except Error as e:
-            logger.error("Error executing query: %s", e)
-            if not self.connection.is_connected():
-                logger.info("Attempting to reconnect...")
-                self.reconnect()
-                self.execute_query(query, values)  # Retry the query
-            else: 
-                raise e
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+            cursor.fetchone()
         finally:
             cursor.close()
 
-    #def __del__(self):
+    def _execute(self, query, values=None, fetch=None, many=False):
+        # One statement on its own pooled connection, committed before the connection is returned
+        for attempt in range(2):
+            with self.checkout() as connection:
+                cursor = connection.cursor()
+                try:
+                    if many:
+                        cursor.executemany(query, values)
+                    else:
+                        cursor.execute(query, values)
+                    if fetch == "one":
+                        result = cursor.fetchone()
+                    elif fetch == "all":
+                        result = cursor.fetchall()
+                    else:
+                        result = cursor.rowcount
+                    connection.commit()
+                    return result
+                except (errors.OperationalError, errors.InterfaceError) as e:
+                    # Retry once on a connection that dropped underneath us
+                    logger.error("Error executing query: %s", e)
+                    if attempt == 0 and not connection.is_connected():
+                        logger.info("Connection lost, retrying on a fresh connection...")
+                        continue
+                    raise
+                except Error as e:
+                    logger.error("Error executing query: %s", e)
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+
+    def _locked_transaction(self, name, timeout, work):
+        # GET_LOCK, work(cursor) as one transaction, RELEASE_LOCK, all on a single pooled connection
+        # (named locks are per connection), so holding the lock never needs a second pool slot
+        with self.checkout() as connection:
+            if not self._get_lock(connection, name, timeout):
+                return False, None
+            try:
+                cursor = connection.cursor()
+                try:
+                    result = work(cursor)
+                    connection.commit()
+                    return True, result
+                except Error as e:
+                    logger.error("Error executing locked transaction: %s", e)
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            finally:
+                self._release_lock(connection, name)
+
+    def _transaction(self, work):
+        # Run work(cursor) and commit it as a single transaction. After a deadlock or lock wait
+        # timeout the whole transaction is rolled back and run again, so work must be repeatable.
+        retries = Config.MY_SQL_TRANSACTION_RETRIES
+        for attempt in range(retries + 1):
+            with self.checkout() as connection:
+                cursor = connection.cursor()
+                try:
+                    result = work(cursor)
+                    connection.commit()
+                    return result
+                except Error as e:
+                    connection.rollback()
+                    if attempt == retries or e.errno not in LOCK_CONFLICT_ERRNOS:
+                        logger.error("Error executing transaction: %s", e)
+                        raise
+                    logger.warning("Lock conflict in transaction, retrying: %s", e)
+                    with self._stats_lock:
+                        self._transaction_retries += 1
+                finally:
+                    cursor.close()
+            # Back off with the connection returned, so the other transaction can finish
+            time.sleep(0.05 * 2 ** attempt)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def execute_query(self, query, values=None):
+        # Blocking variant for startup code and scripts; request handlers should await execute()
+        return self._execute(query, values)
+
+    async def execute(self, query, values=None):
+        return await self._run(self._execute, query, values)
+
+    async def execute_many(self, query, seq_of_values):
+        return await self._run(self._execute, query, seq_of_values, many=True)
+
+    async def fetch_one(self, query, values=None):
+        return await self._run(self._execute, query, values, fetch="one")
+
+    async def fetch_all(self, query, values=None):
+        return await self._run(self._execute, query, values, fetch="all")
+
+    async def run_in_transaction(self, work):
+        return await self._run(self._transaction, work)
+
+    async def run_with_lock(self, name, work, timeout=0):
+        # (acquired, result): work runs only if the MySQL named lock was taken within timeout seconds
+        return await self._run(self._locked_transaction, name, timeout, work)
+
+    def warm(self):
+        # Cycle through every pooled connection once so stale ones are reconnected before traffic arrives
+        for _ in range(self.pool_size):
+            with self.checkout() as connection:
+                connection.ping(reconnect=True, attempts=2, delay=0)
+
     def close(self):
-        #Close the connection when the app is shutting down.
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("MySQL connection closed.")
+        #Close the pooled connections when the app is shutting down.
+        self._executor.shutdown(wait=True)
+        try:
+            self.pool._remove_connections()
+        except Error as e:
+            logger.error("Error closing MySQL connection pool: %s", e)
+        logger.info("MySQL connection pool closed.")
 
 
 
@@ -0,0 +1,296 @@
+# app/embedding_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from config import Config
+
+logger = logging.getLogger("embedding_cache")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dump_docs(docs: List[Document]) -> str:
+    return json.dumps([{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs])
+
+
+def _load_docs(payload: str) -> List[Document]:
+    return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in json.loads(payload)]
+
+
+# Cached tables: (table, size of a row in bytes). Every row also records when it was last used,
+# so the cache can be capped by total size (least recently used rows go first) and by age.
+_TABLES = {
+    "embeddings": "length(vector)",
+    "files": "length(docs) + length(chunks)",
+    "summaries": "length(summary)",
+}
+
+# A hit refreshes used_at at most this often, so reads do not turn into a write each time
+_TOUCH_INTERVAL = 3600
+# Seconds between eviction passes triggered by writes
+_EVICT_INTERVAL = 60
+
+
+class EmbeddingCache:
+    # SQLite-backed store on local disk, so every worker process on the host shares one cache.
+    # Holds chunk embeddings keyed by (model, chunk hash), parsed/split files keyed by file hash
+    # and document summaries keyed by content hash. Bounded by EMBEDDING_CACHE_MAX_BYTES and
+    # EMBEDDING_CACHE_MAX_AGE like the in-memory caches.
+
+    def __init__(self, path: str = None, max_bytes: int = None, max_age: float = None):
+        self.path = path or Config.EMBEDDING_CACHE_PATH
+        self.max_bytes = Config.EMBEDDING_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = Config.EMBEDDING_CACHE_MAX_AGE if max_age is None else max_age
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_key TEXT PRIMARY KEY,
+                docs TEXT NOT NULL,
+                chunks TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                summary_key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL
+            )
+        """)
+        now = int(time.time())
+        for table, size in _TABLES.items():
+            # Caches created before the size cap get the bookkeeping columns, counted as used now
+            columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+            if "used_at" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN used_at INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(f"UPDATE {table} SET used_at = ?, size = {size}", (now,))
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_used_at ON {table} (used_at)")
+        self._conn.commit()
+
+        # Counters exposed through stats()
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._file_hits = 0
+        self._file_misses = 0
+        self._evicted = 0
+        self._last_evict = 0.0
+        self.evict()
+
+    def _touch(self, table: str, where: str, values: list):
+        # Caller holds the lock
+        now = int(time.time())
+        self._conn.execute(f"UPDATE {table} SET used_at = ? WHERE {where} AND used_at < ?", [now, *values, now - _TOUCH_INTERVAL])
+
+    def get_vectors(self, model: str, hashes: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+                if rows:
+                    self._touch("embeddings", f"model = ? AND text_hash IN ({placeholders})", [model, *batch])
+            if found:
+                self._conn.commit()
+        return found
+
+    def put_vectors(self, model: str, items: List[Tuple[str, List[float]]]):
+        now = int(time.time())
+        rows = []
+        for text_hash, vector in items:
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((model, text_hash, blob, now, len(blob)))
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (model, text_hash, vector, used_at, size) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        self._maybe_evict()
+
+    def record(self, hits: int, misses: int, bytes_saved: int):
+        self._hits += hits
+        self._misses += misses
+        self._bytes_saved += bytes_saved
+
+    def get_file(self, file_key: str) -> Optional[Tuple[List[Document], List[Document]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT docs, chunks FROM files WHERE file_key = ?", (file_key,)).fetchone()
+            if row is not None:
+                self._touch("files", "file_key = ?", [file_key])
+                self._conn.commit()
+        if row is None:
+            self._file_misses += 1
+            return None
+        self._file_hits += 1
+        return _load_docs(row[0]), _load_docs(row[1])
+
+    def put_file(self, file_key: str, docs: List[Document], chunks: List[Document]):
+        docs_payload, chunks_payload = _dump_docs(docs), _dump_docs(chunks)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_key, docs, chunks, used_at, size) VALUES (?, ?, ?, ?, ?)",
+                (file_key, docs_payload, chunks_payload, int(time.time()), len(docs_payload) + len(chunks_payload)),
+            )
+            self._conn.commit()
+        self._maybe_evict()
+
+    def get_summary(self, summary_key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE summary_key = ?", (summary_key,)).fetchone()
+            if row is not None:
+                self._touch("summaries", "summary_key = ?", [summary_key])
+                self._conn.commit()
+        return row[0] if row is not None else None
+
+    def put_summary(self, summary_key: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (summary_key, summary, used_at, size) VALUES (?, ?, ?, ?)",
+                (summary_key, summary, int(time.time()), len(summary)),
+            )
+            self._conn.commit()
+        self._maybe_evict()
+
+    def _maybe_evict(self):
+        if time.monotonic() - self._last_evict >= _EVICT_INTERVAL:
+            self.evict()
+
+    def evict(self) -> int:
+        # Drops rows unused for max_age seconds, then the least recently used rows of all tables
+        # until the cache is back under max_bytes (0 disables either limit). Returns rows removed.
+        self._last_evict = time.monotonic()
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                cutoff = int(time.time() - self.max_age)
+                for table in _TABLES:
+                    removed += self._conn.execute(f"DELETE FROM {table} WHERE used_at < ?", (cutoff,)).rowcount
+
+            if self.max_bytes:
+                total = sum(self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0] for table in _TABLES)
+                excess = total - self.max_bytes
+                if excess > 0:
+                    # Streamed oldest first and only as far as needed
+                    oldest = self._conn.execute(" UNION ALL ".join(
+                        f"SELECT '{table}', rowid, used_at, size FROM {table}" for table in _TABLES
+                    ) + " ORDER BY used_at")
+                    doomed = {}
+                    for table, rowid, _, size in oldest:
+                        doomed.setdefault(table, []).append((rowid,))
+                        excess -= size
+                        if excess <= 0:
+                            break
+                    oldest.close()
+                    for table, rowids in doomed.items():
+                        self._conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", rowids)
+                        removed += len(rowids)
+            self._conn.commit()
+        if removed:
+            self._evicted += removed
+            logger.info("Evicted %s rows from the embedding cache.", removed)
+        return removed
+
+    def stats(self):
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self._bytes_saved,
+            "file_hits": self._file_hits,
+            "file_misses": self._file_misses,
+            "evicted": self._evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    # Wraps an Embeddings model so only chunks missing from the cache are sent to the service
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [hash_text(text) for text in texts]
+        cached = self.cache.get_vectors(self.model, list(set(hashes)))
+
+        # Embed each distinct missing chunk once
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.cache.put_vectors(self.model, fresh)
+            cached.update(fresh)
+
+        hit_count = len(texts) - len(missing)
+        bytes_saved = sum(len(text.encode("utf-8")) for text, text_hash in zip(texts, hashes) if text_hash not in missing)
+        self.cache.record(hit_count, len(missing), bytes_saved)
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Use the wrapped model's native async call rather than the thread-pool default
+        return await self.embeddings.aembed_query(text)
+
+
+_cache: Optional[EmbeddingCache] = None
+
+
+def _open_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+        logger.info("Embedding cache opened at %s.", _cache.path)
+    return _cache
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    return _open_cache() if Config.EMBEDDING_CACHE_ENABLED else None
+
+
+def get_summary_cache() -> Optional[EmbeddingCache]:
+    # Summaries live in the same SQLite file but have their own switch, so turning off
+    # embedding caching does not turn off summary caching (or the other way round)
+    return _open_cache() if Config.SUMMARY_CACHE_ENABLED else None
@@ -0,0 +1,200 @@
+# app/export.py
+import csv
+import datetime
+import io
+import json
+import logging
+from typing import AsyncIterator, List, NamedTuple, Optional
+from config import Config
+
+logger = logging.getLogger("export")
+
+
+class ExportTable(NamedTuple):
+    name: str
+    key: str  # unique id that breaks created_at ties in the keyset
+    columns: List[tuple]  # (column, parquet type)
+
+
+# Exportable tables by URL name. Every table is paged on (created_at, key), which migration 6 indexes.
+TABLES = {
+    "users": ExportTable("Users", "user_id", [
+        ("user_id", "string"), ("name", "string"), ("group_name", "string"), ("created_at", "timestamp"),
+    ]),
+    "chat_messages": ExportTable("Chat_Messages", "message_id", [
+        ("message_id", "string"), ("user_id", "string"), ("user_prompt", "string"), ("response", "string"),
+        ("source", "string"), ("category", "string"), ("created_at", "timestamp"),
+    ]),
+    "feedback": ExportTable("Feedback", "feedback_id", [
+        ("feedback_id", "string"), ("message_id", "string"), ("rating", "int"), ("comment", "string"),
+        ("user_id", "string"), ("created_at", "timestamp"),
+    ]),
+    "price": ExportTable("Price", "price_id", [
+        ("price_id", "string"), ("message_id", "string"), ("completion_price", "decimal"),
+        ("prompt_tokens", "int"), ("completion_tokens", "int"), ("created_at", "timestamp"),
+    ]),
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+async def iter_pages(db, table: ExportTable, since: Optional[datetime.datetime] = None, since_id: str = "",
+                     limit: Optional[int] = None, page_size: int = None, safety_lag: int = None) -> AsyncIterator[list]:
+    # Keyset pagination: each page seeks past the last (created_at, key) it returned, so every page
+    # is an index range scan of page_size rows however deep the export is, and only one page is in
+    # memory at a time. Each page runs on its own pooled connection, so a slow client never pins one.
+    # `since`/`since_id` is the watermark of the previous export (its last row); rows after it only.
+    # The export stops at NOW() - safety_lag, fixed when it starts: rows younger than that may still
+    # be joined by queued rows with an earlier created_at, which a later watermark would skip.
+    page_size = page_size or Config.EXPORT_PAGE_SIZE
+    safety_lag = Config.EXPORT_SAFETY_LAG if safety_lag is None else safety_lag
+    columns = ", ".join(column for column, _ in table.columns)
+    created_index = [column for column, _ in table.columns].index("created_at")
+    key_index = [column for column, _ in table.columns].index(table.key)
+    cursor = (since, since_id or "") if since is not None else None
+    sent = 0
+    until = (await db.fetch_one("SELECT NOW() - INTERVAL %s SECOND", (safety_lag,)))[0]
+
+    while limit is None or sent < limit:
+        size = page_size if limit is None else min(page_size, limit - sent)
+        if cursor is None:
+            query = f"SELECT {columns} FROM {table.name} WHERE created_at < %s ORDER BY created_at, {table.key} LIMIT %s"
+            values = (until, size)
+        else:
+            # The leading created_at >= bound keeps this a range scan on the (created_at, key) index
+            query = f"""
+                SELECT {columns} FROM {table.name}
+                WHERE created_at < %s AND created_at >= %s AND (created_at > %s OR {table.key} > %s)
+                ORDER BY created_at, {table.key} LIMIT %s
+            """
+            values = (until, cursor[0], cursor[0], cursor[1], size)
+        rows = await db.fetch_all(query, values)
+        if not rows:
+            return
+        yield rows
+        sent += len(rows)
+        if len(rows) < size:
+            return
+        cursor = (rows[-1][created_index], rows[-1][key_index])
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    # Decimal and anything else as a string, so prices keep their exact value
+    return str(value)
+
+
+class CsvEncoder:
+    def __init__(self, table: ExportTable):
+        self.header = [column for column, _ in table.columns]
+
+    def start(self) -> bytes:
+        return self.encode([self.header])
+
+    def encode(self, rows) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime.datetime) else value for value in row] for row in rows
+        )
+        return buffer.getvalue().encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    def __init__(self, table: ExportTable):
+        self.header = [column for column, _ in table.columns]
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return "".join(json.dumps(dict(zip(self.header, row)), default=_json_default) + "\n" for row in rows).encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink:
+    # File-like target for ParquetWriter whose bytes are drained after every row group
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class ParquetEncoder:
+    # One row group per page. pyarrow is optional and only imported when Parquet is requested.
+    def __init__(self, table: ExportTable):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"string": pa.string(), "int": pa.int64(), "decimal": pa.decimal128(10, 2), "timestamp": pa.timestamp("s")}
+        self.pa = pa
+        self.header = [column for column, _ in table.columns]
+        self.schema = pa.schema([(column, types[kind]) for column, kind in table.columns])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def start(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, rows) -> bytes:
+        columns = {column: [row[index] for row in rows] for index, column in enumerate(self.header)}
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+
+async def stream_export(db, table: ExportTable, export_format: str, since=None, since_id: str = "", limit: Optional[int] = None):
+    encoder = ENCODERS[export_format](table)
+    rows_sent = 0
+    chunk = encoder.start()
+    if chunk:
+        yield chunk
+    async for rows in iter_pages(db, table, since, since_id, limit):
+        rows_sent += len(rows)
+        yield encoder.encode(rows)
+    chunk = encoder.finish()
+    if chunk:
+        yield chunk
+    logger.info("Exported %s rows from %s as %s", rows_sent, table.name, export_format)
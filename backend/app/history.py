@@ -0,0 +1,162 @@
+# app/history.py
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+from config import Config
+from utils import create_azure_client
+
+logger = logging.getLogger("history")
+
+
+def format_messages(messages) -> str:
+    return "\n".join([f"{msg.type.capitalize()}: {msg.content}" for msg in messages])
+
+
+def _message_key(msg):
+    # Server-stored turns carry an id; client-sent history is matched on its content
+    return getattr(msg, "message_id", None) or hash((msg.type, msg.content))
+
+
+def _prefix_hash(messages) -> int:
+    return hash(tuple(_message_key(msg) for msg in messages))
+
+
+class _Summary:
+    __slots__ = ("text", "count", "prefix_hash")
+
+    def __init__(self, text: str = "", count: int = 0, prefix_hash: int = None):
+        self.text = text
+        # How many leading history messages are folded into the summary, and a hash of exactly
+        # those messages. Matching the whole prefix (not just its last message) keeps a short
+        # repeated message such as "ok" from being mistaken for the end of the summarized part.
+        self.count = count
+        self.prefix_hash = prefix_hash if prefix_hash is not None else _prefix_hash([])
+
+    def covered(self, older: List) -> Optional[int]:
+        # Number of leading messages of `older` already in the summary, None if they no longer line up
+        if self.count > len(older) or _prefix_hash(older[:self.count]) != self.prefix_hash:
+            return None
+        return self.count
+
+
+class HistoryCompactor:
+    # Keeps the newest messages verbatim and replaces older ones with a rolling summary cached
+    # per chat id. The summary is extended in the background as messages age out of the
+    # verbatim window, so a long conversation costs about the same per turn as a short one.
+
+    def __init__(self, verbatim: int = None, batch: int = None, max_chats: int = None):
+        self.verbatim = verbatim or Config.HISTORY_VERBATIM_MESSAGES
+        self.batch = batch or Config.HISTORY_SUMMARY_BATCH
+        self.max_chats = max_chats or Config.HISTORY_SUMMARY_CACHE_SIZE
+        self._summaries = OrderedDict()
+        self._pending = {}
+
+        # Counters exposed through stats()
+        self._summary_updates = 0
+        self._summary_failures = 0
+        self._messages_compacted = 0
+
+    def compact(self, chat_id: Optional[str], history: List) -> str:
+        if not chat_id or len(history) <= self.verbatim:
+            return format_messages(history)
+
+        older, recent = history[:-self.verbatim], history[-self.verbatim:]
+        summary = self._summaries.get(chat_id)
+        covered = summary.covered(older) if summary is not None else None
+        summary, covered = self._track(chat_id, summary, covered, older)
+        return self._render(summary.text, older[covered:] + recent)
+
+    async def acompact(self, chat_id: Optional[str], history: List) -> str:
+        # Same result as compact(), but hashing and formatting a long history run on a worker
+        # thread so they overlap retrieval. The summary cache and scheduling stay on the event loop.
+        loop = asyncio.get_running_loop()
+        if not chat_id or len(history) <= self.verbatim:
+            return await loop.run_in_executor(None, format_messages, history)
+
+        older, recent = history[:-self.verbatim], history[-self.verbatim:]
+        summary = self._summaries.get(chat_id)
+        covered = None
+        if summary is not None:
+            state = (summary.count, summary.prefix_hash)
+            covered = await loop.run_in_executor(None, summary.covered, older)
+            if self._summaries.get(chat_id) is not summary or (summary.count, summary.prefix_hash) != state:
+                # Extended or evicted while hashing; check the current summary instead
+                summary = self._summaries.get(chat_id)
+                covered = summary.covered(older) if summary is not None else None
+        summary, covered = self._track(chat_id, summary, covered, older)
+        return await loop.run_in_executor(None, self._render, summary.text, older[covered:] + recent)
+
+    def _track(self, chat_id: str, summary: Optional[_Summary], covered: Optional[int], older: List):
+        if covered is None:
+            # New chat, or the history no longer matches what was summarized
+            summary, covered = _Summary(), 0
+            self._summaries[chat_id] = summary
+        self._summaries.move_to_end(chat_id)
+        while len(self._summaries) > self.max_chats:
+            self._summaries.popitem(last=False)
+
+        # Messages that aged out of the window but are not in the summary yet stay verbatim for now
+        if len(older) - covered >= self.batch and chat_id not in self._pending:
+            self._pending[chat_id] = asyncio.create_task(self._extend_summary(chat_id, summary, list(older), covered))
+        return summary, covered
+
+    @staticmethod
+    def _render(summary_text: str, messages: List) -> str:
+        parts = []
+        if summary_text:
+            parts.append(f"Summary of earlier conversation: {summary_text}")
+        parts.append(format_messages(messages))
+        return "\n".join(parts)
+
+    async def _extend_summary(self, chat_id: str, summary: _Summary, prefix: List, covered: int):
+        # Folds prefix[covered:] into the summary, which afterwards covers the whole prefix
+        messages = prefix[covered:]
+        try:
+            prompt = f"""
+            Update the running summary of a conversation with the new messages below.
+            Keep facts, names, numbers, decisions and open questions. Be concise.
+
+            Current summary: {summary.text or "(empty)"}
+
+            New messages:
+            {format_messages(messages)}
+
+            Updated summary:
+            """
+            completion = create_azure_client(streaming=False, temperature=0.0)
+            response = await completion(messages=[
+                {"role": "system", "content": "You maintain concise running summaries of conversations."},
+                {"role": "user", "content": prompt}
+            ])
+            if response and response.choices:
+                # Only apply if the cached summary was not reset or extended while this call was in flight
+                if self._summaries.get(chat_id) is summary and summary.count == covered:
+                    summary.text = response.choices[0].message.content.strip()
+                    summary.count = len(prefix)
+                    summary.prefix_hash = _prefix_hash(prefix)
+                    self._summary_updates += 1
+                    self._messages_compacted += len(messages)
+        except Exception as e:
+            self._summary_failures += 1
+            logger.error("Error updating history summary for chat %s: %s", chat_id, str(e))
+        finally:
+            self._pending.pop(chat_id, None)
+
+    def forget(self, chat_id: str):
+        self._summaries.pop(chat_id, None)
+
+    async def stop(self):
+        for task in list(self._pending.values()):
+            task.cancel()
+        await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        self._pending.clear()
+
+    def stats(self):
+        return {
+            "chats": len(self._summaries),
+            "pending_updates": len(self._pending),
+            "summary_updates": self._summary_updates,
+            "summary_failures": self._summary_failures,
+            "messages_compacted": self._messages_compacted,
+        }
@@ -0,0 +1,53 @@
+# app/ingestion.py
+import hashlib
+import logging
+import tempfile
+from typing import Callable, List, Optional, Tuple
+from langchain_core.documents import Document
+from config import Config
+from app.parse_pool import parse_pool
+
+logger = logging.getLogger("ingestion")
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.md', '.json', '.xml')
+
+
+async def spool_upload(file) -> Tuple[str, str]:
+    # Copy the upload to a temp file in fixed-size blocks, hashing as we go, so the whole
+    # file is never held in memory. Returns the temp path and the sha256 of the content.
+    digest = hashlib.sha256()
+    temp = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        while True:
+            block = await file.read(Config.INGEST_READ_CHUNK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            temp.write(block)
+    finally:
+        temp.close()
+    return temp.name, digest.hexdigest()
+
+
+async def ingest_file(path: str, extension: str, source: str, vectorstore=None, chunk_size: int = 2000, chunk_overlap: int = 200,
+                      on_progress: Optional[Callable[[str, int, int], None]] = None) -> Tuple[List[Document], List[Document]]:
+    # Pages are parsed and split in the parse pool while this coroutine embeds and indexes
+    # chunks in batches as they arrive. Embedding starts with the first pages and at most
+    # INGEST_QUEUE_PAGES parsed pages wait in memory. Without a vectorstore nothing is embedded.
+    docs, chunks, batch = [], [], []
+    async for page, page_chunks in parse_pool.parse_document(path, extension, source, chunk_size, chunk_overlap):
+        docs.append(page)
+        chunks.extend(page_chunks)
+        if on_progress is not None:
+            on_progress("parsing", len(docs), None)
+        if vectorstore is None:
+            continue
+        batch.extend(page_chunks)
+        if len(batch) >= Config.INGEST_EMBED_BATCH:
+            await vectorstore.aadd_documents(batch)
+            batch = []
+    if batch:
+        await vectorstore.aadd_documents(batch)
+
+    logger.info("Ingested %s: %s pages, %s chunks", source, len(docs), len(chunks))
+    return docs, chunks
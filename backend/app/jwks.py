@@ -0,0 +1,136 @@
+# app/jwks.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from jwt.algorithms import RSAAlgorithm
+from config import Config
+
+logger = logging.getLogger("jwks")
+
+
+class JwksKeyManager:
+    # Azure AD signing keys, parsed once and held by kid. Refreshed in the background so key
+    # rotation needs no restart; a token with an unknown kid triggers an immediate refetch,
+    # at most once per JWKS_MIN_REFETCH_INTERVAL so bad tokens cannot hammer Azure AD.
+
+    def __init__(self, tenant_id: str = None):
+        tenant_id = tenant_id or Config.AZURE_TENANT_ID
+        self.openid_config_url = f"https://login.microsoftonline.com/{tenant_id}/v2.0/.well-known/openid-configuration"
+        self.refresh_interval = Config.JWKS_REFRESH_INTERVAL
+        self.min_refetch_interval = Config.JWKS_MIN_REFETCH_INTERVAL
+        self._keys = {}
+        self._last_fetch = -Config.JWKS_MIN_REFETCH_INTERVAL
+        self._lock = asyncio.Lock()
+        self._task = None
+
+        # Counters exposed through stats()
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._unknown_kids = 0
+
+    async def _fetch(self):
+        self._last_fetch = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(self.openid_config_url)
+                response.raise_for_status()
+                jwks_response = await client.get(response.json()["jwks_uri"])
+                jwks_response.raise_for_status()
+            self._keys = {key["kid"]: RSAAlgorithm.from_jwk(key) for key in jwks_response.json()["keys"] if key.get("kty") == "RSA"}
+            self._refreshes += 1
+            logger.info("Loaded %s signing keys from Azure AD", len(self._keys))
+        except Exception as e:
+            # Keep serving the keys we already have
+            self._refresh_failures += 1
+            logger.error("Error refreshing signing keys: %s", str(e))
+
+    async def refresh(self):
+        async with self._lock:
+            await self._fetch()
+
+    async def get_key(self, kid: str):
+        key = self._keys.get(kid)
+        if key is None:
+            async with self._lock:
+                # Concurrent requests with the same new kid wait for one refetch instead of each doing one
+                key = self._keys.get(kid)
+                if key is None and time.monotonic() - self._last_fetch >= self.min_refetch_interval:
+                    self._unknown_kids += 1
+                    await self._fetch()
+                    key = self._keys.get(kid)
+        return key
+
+    async def _run(self):
+        # The first load happens in the startup warmup (or on the first token); this loop only refreshes
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "keys": len(self._keys),
+            "refreshes": self._refreshes,
+            "refresh_failures": self._refresh_failures,
+            "unknown_kid_refetches": self._unknown_kids,
+        }
+
+
+class VerifiedTokenCache:
+    # Payloads of tokens whose signature and claims were already verified, keyed by token hash
+    # and dropped at the token's exp. Repeat requests with the same bearer skip RSA verification.
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or Config.TOKEN_CACHE_SIZE
+        self._payloads = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, token_hash: str) -> Optional[dict]:
+        entry = self._payloads.get(token_hash)
+        if entry is not None and entry[0] > time.time():
+            self._payloads.move_to_end(token_hash)
+            self._hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._payloads[token_hash]
+        self._misses += 1
+        return None
+
+    def put(self, token_hash: str, payload: dict):
+        if "exp" not in payload:
+            return
+        self._payloads[token_hash] = (payload["exp"], payload)
+        self._payloads.move_to_end(token_hash)
+        while len(self._payloads) > self.max_size:
+            self._payloads.popitem(last=False)
+
+    def stats(self):
+        lookups = self._hits + self._misses
+        return {
+            "tokens": len(self._payloads),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Process-wide instances used by token validation
+key_manager = JwksKeyManager()
+verified_tokens = VerifiedTokenCache()
@@ -0,0 +1,208 @@
+# app/migrations.py
+import logging
+import time
+from mysql.connector import errorcode, errors
+from config import Config
+from app import analytics
+
+logger = logging.getLogger("migrations")
+
+# Applied versions, one row per migration. An up-to-date database is recognised with a single
+# SELECT MAX(version) on this table, so a normal start runs no SHOW/ALTER statements at all.
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+    )
+"""
+
+
+def _column_exists(cursor, table_name, column_name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table_name, column_name),
+    )
+    return cursor.fetchone() is not None
+
+
+def add_column(table_name, column_name, definition):
+    # MySQL has no ADD COLUMN IF NOT EXISTS; databases created before versioning may already have it
+    def step(cursor):
+        if not _column_exists(cursor, table_name, column_name):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}")
+    return step
+
+
+def add_index(table_name, index_name, columns):
+    # Skipped when an existing index already starts with the same columns (InnoDB creates one
+    # for every foreign key), so the index is never duplicated
+    def step(cursor):
+        cursor.execute(
+            "SELECT index_name, column_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY index_name, seq_in_index",
+            (table_name,),
+        )
+        indexes = {}
+        for name, column in cursor.fetchall():
+            indexes.setdefault(name, []).append(column.lower())
+        wanted = [column.lower() for column in columns]
+        if any(existing[:len(wanted)] == wanted for existing in indexes.values()):
+            return
+        cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+    return step
+
+
+def allow_cache_source(cursor):
+    cursor.execute(
+        "SELECT column_type FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = 'Chat_Messages' AND column_name = 'source'"
+    )
+    row = cursor.fetchone()
+    if row is not None and "'Cache'" not in str(row[0]):
+        cursor.execute("ALTER TABLE Chat_Messages MODIFY COLUMN source ENUM('OpenAI', 'Bing', 'Document', 'Cache') NOT NULL")
+
+
+# Ordered, append-only. Each entry is (version, description, steps); a step is a SQL statement or
+# a callable taking the cursor. Never edit an applied migration, add a new one instead.
+# Versions 1-2 reproduce the schema that used to be created and patched on every start, and
+# are written to be no-ops on databases that already have it.
+MIGRATIONS = [
+    (1, "Create Users, Chat_Messages, Feedback and Price tables", [
+        """
+        CREATE TABLE IF NOT EXISTS Users (
+            user_id CHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            group_name VARCHAR(255) DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Chat_Messages (
+            message_id CHAR(36) PRIMARY KEY,
+            user_id CHAR(36),
+            user_prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            source ENUM('OpenAI', 'Bing', 'Document', 'Cache') NOT NULL,
+            category VARCHAR(255) DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Feedback (
+            feedback_id CHAR(36) PRIMARY KEY,
+            message_id CHAR(36),
+            rating INT CHECK (rating >= 1 AND rating <= 5),
+            comment TEXT,
+            user_id VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            FOREIGN KEY (message_id) REFERENCES Chat_Messages(message_id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Price (
+            price_id CHAR(36) PRIMARY KEY,
+            message_id CHAR(36),
+            completion_price DECIMAL(10, 2) NOT NULL,
+            prompt_tokens INT DEFAULT NULL,
+            completion_tokens INT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            FOREIGN KEY (message_id) REFERENCES Chat_Messages(message_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (2, "Add group_name, category, Cache source and token columns to existing tables", [
+        add_column("Users", "group_name", "VARCHAR(255) DEFAULT NULL"),
+        add_column("Chat_Messages", "category", "VARCHAR(255) DEFAULT NULL"),
+        allow_cache_source,
+        add_column("Price", "prompt_tokens", "INT DEFAULT NULL"),
+        add_column("Price", "completion_tokens", "INT DEFAULT NULL"),
+    ]),
+    (3, "Index Chat_Messages by user and time, and by category", [
+        add_index("Chat_Messages", "idx_chat_messages_user_created", ["user_id", "created_at"]),
+        add_index("Chat_Messages", "idx_chat_messages_category", ["category"]),
+    ]),
+    (4, "Index Feedback and Price by message", [
+        add_index("Feedback", "idx_feedback_message", ["message_id"]),
+        add_index("Price", "idx_price_message", ["message_id"]),
+    ]),
+    (5, "Create the Analytics_Daily rollup and load existing history", [
+        analytics.ROLLUP_TABLE,
+        analytics.backfill,
+    ]),
+    (6, "Index every table by (created_at, id) for keyset-paginated export", [
+        add_index("Users", "idx_users_created", ["created_at", "user_id"]),
+        add_index("Chat_Messages", "idx_chat_messages_created", ["created_at", "message_id"]),
+        add_index("Feedback", "idx_feedback_created", ["created_at", "feedback_id"]),
+        add_index("Price", "idx_price_created", ["created_at", "price_id"]),
+    ]),
+    (7, "Create Classifier_Claims for messages being classified", [
+        """
+        CREATE TABLE IF NOT EXISTS Classifier_Claims (
+            message_id CHAR(36) PRIMARY KEY,
+            claimed_until TIMESTAMP NOT NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            FOREIGN KEY (message_id) REFERENCES Chat_Messages(message_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor) -> int:
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except errors.ProgrammingError as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+def migrate(connection) -> dict:
+    # Brings the schema up to LATEST_VERSION. With several workers starting at once, one takes
+    # the advisory lock and migrates; the others block on GET_LOCK, then find nothing to do.
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        version = current_version(cursor)
+        connection.commit()
+        if version >= LATEST_VERSION:
+            return {"version": version, "applied": [], "ms": round(1000 * (time.perf_counter() - started), 2)}
+
+        lock_name = f"{Config.MY_SQL_DB}.schema_migration"
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (lock_name, Config.SCHEMA_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise errors.DatabaseError(f"Timed out after {Config.SCHEMA_LOCK_TIMEOUT}s waiting for the schema migration lock")
+
+        applied = []
+        try:
+            # Re-read under the lock: another worker may have migrated while we waited
+            cursor.execute(SCHEMA_VERSION_TABLE)
+            version = current_version(cursor)
+            for number, description, steps in MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info("Applying schema migration %s: %s", number, description)
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                # DDL commits implicitly in MySQL, so the version row is recorded right after its steps
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+                connection.commit()
+                applied.append(number)
+                version = number
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+            cursor.fetchone()
+
+        logger.info("Schema is at version %s (applied %s)", version, applied or "none")
+        return {"version": version, "applied": applied, "ms": round(1000 * (time.perf_counter() - started), 2)}
+    finally:
+        cursor.close()
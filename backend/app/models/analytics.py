@@ -0,0 +1,23 @@
+# app/models/analytics.py
+from datetime import date
+from pydantic import BaseModel
+from typing import List, Optional
+
+class AnalyticsRow(BaseModel):
+    # Dimensions not grouped by are left out (None); '' buckets are reported as None too
+    day: Optional[date] = None
+    group_name: Optional[str] = None
+    category: Optional[str] = None
+    source: Optional[str] = None
+    message_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+    rating_count: int
+    average_rating: Optional[float] = None
+
+class AnalyticsResponse(BaseModel):
+    start: Optional[date] = None
+    end: Optional[date] = None
+    by: List[str]
+    rows: List[AnalyticsRow]
@@ -1,6 +1,6 @@
 # app/models/chat.py
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class Message(BaseModel):
     type: str
@@ -8,4 +8,15 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    history: List[Message]
\ No newline at end of file
+    # Old clients send the full history; newer ones send only the id of the last message they saw
+    history: Optional[List[Message]] = None
+    last_message_id: Optional[str] = None
+
+class HistoryMessage(BaseModel):
+    message_id: str
+    type: str
+    content: str
+
+class HistoryPage(BaseModel):
+    messages: List[HistoryMessage]
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,68 @@
+# app/openai_client.py
+import logging
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+from config import Config
+
+if TYPE_CHECKING:
+    from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger("openai_client")
+
+# Process-wide Azure OpenAI client, created once at startup and shared by every request.
+# The openai SDK is imported on first use rather than with the app.
+_client: Optional["AsyncAzureOpenAI"] = None
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    # Keep-alive pool so consecutive requests reuse TCP/TLS connections
+    limits = httpx.Limits(
+        max_connections=Config.AZURE_OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.AZURE_OPENAI_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(Config.AZURE_OPENAI_TIMEOUT, connect=Config.AZURE_OPENAI_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+def init_client() -> "AsyncAzureOpenAI":
+    global _client, _http_client
+    if _client is None:
+        from openai import AsyncAzureOpenAI
+        _http_client = _build_http_client()
+        _client = AsyncAzureOpenAI(
+            api_key=Config.AZURE_OPENAI_API_KEY,
+            api_version=Config.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=Config.AZURE_OPENAI_API_ENDPOINT,
+            max_retries=Config.AZURE_OPENAI_MAX_RETRIES,
+            http_client=_http_client,
+        )
+        logger.info(
+            "Azure OpenAI client initialized (max_connections=%s, keepalive=%s).",
+            Config.AZURE_OPENAI_MAX_CONNECTIONS,
+            Config.AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        )
+    return _client
+
+
+def get_client() -> "AsyncAzureOpenAI":
+    # Lazily create the client for code paths that run outside the app lifecycle (scripts, workers)
+    return _client if _client is not None else init_client()
+
+
+async def warm_client():
+    # Opens a pooled connection (DNS, TCP, TLS) to the endpoint so the first completion skips it;
+    # the response status does not matter
+    get_client()
+    await _http_client.head(Config.AZURE_OPENAI_API_ENDPOINT)
+
+
+async def close_client():
+    global _client, _http_client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _http_client = None
+        logger.info("Azure OpenAI client closed.")
@@ -0,0 +1,167 @@
+# app/parse_pool.py
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from config import Config
+
+logger = logging.getLogger("parse_pool")
+
+# Worker side. Everything below runs in the pool processes and returns plain tuples of
+# strings and ints, which pickle far cheaper than Document objects.
+
+
+@lru_cache(maxsize=8)
+def _splitter(chunk_size: int, chunk_overlap: int):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, add_start_index=True)
+
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _read_pages(path: str, extension: str, pages: Optional[Tuple[int, int]]):
+    # Yields (page index or None, text)
+    if extension == '.pdf':
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        start, stop = pages
+        for index in range(start, stop):
+            yield index, reader.pages[index].extract_text()
+    elif extension == '.docx':
+        import docx2txt
+        yield None, docx2txt.process(path)
+    elif extension == '.txt' or extension == '.md':
+        with open(path, 'r') as f:
+            yield None, f.read()
+    elif extension == '.json':
+        with open(path, 'r') as f:
+            json_content = json.load(f)
+        yield None, json.dumps(json_content, indent=2)  # Convert JSON to readable string
+    elif extension == '.xml':
+        root = ET.parse(path).getroot()
+        yield None, ET.tostring(root, encoding='unicode')  # Convert XML to string
+    else:
+        raise ValueError("Unsupported file type")
+
+
+def _parse_task(path: str, extension: str, pages: Optional[Tuple[int, int]], chunk_size: int, chunk_overlap: int):
+    # Parses and splits one page range; returns (seconds spent, [(page, text, [(chunk, start_index), ...]), ...])
+    started = time.perf_counter()
+    splitter = _splitter(chunk_size, chunk_overlap)
+    results = []
+    for page, text in _read_pages(path, extension, pages):
+        chunks = [(chunk.page_content, chunk.metadata.get("start_index")) for chunk in splitter.create_documents([text])]
+        results.append((page, text, chunks))
+    return time.perf_counter() - started, results
+
+
+# Parent side
+
+
+class ParsePool:
+    # Process pool for parsing and splitting uploads, so a large PDF never holds the GIL the
+    # event loop needs. Large PDFs are cut into page ranges that are parsed in parallel.
+    # With PARSE_POOL_WORKERS=0 the same work runs on the default thread pool instead.
+
+    def __init__(self, workers: int = None, pages_per_task: int = None):
+        self.workers = workers if workers is not None else Config.PARSE_POOL_WORKERS
+        self.pages_per_task = max(1, pages_per_task or Config.PARSE_PAGES_PER_TASK)
+        self._executor = None
+
+        # Counters exposed through stats()
+        self._queued = 0
+        self._tasks = 0
+        self._pages = 0
+        self._failures = 0
+        self._parse_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def start(self):
+        if self.workers > 0 and self._executor is None:
+            context = multiprocessing.get_context(Config.PARSE_POOL_START_METHOD)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            logger.info("Parse pool started with %s workers", self.workers)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _parse(self, *args):
+        submitted = time.perf_counter()
+        self._queued += 1
+        try:
+            elapsed, results = await self._run(_parse_task, *args)
+        except Exception:
+            self._failures += 1
+            raise
+        finally:
+            self._queued -= 1
+        self._tasks += 1
+        self._pages += len(results)
+        self._parse_seconds += elapsed
+        self._wait_seconds += time.perf_counter() - submitted - elapsed
+        return results
+
+    async def parse_document(self, path: str, extension: str, source: str, chunk_size: int = 2000,
+                             chunk_overlap: int = 200) -> AsyncIterator[Tuple[Document, List[Document]]]:
+        # Yields (page document, its chunks) in page order. At most INGEST_QUEUE_PAGES pages are
+        # parsed ahead of the consumer, so memory stays bounded while workers keep busy.
+        if extension == '.pdf':
+            page_count = await self._run(_pdf_page_count, path)
+            ranges = [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+        else:
+            ranges = [None]
+        in_flight = max(1, Config.INGEST_QUEUE_PAGES // self.pages_per_task)
+
+        remaining = iter(ranges)
+        pending = deque()
+
+        def submit():
+            pages = next(remaining, False)
+            if pages is not False:
+                pending.append(asyncio.ensure_future(self._parse(path, extension, pages, chunk_size, chunk_overlap)))
+
+        for _ in range(in_flight):
+            submit()
+        try:
+            while pending:
+                results = await pending.popleft()
+                submit()
+                for page, text, chunks in results:
+                    metadata = {"source": source} if page is None else {"source": source, "page": page}
+                    yield (Document(page_content=text, metadata=metadata),
+                           [Document(page_content=chunk, metadata={**metadata, "start_index": start}) for chunk, start in chunks])
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queued,
+            "tasks": self._tasks,
+            "pages": self._pages,
+            "failures": self._failures,
+            "parse_seconds": round(self._parse_seconds, 3),
+            "avg_ms_per_page": round(1000 * self._parse_seconds / self._pages, 2) if self._pages else 0.0,
+            "avg_queue_wait_ms": round(1000 * self._wait_seconds / self._tasks, 2) if self._tasks else 0.0,
+        }
+
+
+# Process-wide pool, started and stopped with the app
+parse_pool = ParsePool()
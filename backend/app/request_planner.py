@@ -0,0 +1,95 @@
+# app/request_planner.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict, NamedTuple
+from app.response_cache import response_cache
+
+logger = logging.getLogger("request_planner")
+
+# Messages asking for fresh information are answered from Bing instead of the LLM
+BING_KEYWORDS = ("latest", "newest", "current")
+
+
+class Plan(NamedTuple):
+    use_bing: bool
+    use_retrieval: bool
+    use_cache: bool
+
+
+class RequestTrace:
+    # Per-request stage timings in milliseconds; stages may overlap when run concurrently
+
+    def __init__(self, planner: "RequestPlanner"):
+        self.planner = planner
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    async def run(self, stage: str, awaitable: Awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[stage] = round(1000 * (time.perf_counter() - started), 2)
+
+    def mark(self, stage: str):
+        # Milliseconds since the request started, e.g. time to first token
+        self.timings[stage] = round(1000 * (time.perf_counter() - self.started), 2)
+
+    async def run_concurrently(self, stages: Dict[str, Awaitable]) -> dict:
+        # Starts every stage at once. If one fails the others are cancelled and the original
+        # exception is raised (not an ExceptionGroup, so HTTPException handling still works).
+        tasks = {stage: asyncio.ensure_future(self.run(stage, awaitable)) for stage, awaitable in stages.items()}
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {stage: task.result() for stage, task in tasks.items()}
+
+    def finish(self):
+        self.mark("total")
+        self.planner.record(self.timings)
+        logger.info("Request stages (ms): %s", self.timings)
+
+
+class RequestPlanner:
+    # Decides up front which sources a message needs, so nothing is started only to be thrown
+    # away (e.g. document retrieval for a message that is answered from Bing)
+
+    def __init__(self):
+        self._plans = {"bing": 0, "retrieval": 0, "cache": 0, "llm": 0}
+        self._stage_totals: Dict[str, float] = {}
+        self._stage_counts: Dict[str, int] = {}
+
+    def plan(self, message: str, has_retriever: bool, history_length: int) -> Plan:
+        use_bing = any(keyword in message.lower() for keyword in BING_KEYWORDS)
+        plan = Plan(
+            use_bing=use_bing,
+            use_retrieval=has_retriever and not use_bing,
+            use_cache=not use_bing and response_cache.cacheable(has_retriever, history_length),
+        )
+        self._plans["bing" if use_bing else "llm"] += 1
+        self._plans["retrieval"] += plan.use_retrieval
+        self._plans["cache"] += plan.use_cache
+        return plan
+
+    def trace(self) -> RequestTrace:
+        return RequestTrace(self)
+
+    def record(self, timings: Dict[str, float]):
+        for stage, elapsed in timings.items():
+            self._stage_totals[stage] = self._stage_totals.get(stage, 0.0) + elapsed
+            self._stage_counts[stage] = self._stage_counts.get(stage, 0) + 1
+
+    def stats(self):
+        return {
+            "plans": dict(self._plans),
+            "avg_stage_ms": {stage: round(total / self._stage_counts[stage], 2) for stage, total in self._stage_totals.items()},
+        }
+
+
+# Process-wide planner used by the chat service
+request_planner = RequestPlanner()
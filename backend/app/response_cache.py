@@ -0,0 +1,135 @@
+# app/response_cache.py
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from config import Config
+from utils import get_document_embeddings
+
+logger = logging.getLogger("response_cache")
+
+
+def normalize_prompt(message: str) -> str:
+    # Case, whitespace and trailing punctuation do not change the answer
+    return re.sub(r"\s+", " ", message.lower()).strip().rstrip("?.! ")
+
+
+class _Entry:
+    __slots__ = ("response", "category", "created", "slot")
+
+    def __init__(self, response: str, category: Optional[str], slot: Optional[int]):
+        self.response = response
+        self.category = category
+        self.created = time.monotonic()
+        self.slot = slot  # Row in the vector matrix, None without semantic lookup
+
+
+class ResponseCache:
+    # Answers to context-free questions keyed by the normalized prompt, bounded by size (LRU)
+    # and TTL. With semantic lookup enabled, a miss on the exact key falls back to the closest
+    # cached question by embedding, accepted above RESPONSE_CACHE_SIMILARITY.
+
+    def __init__(self, max_entries: int = None, ttl: float = None, semantic: bool = None, threshold: float = None):
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl or Config.RESPONSE_CACHE_TTL
+        self.semantic = Config.RESPONSE_CACHE_SEMANTIC if semantic is None else semantic
+        self.threshold = threshold or Config.RESPONSE_CACHE_SIMILARITY
+        self._entries = OrderedDict()
+
+        # One unit-length row per entry; slots of evicted entries are reused
+        self._matrix = None
+        self._slot_keys: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+
+        # Counters exposed through stats()
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    def cacheable(self, has_context: bool, history_length: int) -> bool:
+        # Answers that depend on documents or on the conversation so far are never shared
+        return Config.RESPONSE_CACHE_ENABLED and not has_context and history_length <= Config.RESPONSE_CACHE_MAX_HISTORY
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.slot is not None:
+            self._slot_keys[entry.slot] = None
+            self._free_slots.append(entry.slot)
+        self._evicted += 1
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created > self.ttl:
+            self._drop(key)
+            return None
+        return entry
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(await get_document_embeddings().aembed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, message: str) -> Tuple[Optional[_Entry], Optional[np.ndarray]]:
+        # Returns the cached entry (or None) and the query embedding, which put() reuses on a miss
+        key = normalize_prompt(message)
+        entry = self._live(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._exact_hits += 1
+            return entry, None
+
+        vector = None
+        if self.semantic:
+            vector = await self._embed(key)
+            if self._matrix is not None and len(self._entries):
+                scores = self._matrix[:len(self._slot_keys)] @ vector
+                for slot in np.argsort(-scores):
+                    if scores[slot] < self.threshold:
+                        break
+                    match = self._slot_keys[slot]
+                    if match is not None and self._live(match) is not None:
+                        self._entries.move_to_end(match)
+                        self._semantic_hits += 1
+                        return self._entries[match], vector
+        self._misses += 1
+        return None, vector
+
+    def put(self, message: str, response: str, category: Optional[str] = None, vector: Optional[np.ndarray] = None):
+        key = normalize_prompt(message)
+        if key in self._entries:
+            self._drop(key)
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+        slot = None
+        if vector is not None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_keys[slot] = key
+            else:
+                slot = len(self._slot_keys)
+                self._slot_keys.append(key)
+                if self._matrix is None:
+                    self._matrix = np.zeros((max(64, slot + 1), vector.shape[0]), dtype=np.float32)
+                elif slot >= self._matrix.shape[0]:
+                    self._matrix = np.vstack([self._matrix, np.zeros_like(self._matrix)])
+            self._matrix[slot] = vector
+        self._entries[key] = _Entry(response, category, slot)
+
+    def stats(self):
+        lookups = self._exact_hits + self._semantic_hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self._exact_hits,
+            "semantic_hits": self._semantic_hits,
+            "misses": self._misses,
+            "hit_rate": round((self._exact_hits + self._semantic_hits) / lookups, 4) if lookups else 0.0,
+            "evicted": self._evicted,
+        }
+
+
+# Process-wide cache used by the chat service
+response_cache = ResponseCache()
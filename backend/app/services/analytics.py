@@ -0,0 +1,63 @@
+import logging
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request, Query
+from app.models.analytics import AnalyticsResponse
+from app.database import Database
+from app import analytics
+
+analytics_router = APIRouter()
+logger = logging.getLogger("analytics_service")
+
+
+async def _aggregate(db: Database, by: List[str], start, end, group_name, category, source) -> AnalyticsResponse:
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    try:
+        query, values = analytics.summary_query(by, start, end, group_name, category, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Reads only the Analytics_Daily rollup, never the base tables
+    rows = await db.fetch_all(query, values)
+    return AnalyticsResponse(start=start, end=end, by=by, rows=analytics.summary_rows(by, rows))
+
+
+@analytics_router.get("/summary", response_model=AnalyticsResponse)
+async def get_summary(
+    request: Request,
+    by: List[str] = Query(default=[]),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_name: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    # Totals for the date range (inclusive), grouped by any of day, group_name, category, source
+    try:
+        logger.info("get_summary endpoint accessed with by=%s, start=%s, end=%s", by, start, end)
+        return await _aggregate(request.app.state.db, by, start, end, group_name, category, source)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in get_summary: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@analytics_router.get("/daily", response_model=AnalyticsResponse)
+async def get_daily(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_name: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    # The rollup rows themselves, one per day, group, category and source
+    try:
+        logger.info("get_daily endpoint accessed with start=%s, end=%s", start, end)
+        return await _aggregate(request.app.state.db, list(analytics.DIMENSIONS), start, end, group_name, category, source)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in get_daily: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,18 +1,24 @@
 from fastapi import APIRouter, HTTPException, UploadFile, Request, Depends
-from app.models.chat import ChatRequest
+from app.models.chat import ChatRequest, HistoryMessage, HistoryPage
 from app.models.bing_search import BingSearchRequest, BingSearchResult
-from utils import create_azure_client, calculate_tokens, summarize, store_retriever, get_retriever, store_documents, get_documents, delete_retriever, delete_documents, classify_message_category
+from utils import create_azure_client, calculate_tokens, summarize, store_retriever, get_retriever, store_documents, get_documents, delete_retriever, delete_documents
 from pydantic import BaseModel
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 from app.services.bing_search import search_bing_endpoint
 import logging
 from app.services.token_validation import validate_token
 from fastapi.responses import JSONResponse
 
-from app.database import Database
+from app.write_queue import WriteBehindQueue
+from app.classifier import keyword_category
+from app.token_accounting import TokenUsage, calculate_cost
+from app.context_builder import retrieve_context
+from app.history import HistoryCompactor
+from app.conversation_store import ConversationAccessError, Turn, conversation_store
+from app.response_cache import response_cache
+from app.request_planner import request_planner
+from config import Config
 import logging
 import uuid
 #from fastapi.responses import EventSourceResponse
@@ -31,6 +37,27 @@ retriever = None  # Global variable to store the retriever
 
 
 
+# Resolve the conversation history for a request, keeping the server-side store in sync
+# Chats started by another user are reported as not found
+def resolve_history(chat_id, user_id, request: ChatRequest):
+    try:
+        if request.history is not None:
+            # Full-history request format: adopt what the client sent
+            if chat_id:
+                conversation_store.replace(chat_id, user_id, request.history)
+            return request.history
+        if not chat_id:
+            return []
+        if request.last_message_id is None:
+            return conversation_store.history(chat_id, user_id) or []
+        history = conversation_store.truncate_after(chat_id, user_id, request.last_message_id)
+    except ConversationAccessError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if history is None:
+        # The server lost this chat (restart or eviction); the client has to resend its history
+        raise HTTPException(status_code=409, detail="Conversation not found on the server, resend the full history")
+    return history
+
 # Helper function to stream Azure response
 async def stream_azure_response(create_completion, inputs):
     async for chunk in await create_completion(messages=inputs["messages"], stream=True):
@@ -43,20 +70,17 @@ async def send_message(request: ChatRequest, req: Request, payload: dict = Depen
         logger.info("send_message endpoint accessed with message: %s", request.message)
         chat_id = req.headers.get("Chat-Id")  # Get chatId from headers
 
-        # Get the database connection from the FastAPI app state
-        db: Database = req.app.state.db
+        # Rows are written through the write-behind queue so the response never waits on MySQL
+        write_queue: WriteBehindQueue = req.app.state.write_queue
 
         # Extract oid from the validated token payload
         user_id = payload.get("oid")
         
-        # Get the retriever for this chat session
-        retriever = get_retriever(chat_id)
-        context_text = ""
-        if retriever:
-            context = retriever.get_relevant_documents(request.message)
-            context_text = " ".join([doc.page_content for doc in context])
-
-        conversation_history = "\n".join([f"{msg.type.capitalize()}: {msg.content}" for msg in request.history])
+        # Decide up front which sources this message needs, so no work is started only to be discarded
+        trace = request_planner.trace()
+        retriever = get_retriever(chat_id)  # Get the retriever for this chat session
+        history = resolve_history(chat_id, user_id, request)
+        plan = request_planner.plan(request.message, retriever is not None, len(history))
 
         # Define a prompt for LLM-based responses
         template = """You are an advanced AI assistant with expertise in a wide range of topics. Your task is to provide comprehensive, well-structured answers based on the given context, conversation history, and question. Your entire response must be formatted in Markdown. Follow these guidelines:
@@ -84,43 +108,96 @@ async def send_message(request: ChatRequest, req: Request, payload: dict = Depen
 
         # Use the ChatPromptTemplate to generate the message to be sent
         prompt = ChatPromptTemplate.from_template(template)
-        formatted_prompt = prompt.format(context=context_text, history=conversation_history, question=request.message)
-
-        # Check if the request message contains specific keywords that may require a Bing search
-        keywords = ["latest", "newest", "current"]
-        if any(keyword in request.message.lower() for keyword in keywords):
-            logger.info("Keywords detected in message, invoking Bing Search API.")
-            bing_response = await search_bing_endpoint(BingSearchRequest(query=request.message))
-            formatted_results = "\n\n".join(
-                [f"**{res.title}** - {res.link}\n{res.snippet}" for res in bing_response.results]
-            )
-            assistant_message = f"Bing Search Results:\n\n{formatted_results}"
-            source = "Bing"
-
-             # Generate message IDs
-            message_id = str(uuid.uuid4())
-
-            # Save Bing Search Response to the database
-            db.execute_query("""
-                INSERT INTO Chat_Messages (message_id, user_id, user_prompt, response, source)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (message_id, user_id, request.message, assistant_message, source))
-
-            # Send Bing search response directly to the frontend
-            final_data = {
-                "response": assistant_message,
-                "message_id": str(uuid.uuid4()),
-                "tokens": 0,  # No tokens for Bing Search
-                "cost": 0  # No cost for Bing Search
-            }
-
-             # Category classification after streaming completes
-            await classify_message_category(request.message, message_id, db)
-            print(final_data)
-            return JSONResponse(content={"data": final_data})
+
+        # Messages with specific keywords are answered from a Bing search; retrieval is skipped for them
+        if plan.use_bing:
+            try:
+                logger.info("Keywords detected in message, invoking Bing Search API.")
+                bing_response = await trace.run("bing", search_bing_endpoint(BingSearchRequest(query=request.message)))
+                formatted_results = "\n\n".join(
+                    [f"**{res.title}** - {res.link}\n{res.snippet}" for res in bing_response.results]
+                )
+                assistant_message = f"Bing Search Results:\n\n{formatted_results}"
+                source = "Bing"
+
+                 # Generate message IDs
+                message_id = str(uuid.uuid4())
+
+                # Queue the Bing Search Response for the database
+                # Confident keyword matches are categorized inline; the rest are left to the background classifier
+                await write_queue.enqueue("chat_message", (message_id, user_id, request.message, assistant_message, source, keyword_category(request.message)))
+
+                if chat_id:
+                    conversation_store.append(chat_id, user_id, Turn(str(uuid.uuid4()), "user", request.message), Turn(message_id, "assistant", assistant_message))
+
+                # Send Bing search response directly to the frontend
+                final_data = {
+                    "response": assistant_message,
+                    "message_id": message_id,
+                    "tokens": 0,  # No tokens for Bing Search
+                    "cost": 0  # No cost for Bing Search
+                }
+                print(final_data)
+                return JSONResponse(content={"data": final_data})
+            finally:
+                # Recorded even when the search or the queue write fails
+                trace.finish()
 
         else:
-            # If no keywords detected, proceed with the LLM model
+            # If no keywords detected, proceed with the LLM model. History compaction runs alongside
+            # retrieval or the response cache lookup (never both: only questions without documents
+            # are cacheable), so its thread work overlaps their embedding calls.
+            history_compactor: HistoryCompactor = req.app.state.history_compactor
+
+            # Newest turns verbatim, older turns replaced by the chat's cached rolling summary;
+            # the hashing and formatting run on a worker thread while retrieval awaits embeddings
+            stages = {"history": history_compactor.acompact(chat_id, history)}
+            if plan.use_retrieval:
+                # Async retrieval, then MMR ordering, dedup and overlap merging within the token budget
+                stages["retrieval"] = retrieve_context(retriever, request.message)
+            if plan.use_cache:
+                # Context-free opening questions are answered from the response cache when possible
+                stages["cache_lookup"] = response_cache.lookup(request.message)
+            results = await trace.run_concurrently(stages)
+
+            conversation_history = results["history"]
+            context_text = results["retrieval"][0] if plan.use_retrieval else ""
+            cached, query_vector = results.get("cache_lookup", (None, None))
+            category = keyword_category(request.message)
+
+            if cached is not None:
+                logger.info("Response cache hit for message: %s", request.message)
+
+                async def cached_event_generator(cached, write_queue, request, user_id):
+                    # Replays the stored answer in the same event format as a live completion
+                    try:
+                        message_id = str(uuid.uuid4())
+                        yield f"data: {json.dumps({'data': cached.response})}\n\n"
+                        final_data = {
+                            "response": cached.response,
+                            "message_id": message_id,
+                            "tokens": 0,  # No completion was made
+                            "prompt_tokens": 0,
+                            "completion_tokens": 0,
+                            "cost": 0,
+                            "cached": True
+                        }
+                        if chat_id:
+                            conversation_store.append(chat_id, user_id, Turn(str(uuid.uuid4()), "user", request.message), Turn(message_id, "assistant", cached.response))
+                        yield f"data: {json.dumps({'data': final_data})}\n\n"
+
+                        # Recorded with source 'Cache' so replays are told apart from paid completions
+                        await write_queue.enqueue("chat_message", (message_id, user_id, request.message, cached.response, "Cache", cached.category or category))
+                    except Exception as e:
+                        logger.error(f"Error replaying cached response: {str(e)}")
+                        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                    finally:
+                        trace.finish()
+                        yield "data: [DONE]\n\n"
+
+                return EventSourceResponse(cached_event_generator(cached, write_queue, request, user_id))
+
+            formatted_prompt = prompt.format(context=context_text, history=conversation_history, question=request.message)
             messages = [
                 {"role": "system", "content": "You are an advanced AI assistant with expertise in a wide range of topics."},
                 {"role": "user", "content": formatted_prompt}
@@ -129,13 +206,17 @@ async def send_message(request: ChatRequest, req: Request, payload: dict = Depen
             # Initialize the Azure OpenAI client with streaming enabled
             create_completion = create_azure_client(streaming=True)
 
-            async def event_generator(create_completion, messages, db, request, user_id):
-                total_tokens = calculate_tokens(request.message)  # Initial tokens for the user's message
+            async def event_generator(create_completion, messages, write_queue, request, user_id):
+                # Prompt tokens cover the full formatted prompt (context + history), not just the message
+                usage = TokenUsage(messages)
                 assistant_message = ""
 
                 try:
                     # Await the coroutine returned by create_completion
-                    completion_response = await create_completion(messages=messages)
+                    if Config.AZURE_OPENAI_STREAM_USAGE:
+                        completion_response = await create_completion(messages=messages, stream_options={"include_usage": True})
+                    else:
+                        completion_response = await create_completion(messages=messages)
 
                     if completion_response is None:
                         logger.error("Completion response is None, possibly due to an API error.")
@@ -145,12 +226,17 @@ async def send_message(request: ChatRequest, req: Request, payload: dict = Depen
                     async for chunk in completion_response:
                         if chunk.choices and chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
+                            if not assistant_message:
+                                trace.mark("first_token")
                             assistant_message += content  # Concatenate the content as string
+                            usage.add_chunk(content)  # Count completion tokens as they arrive
                             yield f"data: {json.dumps({'data': content})}\n\n"  # Stream to frontend
+                        if getattr(chunk, "usage", None):
+                            # Service-reported usage arrives on the last chunk when requested
+                            usage.apply_usage(chunk.usage)
 
-                    # Once all chunks are streamed, calculate the total tokens and cost
-                    total_tokens += calculate_tokens(assistant_message)
-                    cost = round((total_tokens / 1000) * 0.06, 2)
+                    total_tokens = usage.total_tokens
+                    cost = usage.cost
 
                     message_id = str(uuid.uuid4())
                     price_id = str(uuid.uuid4())
@@ -160,36 +246,37 @@ async def send_message(request: ChatRequest, req: Request, payload: dict = Depen
                         "response": assistant_message,
                         "message_id": message_id,
                         "tokens": total_tokens,
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens,
                         "cost": cost
                     }
 
-                    yield f"data: {json.dumps({'data': final_data})}\n\n"
+                    if chat_id:
+                        conversation_store.append(chat_id, user_id, Turn(str(uuid.uuid4()), "user", request.message), Turn(message_id, "assistant", assistant_message))
 
-                    # Store the user prompt and assistant response in the chat_messages table
-                    db.execute_query("""
-                        INSERT INTO Chat_Messages (message_id, user_id, user_prompt, response, source)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (message_id, user_id, request.message, assistant_message, "OpenAI"))
+                    if plan.use_cache and assistant_message:
+                        response_cache.put(request.message, assistant_message, category, query_vector)
 
-                    # Store the price details in the price table
-                    db.execute_query("""
-                        INSERT INTO Price (price_id, message_id, completion_price)
-                        VALUES (%s, %s, %s)
-                    """, (price_id, message_id, cost))
+                    yield f"data: {json.dumps({'data': final_data})}\n\n"
 
-                    # Category classification after streaming completes
-                    await classify_message_category(request.message, message_id, db)
+                    # Queue the user prompt, assistant response and price details for the database
+                    # Confident keyword matches are categorized inline; the rest are left to the background classifier
+                    await write_queue.enqueue("chat_message", (message_id, user_id, request.message, assistant_message, "OpenAI", category))
+                    await write_queue.enqueue("price", (price_id, message_id, cost, usage.prompt_tokens, usage.completion_tokens))
 
                 except Exception as e:
                     logger.error(f"Error during streaming: {str(e)}")
                     yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
                 finally:
+                    trace.finish()
                     # End the event stream
                     yield "data: [DONE]\n\n"
 
-            return EventSourceResponse(event_generator(create_completion, messages, db, request, user_id))
+            return EventSourceResponse(event_generator(create_completion, messages, write_queue, request, user_id))
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in send_message: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -200,7 +287,9 @@ async def upload_document(file: UploadFile, req: Request, payload: dict = Depend
     try:
         logger.info("upload_document endpoint accessed with file: %s", file.filename)
         chat_id = req.headers.get("Chat-Id")  # Get chatId from headers
-        result, new_retriever = summarize(file, chat_id)
+        if chat_id and not conversation_store.owns(chat_id, payload.get("oid")):
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        result, new_retriever = await summarize(file, chat_id)
         summary_text = result["output_text"]
 
         # global retriever
@@ -210,7 +299,7 @@ async def upload_document(file: UploadFile, req: Request, payload: dict = Depend
         store_retriever(chat_id, new_retriever)
 
         tokens = calculate_tokens(summary_text)
-        cost = round((tokens / 1000) * 0.06, 2)
+        cost = calculate_cost(0, tokens)
 
         # Extract oid from the validated token payload
         user_id = payload.get("oid")
@@ -218,29 +307,30 @@ async def upload_document(file: UploadFile, req: Request, payload: dict = Depend
         # Generate message IDs
         message_id = str(uuid.uuid4())  
 
-        # Get the database connection from the FastAPI app state
-        db: Database = req.app.state.db
+        # Get the write-behind queue from the FastAPI app state
+        write_queue: WriteBehindQueue = req.app.state.write_queue
 
-        # Store the user prompt and assistant response in the chat_messages table
-        db.execute_query("""
-            INSERT INTO Chat_Messages (message_id, user_id, user_prompt, response, source, category)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (message_id, user_id, f"Generating File Summary for {file.filename}", summary_text, "Document", "Text Summarization"))
+        # Queue the user prompt and assistant response for the chat_messages table
+        await write_queue.enqueue("chat_message", (message_id, user_id, f"Generating File Summary for {file.filename}", summary_text, "Document", "Text Summarization"))
 
          # Generate price ID
         price_id = str(uuid.uuid4())  
 
-        # Store the price detials the price table
-        db.execute_query("""
-            INSERT INTO Price (price_id, message_id, completion_price)
-            VALUES (%s, %s, %s)
-        """, (price_id, message_id, cost))
+        # Queue the price details for the price table
+        await write_queue.enqueue("price", (price_id, message_id, cost, None, tokens))
+
+        summary_message = f"Your document '{file.filename}' has been uploaded. If you need any specific sections or details from the document summarized, or expanded upon, please let me know!"
+        if chat_id:
+            conversation_store.append(chat_id, user_id, Turn(message_id, "assistant", summary_message))
 
         return {
-            "summary": f"Your document '{file.filename}' has been uploaded. If you need any specific sections or details from the document summarized, or expanded upon, please let me know!",
+            "summary": summary_message,
             "tokens": tokens,
+            "message_id": message_id,
             "cost": cost
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in upload_document: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -259,10 +349,34 @@ async def cleanup_sessions(request: CleanupRequest, req: Request, payload: dict
             delete_retriever(chat_id)
             # Delete documents
             delete_documents(chat_id)
+            # Drop the stored conversation and its cached history summary
+            conversation_store.delete(chat_id, payload.get("oid"))
+            req.app.state.history_compactor.forget(chat_id)
             logger.info("Cleaned  chat_ids: %s",chat_id )
 
         return {"message": "Chat sessions cleaned up successfully.", "chat_ids_cleaned": chat_ids}
     
     except Exception as e:
         logger.error("Error in cleanup_sessions: %s", str(e))
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@chat_router.get("/history", response_model=HistoryPage)
+async def get_history(req: Request, after: str = None, limit: int = 50, payload: dict = Depends(validate_token)):
+    # Keyset-paginated history for the chat in the Chat-Id header; pass next_cursor as `after`
+    chat_id = req.headers.get("Chat-Id")
+    if not chat_id:
+        raise HTTPException(status_code=400, detail="Chat-Id header is required")
+    limit = max(1, min(limit, 200))
+    try:
+        turns, next_cursor = conversation_store.page(chat_id, payload.get("oid"), after=after, limit=limit)
+    except ConversationAccessError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unknown cursor")
+    if turns is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return HistoryPage(
+        messages=[HistoryMessage(message_id=turn.message_id, type=turn.type, content=turn.content) for turn in turns],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,39 @@
+import datetime
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from app.database import Database
+from app import export
+
+export_router = APIRouter()
+logger = logging.getLogger("export_service")
+
+
+@export_router.get("/{table}")
+async def export_table(
+    request: Request,
+    table: str,
+    format: str = "csv",
+    since: Optional[datetime.datetime] = None,
+    since_id: str = "",
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    # Streams a whole table ordered by (created_at, id). For incremental refreshes pass the
+    # created_at and id of the last row already loaded as since/since_id; only later rows are sent.
+    logger.info("export endpoint accessed for %s as %s (since=%s)", table, format, since)
+    spec = export.TABLES.get(table)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}; expected one of {', '.join(export.TABLES)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}; expected one of {', '.join(export.FORMATS)}")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow to be installed")
+
+    db: Database = request.app.state.db
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        export.stream_export(db, spec, format, since, since_id, limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+    )
@@ -1,7 +1,11 @@
+import asyncio
 import logging
 from fastapi import APIRouter, HTTPException, Request, Depends
 from app.models.feedback import Feedback
 from app.database import Database
+from app import analytics
+from mysql.connector import Error, errorcode
+from config import Config
 from app.services.token_validation import validate_token
 import uuid
 
@@ -28,9 +32,30 @@ async def receive_feedback(request: Request, feedback: Feedback, payload: dict =
             VALUES (%s, %s, %s, %s, %s)
         """
         values = (feedback_id, str(feedback.message_id), feedback.rating, feedback.comment, user_id)
-        db.execute_query(sql, values)
+
+        # The rating is added to the analytics rollup in the same transaction
+        def work(cursor):
+            cursor.execute(sql, values)
+            analytics.add_feedback(cursor, [feedback_id])
+
+        # The message row may still be in a write-behind queue: this worker's is waited for, and a
+        # foreign key failure (queued in another worker) is retried after a flush interval
+        message_id = str(feedback.message_id)
+        await request.app.state.write_queue.wait_for_message(message_id)
+        for attempt in range(Config.FEEDBACK_MESSAGE_RETRIES + 1):
+            try:
+                await db.run_in_transaction(work)
+                break
+            except Error as e:
+                if e.errno != errorcode.ER_NO_REFERENCED_ROW_2:
+                    raise
+                if attempt == Config.FEEDBACK_MESSAGE_RETRIES:
+                    raise HTTPException(status_code=404, detail="Message not found")
+                await asyncio.sleep(Config.WRITE_QUEUE_FLUSH_INTERVAL)
         
         return {"status": "Feedback received"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in receive_feedback: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
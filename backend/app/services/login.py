@@ -1,6 +1,7 @@
 import uuid
 import logging
 from fastapi import APIRouter, HTTPException, Request, Depends
+from app import analytics
 from app.database import Database
 from app.services.token_validation import validate_token
 
@@ -46,9 +47,7 @@ async def login(request: Request, payload: dict = Depends(validate_token)):
 
         # Check if user already exists in the database
         user_query = "SELECT user_id, name, group_name FROM Users WHERE user_id = %s"
-        cursor = db.connection.cursor()
-        cursor.execute(user_query, (oid,))
-        user = cursor.fetchone()  
+        user = await db.fetch_one(user_query, (oid,))
 
         if user:
             # User exists, check if group_name is already set
@@ -57,26 +56,22 @@ async def login(request: Request, payload: dict = Depends(validate_token)):
             if group_name:
                 logger.info("User '%s' already has a group_name: '%s'", given_name, group_name)
             else:
-                # Assign group_name if not already set
+                # Assign group_name if not already set; the user's messages counted so far under no
+                # group move to it in the analytics rollup, in the same transaction
                 group_name = match_group(given_name)
-                update_query = "UPDATE Users SET group_name = %s WHERE user_id = %s"
-                cursor.execute(update_query, (group_name, oid))
-                db.connection.commit()
-                logger.info("Assigned group '%s' to user '%s'", group_name, given_name)
+                assigned = await db.run_in_transaction(lambda cursor: analytics.regroup_user(cursor, oid, group_name))
+                if assigned:
+                    logger.info("Assigned group '%s' to user '%s'", group_name, given_name)
 
             return {"message": "User logged in", "user": {"user_id": user[0], "name": given_name, "group_name": group_name}}
         else:
             # New user, insert into database and assign group_name
             group_name = match_group(given_name)
             insert_query = "INSERT INTO Users (user_id, name, group_name) VALUES (%s, %s, %s)"
-            cursor.execute(insert_query, (oid, given_name, group_name))
-            db.connection.commit()  # Commit the transaction
+            await db.execute(insert_query, (oid, given_name, group_name))  # Commits on its own pooled connection
             logger.info("New user created with oid: %s and assigned group '%s'", oid, group_name)
             return {"message": "New user created", "user": {"user_id": oid, "name": given_name, "group_name": group_name}}
 
     except Exception as e:
         logger.error("Error during login: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
-
-    finally:
-        cursor.close()  # Close the cursor
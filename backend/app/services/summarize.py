@@ -1,29 +1,122 @@
+import asyncio
+import json
 import logging
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
+import os
+import uuid
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Request
+from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 from app.models.summarize import SummarizeRequest
-from utils import summarize, calculate_tokens
+from utils import summarize, summarize_upload, calculate_tokens, store_retriever
+from app.conversation_store import ConversationAccessError, Turn, conversation_store
+from app.ingestion import spool_upload
+from app.token_accounting import calculate_cost
 from app.services.token_validation import validate_token
 
 summarize_router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+_DONE = object()
+
+
+def summary_result(summary_text: str) -> dict:
+    tokens = calculate_tokens(summary_text)
+    cost = calculate_cost(0, tokens)
+    return {
+        "summary": summary_text,
+        "tokens": tokens,
+        "cost": cost
+    }
+
+
+def discard_upload(temp_path: str):
+    # summarize_upload removes the file itself; this covers a client that disconnects before
+    # the stream (and so summarize_upload) ever starts
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def keep_in_chat(chat_id: str, user_id: str, summary_text: str, retriever):
+    # The summary becomes a turn of the chat, which makes the caller its owner like
+    # /chat/upload_document does; raises ConversationAccessError if someone else claimed it meanwhile
+    conversation_store.append(chat_id, user_id, Turn(str(uuid.uuid4()), "assistant", summary_text))
+    store_retriever(chat_id, retriever)
+
+
+async def summary_event_generator(temp_path: str, file_hash: str, file_name: str, chat_id, user_id):
+    # Same `data:` framing as /chat/send_message: progress events, summary text as it is
+    # generated, the final result, then [DONE]
+    events = asyncio.Queue()
+
+    def on_progress(stage, done, total):
+        events.put_nowait({"progress": {"stage": stage, "done": done, "total": total}})
+
+    def on_token(content):
+        events.put_nowait({"data": content})
+
+    async def run():
+        try:
+            return await summarize_upload(temp_path, file_hash, file_name, chat_id, on_progress, on_token)
+        finally:
+            events.put_nowait(_DONE)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            event = await events.get()
+            if event is _DONE:
+                break
+            yield f"data: {json.dumps(event)}\n\n"
+
+        result, retriever = await task
+        if chat_id:
+            keep_in_chat(chat_id, user_id, result["output_text"], retriever)
+        final_data = summary_result(result["output_text"])
+        logger.info("Summary generated: %s", final_data["summary"])
+        yield f"data: {json.dumps({'data': final_data})}\n\n"
+    except Exception as e:
+        logger.error("Error in summarize_file stream: %s", str(e))
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        # No-op once finished; stops the LLM calls if the client went away mid-stream
+        task.cancel()
+    yield "data: [DONE]\n\n"
+
+
 @summarize_router.post("/")
-async def summarize_file(file: UploadFile = File(...), payload: dict = Depends(validate_token)):
+async def summarize_file(req: Request, file: UploadFile = File(...), stream: bool = False, stateless: bool = False,
+                         payload: dict = Depends(validate_token)):
+    # With a Chat-Id header the document joins that chat's stores, like /chat/upload_document;
+    # without one (or with stateless=true) nothing is kept once the summary is returned
     logger.info("summarize_file endpoint accessed with file: %s", file.filename)
+    chat_id = None if stateless else req.headers.get("Chat-Id")
+    user_id = payload.get("oid")
     try:
-        result, _ = summarize(file)
-        summary_text = result["output_text"]
-        
-        tokens = calculate_tokens(summary_text)
-        cost = round((tokens / 1000) * 0.06, 2)
-
-        logger.info("Summary generated: %s", summary_text)
-        return {
-            "summary": summary_text,
-            "tokens": tokens,
-            "cost": cost
-        }
+        # Checked before anything is spooled: only the chat's owner may add documents to it
+        if chat_id and not conversation_store.owns(chat_id, user_id):
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        if stream:
+            # Spool before returning, the upload is closed once the endpoint returns
+            temp_path, file_hash = await spool_upload(file)
+            return EventSourceResponse(
+                summary_event_generator(temp_path, file_hash, file.filename, chat_id, user_id),
+                background=BackgroundTask(discard_upload, temp_path),
+            )
+
+        result, retriever = await summarize(file, chat_id)
+        if chat_id:
+            keep_in_chat(chat_id, user_id, result["output_text"], retriever)
+        final_data = summary_result(result["output_text"])
+
+        logger.info("Summary generated: %s", final_data["summary"])
+        return final_data
+    except HTTPException:
+        raise
+    except ConversationAccessError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
     except Exception as e:
         logger.error("Error in summarize_file: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
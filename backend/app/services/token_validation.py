@@ -1,10 +1,10 @@
+import hashlib
 import logging
-import requests
 import jwt
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import OAuth2AuthorizationCodeBearer
-from jwt.algorithms import RSAAlgorithm
 from config import Config
+from app.jwks import key_manager, verified_tokens
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -13,39 +13,36 @@ logger = logging.getLogger(__name__)
 AZURE_TENANT_ID = Config.AZURE_TENANT_ID
 AZURE_CLIENT_ID = Config.AZURE_CLIENT_ID
 API_AUDIENCE = Config.API_AUDIENCE # Application ID URI
-OPENID_CONFIG_URL = f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/v2.0/.well-known/openid-configuration"
 
-# Fetch OpenID configuration from Azure AD
-response = requests.get(OPENID_CONFIG_URL)
-openid_config = response.json()
+# Signing keys are loaded by the key manager at startup and refreshed in the background,
+# so importing this module makes no network calls
 
-# Extract JWKS URI from the OpenID configuration
-jwks_uri = openid_config["jwks_uri"]
-
-# Fetch JWKS (public keys)
-jwks_response = requests.get(jwks_uri)
-jwks = jwks_response.json()
-
-# OAuth2 configuration
+# OAuth2 configuration (Azure AD v2.0 endpoints, used for the OpenAPI docs)
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
-    authorizationUrl=openid_config["authorization_endpoint"],
-    tokenUrl=openid_config["token_endpoint"],
+    authorizationUrl=f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/oauth2/v2.0/authorize",
+    tokenUrl=f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/oauth2/v2.0/token",
     scopes={"User.Read": "Read user information"}
 )
 
-# Function to retrieve the RSA public key from the JWKS
-def get_rsa_key(kid):
-    for key in jwks["keys"]:
-        if key["kid"] == kid:
-            return RSAAlgorithm.from_jwk(key)
-    raise HTTPException(status_code=401, detail="Invalid token: key not found")
+# Function to retrieve the RSA public key for a kid, refetching the JWKS if it is unknown
+async def get_rsa_key(kid):
+    rsa_key = await key_manager.get_key(kid)
+    if rsa_key is None:
+        raise HTTPException(status_code=401, detail="Invalid token: key not found")
+    return rsa_key
 
 # Token validation function with correct audience validation
 async def validate_token(token: str = Security(oauth2_scheme)):
+    # Tokens already verified in an earlier request are accepted until their exp
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = verified_tokens.get(token_hash)
+    if payload is not None:
+        return payload
+
     try:
         # Decode the token header to get the key ID (kid)
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = get_rsa_key(unverified_header["kid"])
+        rsa_key = await get_rsa_key(unverified_header["kid"])
 
         # Validate the token with the public RSA key
         payload = jwt.decode(
@@ -56,6 +53,7 @@ async def validate_token(token: str = Security(oauth2_scheme)):
             issuer=f"https://sts.windows.net/{AZURE_TENANT_ID}/"  # Ensure the token was issued by your Azure AD tenant
         )
         logger.info(f"Token payload validated successfully")
+        verified_tokens.put(token_hash, payload)
         return payload
     except jwt.ExpiredSignatureError:
         logger.error("Token expired")
@@ -63,3 +61,15 @@ async def validate_token(token: str = Security(oauth2_scheme)):
     except jwt.InvalidTokenError as e:
         logger.error(f"Invalid token: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
+
+# Authorization for routers that read every user's data (/analytics, /export); 403 unless the token carries
+# an allowed app role or belongs to an allowed user
+def has_reporting_access(payload: dict) -> bool:
+    roles = payload.get("roles") or []
+    return any(role in Config.REPORTING_ALLOWED_ROLES for role in roles) or payload.get("oid") in Config.REPORTING_ALLOWED_USERS
+
+async def require_reporting_access(payload: dict = Depends(validate_token)):
+    if not has_reporting_access(payload):
+        logger.warning("Reporting access denied for oid: %s", payload.get("oid"))
+        raise HTTPException(status_code=403, detail="Not authorized to read reporting data")
+    return payload
@@ -0,0 +1,166 @@
+# app/session_store.py
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List
+from langchain_core.documents import Document
+from config import Config
+
+logger = logging.getLogger("session_store")
+
+
+def _retriever_nbytes(retriever) -> int:
+    # Vector stores that know their footprint report it through `nbytes`
+    vectorstore = getattr(retriever, "vectorstore", retriever)
+    return int(getattr(vectorstore, "nbytes", 0))
+
+
+class _Session:
+    __slots__ = ("retriever", "retriever_nbytes", "documents", "documents_nbytes", "last_access")
+
+    def __init__(self):
+        self.retriever = None
+        self.retriever_nbytes = 0
+        # Documents are kept as (zlib-compressed text, metadata) pairs
+        self.documents = []
+        self.documents_nbytes = 0
+        self.last_access = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return self.retriever_nbytes + self.documents_nbytes
+
+    @property
+    def empty(self) -> bool:
+        return self.retriever is None and not self.documents
+
+
+class SessionStore:
+    # Per-chat retrievers and documents with LRU order, idle-TTL expiry and a memory ceiling
+    # measured in bytes of stored text and vectors.
+
+    def __init__(self, max_chats: int = None, idle_ttl: float = None, max_bytes: int = None):
+        self.max_chats = max_chats or Config.SESSION_MAX_CHATS
+        self.idle_ttl = idle_ttl or Config.SESSION_IDLE_TTL
+        self.max_bytes = max_bytes or Config.SESSION_MAX_BYTES
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._nbytes = 0
+
+        # Counters exposed through stats()
+        self._hits = 0
+        self._misses = 0
+        self._evicted_lru = 0
+        self._evicted_ttl = 0
+        self._evicted_memory = 0
+
+    def _touch(self, chat_id: str, create: bool = False):
+        session = self._sessions.get(chat_id)
+        if session is not None and time.monotonic() - session.last_access > self.idle_ttl:
+            self._drop(chat_id)
+            self._evicted_ttl += 1
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[chat_id] = _Session()
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(chat_id)
+        return session
+
+    def _drop(self, chat_id: str):
+        session = self._sessions.pop(chat_id, None)
+        if session is not None:
+            self._nbytes -= session.nbytes
+
+    def _evict(self, keep: str):
+        # Expired sessions first, then least recently used until both limits hold
+        now = time.monotonic()
+        for chat_id in [cid for cid, s in self._sessions.items() if now - s.last_access > self.idle_ttl and cid != keep]:
+            self._drop(chat_id)
+            self._evicted_ttl += 1
+        while len(self._sessions) > self.max_chats or (self._nbytes > self.max_bytes and len(self._sessions) > 1):
+            chat_id = next(iter(self._sessions))
+            if chat_id == keep:
+                self._sessions.move_to_end(chat_id)
+                chat_id = next(iter(self._sessions))
+            over_memory = self._nbytes > self.max_bytes
+            self._drop(chat_id)
+            if over_memory:
+                self._evicted_memory += 1
+            else:
+                self._evicted_lru += 1
+            logger.info("Evicted chat session %s from the session store.", chat_id)
+
+    def set_retriever(self, chat_id: str, retriever):
+        with self._lock:
+            session = self._touch(chat_id, create=True)
+            self._nbytes -= session.retriever_nbytes
+            session.retriever = retriever
+            session.retriever_nbytes = _retriever_nbytes(retriever)
+            self._nbytes += session.retriever_nbytes
+            self._evict(keep=chat_id)
+
+    def get_retriever(self, chat_id: str):
+        with self._lock:
+            session = self._touch(chat_id)
+            if session is None or session.retriever is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return session.retriever
+
+    def delete_retriever(self, chat_id: str):
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return
+            self._nbytes -= session.retriever_nbytes
+            session.retriever, session.retriever_nbytes = None, 0
+            if session.empty:
+                self._drop(chat_id)
+
+    def add_documents(self, chat_id: str, documents: List[Document]):
+        compressed = [(zlib.compress(doc.page_content.encode("utf-8"), 1), dict(doc.metadata)) for doc in documents]
+        added = sum(len(text) for text, _ in compressed)
+        with self._lock:
+            session = self._touch(chat_id, create=True)
+            session.documents.extend(compressed)
+            session.documents_nbytes += added
+            self._nbytes += added
+            self._evict(keep=chat_id)
+
+    def get_documents(self, chat_id: str) -> List[Document]:
+        with self._lock:
+            session = self._touch(chat_id)
+            stored = list(session.documents) if session is not None else []
+        return [Document(page_content=zlib.decompress(text).decode("utf-8"), metadata=metadata) for text, metadata in stored]
+
+    def delete_documents(self, chat_id: str):
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return
+            self._nbytes -= session.documents_nbytes
+            session.documents, session.documents_nbytes = [], 0
+            if session.empty:
+                self._drop(chat_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chats": len(self._sessions),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evicted_lru": self._evicted_lru,
+                "evicted_ttl": self._evicted_ttl,
+                "evicted_memory": self._evicted_memory,
+            }
+
+
+# Process-wide store behind the store_/get_/delete_ helpers in utils
+session_store = SessionStore()
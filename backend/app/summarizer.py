@@ -0,0 +1,193 @@
+# app/summarizer.py
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from langchain_core.documents import Document
+from config import Config
+from app.embedding_cache import get_summary_cache, hash_text
+from app.token_accounting import count_tokens
+
+logger = logging.getLogger("summarizer")
+
+SUMMARY_PROMPT = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+
+COMBINE_PROMPT = """The following are summaries of parts of a larger text:
+
+
+"{text}"
+
+
+Combine them into one concise summary that keeps the key points of each part.
+
+CONCISE SUMMARY:"""
+
+
+def group_by_source(docs: List[Document]) -> List[List[Document]]:
+    # Pages of one uploaded file sit next to each other in the chat's document store
+    groups = []
+    for doc in docs:
+        if groups and groups[-1][-1].metadata.get("source") == doc.metadata.get("source"):
+            groups[-1].append(doc)
+        else:
+            groups.append([doc])
+    return groups
+
+
+class Summarizer:
+    # Summarizes each uploaded document once and caches the result by content hash, so a chat
+    # with several files costs one new summary per upload plus a short combine call. Documents
+    # that fit SUMMARY_STUFF_TOKENS are summarized in one call; larger ones are split into
+    # sections that are summarized concurrently (map) and then combined (reduce).
+
+    def __init__(self, max_concurrency: int = None, cache_size: int = None):
+        self._semaphore = asyncio.Semaphore(max_concurrency or Config.SUMMARY_MAX_CONCURRENCY)
+        self._cache_size = cache_size or Config.SUMMARY_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._splitter = None  # Built on first map-reduce
+
+        # Counters exposed through stats()
+        self._llm_calls = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._map_reduce_documents = 0
+
+    async def _complete(self, prompt: str, text: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        # With on_token the call is streamed and each delta is handed over as it arrives
+        # Imported here: utils imports this module for the upload path
+        from utils import create_azure_client
+
+        completion = create_azure_client(streaming=on_token is not None, temperature=0.7)
+        async with self._semaphore:
+            response = await completion([{"role": "user", "content": prompt.format(text=text)}])
+            if on_token is None:
+                content = response.choices[0].message.content
+            else:
+                parts = []
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        on_token(chunk.choices[0].delta.content)
+                content = "".join(parts)
+        self._llm_calls += 1
+        return content.strip()
+
+    async def _cached(self, key: str):
+        # In-process LRU first, then the on-disk cache shared by all workers on the host
+        summary = self._cache.get(key)
+        if summary is None:
+            cache = get_summary_cache()
+            if cache is not None:
+                summary = await asyncio.get_running_loop().run_in_executor(None, cache.get_summary, key)
+        if summary is not None:
+            self._remember(key, summary)
+        return summary
+
+    def _remember(self, key: str, summary: str):
+        self._cache[key] = summary
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def _reduce(self, summaries: List[str], on_token: Optional[Callable[[str], None]] = None) -> str:
+        # Combine in groups that fit one call, repeating until a single summary is left
+        loop = asyncio.get_running_loop()
+        while len(summaries) > 1:
+            sizes = await loop.run_in_executor(None, lambda: [count_tokens(summary) for summary in summaries])
+            groups, current, used = [], [], 0
+            for summary, size in zip(summaries, sizes):
+                if current and used + size > Config.SUMMARY_STUFF_TOKENS:
+                    groups.append(current)
+                    current, used = [], 0
+                current.append(summary)
+                used += size
+            groups.append(current)
+            if len(groups) == len(summaries):
+                # Every summary is too large to pair up; combine them all rather than loop forever
+                groups = [summaries]
+            # Only the last combine call produces the final text, so only it is streamed
+            final_token = on_token if len(groups) == 1 else None
+            summaries = await asyncio.gather(*(self._complete(COMBINE_PROMPT, "\n\n".join(group), final_token) for group in groups))
+        return summaries[0]
+
+    async def summarize_document(self, docs: List[Document], on_progress: Optional[Callable[[str, int, int], None]] = None,
+                                 on_token: Optional[Callable[[str], None]] = None) -> str:
+        # on_progress(stage, done, total) reports map progress; on_token receives the final summary text
+        text = "\n\n".join(doc.page_content for doc in docs)
+        key = hash_text(f"{Config.AZURE_OPENAI_DEPLOYMENT_NAME}\n{text}")
+        summary = await self._cached(key)
+        if summary is not None:
+            self._cache_hits += 1
+            if on_token is not None:
+                on_token(summary)
+            return summary
+        self._cache_misses += 1
+
+        loop = asyncio.get_running_loop()
+        tokens = await loop.run_in_executor(None, count_tokens, text)
+        if tokens <= Config.SUMMARY_STUFF_TOKENS:
+            summary = await self._complete(SUMMARY_PROMPT, text, on_token)
+        else:
+            self._map_reduce_documents += 1
+            if self._splitter is None:
+                from langchain_text_splitters import RecursiveCharacterTextSplitter
+                self._splitter = RecursiveCharacterTextSplitter(chunk_size=Config.SUMMARY_MAP_TOKENS, chunk_overlap=0, length_function=count_tokens)
+            sections = await loop.run_in_executor(None, self._splitter.split_text, text)
+            logger.info("Map-reduce summary over %s sections (%s tokens)", len(sections), tokens)
+            done = 0
+
+            async def summarize_section(section):
+                nonlocal done
+                partial = await self._complete(SUMMARY_PROMPT, section)
+                done += 1
+                if on_progress is not None:
+                    on_progress("map", done, len(sections))
+                return partial
+
+            partials = await asyncio.gather(*(summarize_section(section) for section in sections))
+            summary = await self._reduce(list(partials), on_token)
+
+        self._remember(key, summary)
+        cache = get_summary_cache()
+        if cache is not None:
+            await loop.run_in_executor(None, cache.put_summary, key, summary)
+        return summary
+
+    async def summarize(self, docs: List[Document], on_progress: Optional[Callable[[str, int, int], None]] = None,
+                        on_token: Optional[Callable[[str], None]] = None) -> str:
+        # One summary per uploaded document (mostly cache hits), then a single combine call
+        groups = group_by_source(docs)
+        if len(groups) == 1:
+            return await self.summarize_document(groups[0], on_progress, on_token)
+        done = 0
+
+        async def summarize_group(group):
+            nonlocal done
+            summary = await self.summarize_document(group, on_progress)
+            done += 1
+            if on_progress is not None:
+                on_progress("documents", done, len(groups))
+            return summary
+
+        summaries = await asyncio.gather(*(summarize_group(group) for group in groups))
+        return await self._reduce(list(summaries), on_token)
+
+    def stats(self):
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            "llm_calls": self._llm_calls,
+            "cache_hits": self._cache_hits,
+            "cache_misses": self._cache_misses,
+            "hit_rate": round(self._cache_hits / lookups, 4) if lookups else 0.0,
+            "map_reduce_documents": self._map_reduce_documents,
+        }
+
+
+# Process-wide summarizer shared by the upload and summarize endpoints
+summarizer = Summarizer()
@@ -0,0 +1,62 @@
+# app/token_accounting.py
+from functools import lru_cache
+from typing import List
+from config import Config
+
+# Per-message framing overhead of the chat format, plus the tokens priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base"):
+    # Building the BPE ranks is expensive, so each encoding is loaded once per process (at warmup)
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return len(get_encoding().encode(text))
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message.get("content", "")) for message in messages) + TOKENS_PER_REPLY
+
+
+def calculate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return round(
+        (prompt_tokens / 1000) * Config.PROMPT_PRICE_PER_1K_TOKENS
+        + (completion_tokens / 1000) * Config.COMPLETION_PRICE_PER_1K_TOKENS,
+        2,
+    )
+
+
+class TokenUsage:
+    # Tracks prompt and completion tokens for one completion. Completion tokens are counted
+    # chunk by chunk while streaming; usage reported by the service replaces the estimate.
+
+    def __init__(self, messages: List[dict] = None):
+        self.prompt_tokens = count_message_tokens(messages) if messages else 0
+        self.completion_tokens = 0
+        self.reported = False
+
+    def add_chunk(self, text: str):
+        if not self.reported:
+            self.completion_tokens += count_tokens(text)
+
+    def apply_usage(self, usage):
+        if usage is None:
+            return
+        self.prompt_tokens = usage.prompt_tokens
+        self.completion_tokens = usage.completion_tokens
+        self.reported = True
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return calculate_cost(self.prompt_tokens, self.completion_tokens)
@@ -0,0 +1,239 @@
+# app/vector_index.py
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from config import Config
+
+DTYPES = ("float32", "float16", "int8")
+
+
+class NumpyVectorStore(VectorStore):
+    # Keeps all of a chat's vectors in one contiguous matrix and scores a query against every
+    # row with a single matrix-vector product. Rows are L2-normalized on insert, so the dot
+    # product is the cosine similarity. float16 halves and int8 quarters the matrix size;
+    # int8 rows carry their own scale factor.
+
+    def __init__(self, embedding: Embeddings, dtype: str = None, initial_capacity: int = 64):
+        dtype = dtype or Config.VECTOR_INDEX_DTYPE
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector index dtype: {dtype}")
+        self.embedding = embedding
+        self.dtype = dtype
+        self._initial_capacity = initial_capacity
+        self._matrix = None
+        self._scales = None
+        self._size = 0
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._ids: List[str] = []
+        # Serializes appends (uploads embed on executor threads); searches only take it to snapshot
+        self._lock = threading.Lock()
+        # Content keys (hash + extension) of the files already in this index
+        self.indexed_files = set()
+
+        # Small LRU of query embeddings, so repeated or regenerated questions skip the embedding call
+        self._query_cache = OrderedDict()
+        self._query_cache_size = Config.QUERY_EMBEDDING_CACHE_SIZE
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        # Allocated matrix plus stored chunk text, the figure the session store budgets against
+        matrix = self._matrix.nbytes if self._matrix is not None else 0
+        scales = self._scales.nbytes if self._scales is not None else 0
+        return matrix + scales + sum(len(text.encode("utf-8")) for text in self._texts)
+
+    def _reserve(self, rows: int, dim: int):
+        # Grow geometrically so repeated appends stay amortized O(1) per row
+        needed = self._size + rows
+        if self._matrix is not None and needed <= self._matrix.shape[0]:
+            return
+        capacity = max(needed, self._initial_capacity, 2 * (self._matrix.shape[0] if self._matrix is not None else 0))
+        matrix = np.empty((capacity, dim), dtype=self.dtype)
+        scales = np.empty(capacity, dtype=np.float32)
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+            scales[:self._size] = self._scales[:self._size]
+        self._matrix, self._scales = matrix, scales
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: List[dict] = None, ids: List[str] = None) -> List[str]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+            raise ValueError("Expected one vector per text")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            if self._matrix is not None and vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"Expected vectors of dimension {self._matrix.shape[1]}, got {vectors.shape[1]}")
+            self._reserve(len(texts), vectors.shape[1])
+            rows = slice(self._size, self._size + len(texts))
+            if self.dtype == "int8":
+                scales = np.abs(vectors).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                self._matrix[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+                self._scales[rows] = scales
+            else:
+                self._matrix[rows] = vectors.astype(self.dtype)
+                self._scales[rows] = 1.0
+
+            # Texts go in before the size moves, so a search running while documents are still
+            # being ingested never sees a row without its text
+            self._texts.extend(texts)
+            self._metadatas.extend(metadatas or [{} for _ in texts])
+            self._ids.extend(ids)
+            self._size += len(texts)
+        return ids
+
+    def merge_from(self, other: "NumpyVectorStore") -> List[str]:
+        # Appends every row of another index without re-embedding, e.g. a fully staged upload
+        size, matrix, scales = other._snapshot()
+        if size == 0:
+            return []
+        vectors = other._row_vectors(np.arange(size), matrix, scales)
+        return self.add_vectors(vectors, other._texts[:size], other._metadatas[:size], other._ids[:size])
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(np.asarray(vectors, dtype=np.float32), texts, metadatas, kwargs.get("ids"))
+
+    def _snapshot(self):
+        # Rows below _size are never rewritten and a resize copies into a new matrix, so this
+        # (size, matrix, scales) triple stays consistent while appends continue
+        with self._lock:
+            return self._size, self._matrix, self._scales
+
+    def _scores(self, query_vector, size: int, matrix: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        matrix = matrix[:size]
+        if self.dtype == "float32":
+            return matrix @ query
+        # Upcast per block so quantized rows never materialize as a full float32 copy
+        scores = np.empty(size, dtype=np.float32)
+        block = 8192
+        for start in range(0, size, block):
+            stop = min(start + block, size)
+            scores[start:stop] = matrix[start:stop].astype(np.float32) @ query
+        if self.dtype == "int8":
+            scores *= scales[:size]
+        return scores
+
+    def _top_k(self, embedding: List[float], k: int) -> Tuple[np.ndarray, np.ndarray, tuple]:
+        # Rows and scores of the best k, plus the (matrix, scales) snapshot they were scored on
+        size, matrix, scales = self._snapshot()
+        if size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), (matrix, scales)
+        scores = self._scores(embedding, size, matrix, scales)
+        k = min(k, size)
+        # argpartition finds the top k in O(n); only those k are sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top], (matrix, scales)
+
+    def _row_vectors(self, rows: np.ndarray, matrix: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        # Dequantized (unit-length, float32) vectors for the given rows
+        vectors = matrix[rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= scales[rows][:, None]
+        return vectors
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        top, scores, _ = self._top_k(embedding, k)
+        return [(self._document(row), float(score)) for row, score in zip(top, scores)]
+
+    def similarity_search_with_vectors_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float, np.ndarray]]:
+        # Like similarity_search_with_score_by_vector, plus each hit's stored vector for MMR/dedup
+        top, scores, stored = self._top_k(embedding, k)
+        if not len(top):
+            return []
+        vectors = self._row_vectors(top, *stored)
+        return [(self._document(row), float(score), vector) for row, score, vector in zip(top, scores, vectors)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def _cached_query_vector(self, query: str):
+        key = " ".join(query.lower().split())
+        vector = self._query_cache.get(key)
+        if vector is None:
+            self.query_cache_misses += 1
+        else:
+            self.query_cache_hits += 1
+            self._query_cache.move_to_end(key)
+        return key, vector
+
+    def _remember_query_vector(self, key: str, vector: List[float]):
+        self._query_cache[key] = vector
+        self._query_cache.move_to_end(key)
+        while len(self._query_cache) > self._query_cache_size:
+            self._query_cache.popitem(last=False)
+
+    def embed_query(self, query: str) -> List[float]:
+        key, vector = self._cached_query_vector(query)
+        if vector is None:
+            vector = self.embedding.embed_query(query)
+            self._remember_query_vector(key, vector)
+        return vector
+
+    async def aembed_query(self, query: str) -> List[float]:
+        key, vector = self._cached_query_vector(query)
+        if vector is None:
+            vector = await self.embedding.aembed_query(query)
+            self._remember_query_vector(key, vector)
+        return vector
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embed_query(query), k, **kwargs)
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        # Await the query embedding, then score on a worker thread so the event loop stays free
+        vector = await self.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.similarity_search_with_score_by_vector(vector, k, **kwargs))
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search_with_vectors(self, query: str, k: int = 4) -> Tuple[List[float], List[Tuple[Document, float, np.ndarray]]]:
+        # Returns the query embedding along with the hits so callers can rerank without re-embedding
+        vector = await self.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        return vector, await loop.run_in_executor(None, self.similarity_search_with_vectors_by_vector, vector, k)
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] mapped to [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, dtype=kwargs.pop("dtype", None))
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
@@ -0,0 +1,47 @@
+# app/warmup.py
+import asyncio
+import logging
+import time
+from config import Config
+from app.token_accounting import get_encoding
+from app.jwks import key_manager
+from app.openai_client import warm_client
+from app.bing_client import get_bing_client
+
+logger = logging.getLogger("warmup")
+
+
+async def _timed(name: str, step):
+    # A failed or slow step is reported, never fatal: the app serves traffic either way and
+    # each resource is also created lazily on first use
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), timeout=Config.WARMUP_STEP_TIMEOUT)
+        result = {"ok": True}
+    except Exception as e:
+        logger.warning("Warmup step %s failed: %s", name, repr(e))
+        result = {"ok": False, "error": repr(e)}
+    result["ms"] = round(1000 * (time.perf_counter() - started), 2)
+    return name, result
+
+
+async def run_warmup(db) -> dict:
+    # Loads what the first requests would otherwise pay for: the tokenizer's BPE ranks, the
+    # Azure AD signing keys, every pooled MySQL connection and the HTTP connection pools
+    loop = asyncio.get_running_loop()
+    steps = {
+        "tokenizer": lambda: loop.run_in_executor(None, get_encoding),
+        "jwks": key_manager.refresh,
+        "db_pool": lambda: loop.run_in_executor(None, db.warm),
+        "openai_http": warm_client,
+        "bing_http": get_bing_client().warm,
+    }
+
+    started = time.perf_counter()
+    if Config.WARMUP_PARALLEL:
+        results = await asyncio.gather(*(_timed(name, step) for name, step in steps.items()))
+    else:
+        results = [await _timed(name, step) for name, step in steps.items()]
+    report = {"parallel": Config.WARMUP_PARALLEL, "total_ms": round(1000 * (time.perf_counter() - started), 2), "steps": dict(results)}
+    logger.info("Warmup finished: %s", report)
+    return report
@@ -0,0 +1,195 @@
+# app/write_queue.py
+import asyncio
+import logging
+import time
+from collections import deque
+from config import Config
+from app import analytics
+from app.database import is_connection_error
+
+logger = logging.getLogger("write_queue")
+
+# Statements the queue knows how to batch. Dict order is flush order, so parent rows
+# (Chat_Messages) are always written before rows that reference them.
+STATEMENTS = {
+    "chat_message": """
+        INSERT INTO Chat_Messages (message_id, user_id, user_prompt, response, source, category)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """,
+    "price": """
+        INSERT INTO Price (price_id, message_id, completion_price, prompt_tokens, completion_tokens)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+}
+
+# Rollup updates run in the same transaction as the rows they count, keyed by the first value
+# (row id). A batch's messages and prices go into the rollup as one ordered upsert.
+ROLLUPS = {
+    "chat_message": "message_ids",
+    "price": "price_ids",
+}
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    # Collects rows from the response path and writes them with executemany in one
+    # transaction per batch, flushing when the batch is full or the interval elapses.
+
+    def __init__(self, db, max_size: int = None, batch_size: int = None, flush_interval: float = None):
+        self.db = db
+        self.max_size = max_size or Config.WRITE_QUEUE_MAX_SIZE
+        self.batch_size = batch_size or Config.WRITE_QUEUE_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.WRITE_QUEUE_FLUSH_INTERVAL
+        self._queue = None
+        self._worker = None
+        # Chat_Messages rows enqueued but not yet written, so dependent writes (feedback) can wait for them
+        self._pending_messages = {}
+        # Rows that could not be written even one at a time, kept for inspection
+        self.dead_letters = deque(maxlen=Config.WRITE_QUEUE_DEAD_LETTERS)
+
+        # Counters exposed through stats()
+        self._enqueued = 0
+        self._flushed_rows = 0
+        self._failed_rows = 0
+        self._retries = 0
+        self._row_fallbacks = 0
+        self._flushes = 0
+        self._flush_total = 0.0
+        self._flush_max = 0.0
+        self._last_flush = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self._run())
+        logger.info("Write-behind queue started (batch_size=%s, interval=%ss).", self.batch_size, self.flush_interval)
+
+    async def enqueue(self, kind: str, values: tuple):
+        if kind not in STATEMENTS:
+            raise ValueError(f"Unknown write kind: {kind}")
+        if kind == "chat_message":
+            self._pending_messages.setdefault(values[0], asyncio.Event())
+        # Blocks when the backlog is full, pushing back on producers instead of growing without bound
+        await self._queue.put((kind, values))
+        self._enqueued += 1
+
+    async def wait_for_message(self, message_id: str, timeout: float = None) -> bool:
+        # Waits until a queued Chat_Messages row has been flushed (or given up on). Returns False
+        # only if it is still pending after the timeout; ids this queue never saw return at once.
+        event = self._pending_messages.get(message_id)
+        if event is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout or 2 * self.flush_interval + Config.MY_SQL_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self):
+        # Flush whatever is pending and stop the worker
+        if self._worker is None:
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+        logger.info("Write-behind queue stopped.")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    @staticmethod
+    def _write(grouped):
+        def work(cursor):
+            for kind, rows in grouped.items():
+                if rows:
+                    cursor.executemany(STATEMENTS[kind], rows)
+            analytics.add_rows(cursor, **{ROLLUPS[kind]: [values[0] for values in rows] for kind, rows in grouped.items() if rows})
+        return work
+
+    async def _write_batch(self, grouped):
+        # Dropped connections and pool timeouts are retried with a short backoff; deadlocks and
+        # lock wait timeouts are already retried inside the transaction
+        for attempt in range(Config.WRITE_QUEUE_RETRIES + 1):
+            try:
+                return await self.db.run_in_transaction(self._write(grouped))
+            except Exception as e:
+                if attempt == Config.WRITE_QUEUE_RETRIES or not is_connection_error(e):
+                    raise
+                self._retries += 1
+                logger.warning("Connection error flushing batch, retrying: %s", str(e))
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def _flush(self, batch):
+        grouped = {kind: [] for kind in STATEMENTS}
+        for kind, values in batch:
+            grouped[kind].append(values)
+
+        started = time.perf_counter()
+        try:
+            await self._write_batch(grouped)
+            flushed = len(batch)
+        except Exception as e:
+            # One bad row must not cost the whole batch: write the rows one at a time, parents
+            # first, and dead-letter only the ones that still fail
+            self._row_fallbacks += 1
+            logger.error("Error flushing %s queued rows, writing them one at a time: %s", len(batch), str(e))
+            flushed = 0
+            for kind, rows in grouped.items():
+                for values in rows:
+                    try:
+                        await self._write_batch({kind: [values]})
+                        flushed += 1
+                    except Exception as row_error:
+                        self._failed_rows += 1
+                        self.dead_letters.append((kind, values, str(row_error)))
+                        logger.error("Dropped queued %s row %s: %s", kind, values[0], str(row_error))
+        finally:
+            for values in grouped["chat_message"]:
+                event = self._pending_messages.pop(values[0], None)
+                if event is not None:
+                    event.set()
+        elapsed = time.perf_counter() - started
+
+        self._flushes += 1
+        self._flushed_rows += flushed
+        self._flush_total += elapsed
+        self._flush_max = max(self._flush_max, elapsed)
+        self._last_flush = elapsed
+
+    def stats(self):
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "enqueued": self._enqueued,
+            "flushed_rows": self._flushed_rows,
+            "failed_rows": self._failed_rows,
+            "retries": self._retries,
+            "row_fallbacks": self._row_fallbacks,
+            "dead_letters": len(self.dead_letters),
+            "flushes": self._flushes,
+            "last_flush_ms": round(self._last_flush * 1000, 3),
+            "avg_flush_ms": round(self._flush_total / self._flushes * 1000, 3) if self._flushes else 0.0,
+            "max_flush_ms": round(self._flush_max * 1000, 3),
+        }
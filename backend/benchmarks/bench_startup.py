@@ -0,0 +1,67 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start cost of the app: wall time of `import main` in fresh interpreters, and the
+# modules with the largest cumulative import time (from -X importtime). Importing main makes
+# no network or database calls, so this runs without Azure or MySQL. Lifespan setup and
+# warmup timings of a running instance are reported by GET /ready.
+#
+#   python -m benchmarks.bench_startup --runs 5 --top 15
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_once(importtime: bool = False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", "import main"]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise SystemExit(f"import main failed:\n{completed.stderr}")
+    return elapsed, completed.stderr
+
+
+def top_imports(report: str, top: int):
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace("import time:", "|", 1).split("|")
+        # Top-level imports follow the bar after one space; each nesting level indents two more
+        if len(name) - len(name.lstrip()) == 1:
+            rows.append((int(cumulative_us), int(self_us), name.strip()))
+    # Keep top-level packages only, so nested imports are not counted twice
+    roots = {}
+    for cumulative, _, name in rows:
+        root = name.split(".")[0]
+        roots[root] = max(roots.get(root, 0), cumulative)
+    return sorted(roots.items(), key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    times = [import_once()[0] for _ in range(args.runs)]
+    print(f"import main: median {1000 * statistics.median(times):.0f} ms, "
+          f"min {1000 * min(times):.0f} ms, max {1000 * max(times):.0f} ms over {args.runs} runs")
+
+    _, report = import_once(importtime=True)
+    print(f"\n{'package':<32}{'cumulative ms':>14}")
+    for name, cumulative_us in top_imports(report, args.top):
+        print(f"{name:<32}{cumulative_us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_vector_index.py
+#
+# Compares NumpyVectorStore (float32 / float16 / int8) with DocArrayInMemorySearch on random
+# unit vectors: build time, mean query latency for a k=20 search and memory held by the index.
+#
+#   python -m benchmarks.bench_vector_index --sizes 1000 10000 100000 --dim 1536
+import argparse
+import os
+import sys
+import time
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vector_index import NumpyVectorStore  # noqa: E402
+
+
+class PrecomputedEmbeddings(Embeddings):
+    # Texts are "chunk-<row>"; queries are "query-<row>". No network calls are made.
+
+    def __init__(self, vectors: np.ndarray, queries: np.ndarray):
+        self.vectors = vectors
+        self.queries = queries
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[int(text.split("-")[1])].tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.queries[int(text.split("-")[1])].tolist()
+
+
+def bench_store(name, build, embeddings, texts, queries, k):
+    started = time.perf_counter()
+    store = build(texts, embeddings)
+    build_s = time.perf_counter() - started
+
+    retriever = store.as_retriever(search_kwargs={"k": k})
+    started = time.perf_counter()
+    for i in range(len(queries)):
+        retriever.invoke(f"query-{i}")
+    query_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    nbytes = getattr(store, "nbytes", None)
+    memory = f"{nbytes / 1024 / 1024:9.1f} MiB" if nbytes is not None else "        n/a"
+    print(f"{name:<22} build {build_s:8.2f} s   query {query_ms:9.3f} ms   {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--docarray-max", type=int, default=100000, help="skip DocArrayInMemorySearch above this size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        embeddings = PrecomputedEmbeddings(vectors, queries)
+        texts = [f"chunk-{i}" for i in range(size)]
+
+        print(f"\n{size} chunks, dim {args.dim}")
+        for dtype in ("float32", "float16", "int8"):
+            bench_store(
+                f"numpy[{dtype}]",
+                lambda t, e, dtype=dtype: NumpyVectorStore.from_texts(t, e, dtype=dtype),
+                embeddings, texts, queries, args.k,
+            )
+        if size <= args.docarray_max:
+            try:
+                from langchain_community.vectorstores import DocArrayInMemorySearch
+            except ImportError:
+                print("DocArrayInMemorySearch  not installed, skipped")
+                continue
+            bench_store("DocArrayInMemorySearch", DocArrayInMemorySearch.from_texts, embeddings, texts, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
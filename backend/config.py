@@ -19,8 +19,121 @@ class Config:
     MY_SQL_USER = os.getenv("mysql_user")
     MY_SQL_PASSWORD = os.getenv("mysql_password")
     MY_SQL_DB = os.getenv("mysql_db")
+    MY_SQL_POOL_SIZE = int(os.getenv("mysql_pool_size", "10"))  # mysql-connector caps pools at 32
+    MY_SQL_POOL_TIMEOUT = float(os.getenv("mysql_pool_timeout", "10"))  # seconds to wait for a free connection
+    MY_SQL_TRANSACTION_RETRIES = int(os.getenv("mysql_transaction_retries", "3"))  # reruns of a transaction after a deadlock or lock wait timeout
+    SCHEMA_LOCK_TIMEOUT = int(os.getenv("SCHEMA_LOCK_TIMEOUT", "60"))  # seconds a worker waits while another one migrates
     BING_SEARCH_API_KEY = os.getenv('BING_SEARCH_API_KEY')
     BING_SEARCH_ENDPOINT = os.getenv('BING_SEARCH_ENDPOINT')
     AZURE_TENANT_ID=os.getenv('AZURE_TENANT_ID')
     AZURE_CLIENT_ID=os.getenv('AZURE_CLIENT_ID')
-    API_AUDIENCE=os.getenv('API_AUDIENCE')
\ No newline at end of file
+    API_AUDIENCE=os.getenv('API_AUDIENCE')
+    # Bulk export and analytics expose every user's data: app roles (token `roles` claim) or user
+    # object ids allowed to use them, comma separated. Empty means nobody.
+    REPORTING_ALLOWED_ROLES = [role.strip() for role in os.getenv("REPORTING_ALLOWED_ROLES", "").split(",") if role.strip()]
+    REPORTING_ALLOWED_USERS = [oid.strip() for oid in os.getenv("REPORTING_ALLOWED_USERS", "").split(",") if oid.strip()]
+    # Shared Azure OpenAI HTTP client tuning
+    AZURE_OPENAI_MAX_CONNECTIONS = int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "100"))
+    AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    AZURE_OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", "30"))
+    AZURE_OPENAI_CONNECT_TIMEOUT = float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "5"))
+    AZURE_OPENAI_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+    AZURE_OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "2"))
+
+    # Write-behind queue for Chat_Messages / Price rows
+    WRITE_QUEUE_MAX_SIZE = int(os.getenv("WRITE_QUEUE_MAX_SIZE", "10000"))
+    WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "200"))
+    WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "1.0"))
+    WRITE_QUEUE_RETRIES = int(os.getenv("WRITE_QUEUE_RETRIES", "3"))  # retries of a batch on a lost connection or pool timeout
+    WRITE_QUEUE_DEAD_LETTERS = int(os.getenv("WRITE_QUEUE_DEAD_LETTERS", "1000"))  # failed rows kept for inspection
+    FEEDBACK_MESSAGE_RETRIES = int(os.getenv("FEEDBACK_MESSAGE_RETRIES", "3"))  # waits for a message another worker has not flushed yet
+
+    # Background message-category classifier
+    CLASSIFIER_INTERVAL = float(os.getenv("CLASSIFIER_INTERVAL", "5.0"))
+    CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "50"))
+    CLASSIFIER_MIN_KEYWORD_SCORE = int(os.getenv("CLASSIFIER_MIN_KEYWORD_SCORE", "2"))
+    CLASSIFIER_MAX_ATTEMPTS = int(os.getenv("CLASSIFIER_MAX_ATTEMPTS", "3"))  # failed LLM attempts before a message gets "Other"
+    CLASSIFIER_CLAIM_TTL = int(os.getenv("CLASSIFIER_CLAIM_TTL", "300"))  # seconds a worker's claim on rows lasts; must cover the LLM call
+    CLASSIFIER_LOCK_TIMEOUT = int(os.getenv("CLASSIFIER_LOCK_TIMEOUT", "10"))  # seconds to wait for the lock when writing results
+
+    # Token accounting
+    PROMPT_PRICE_PER_1K_TOKENS = float(os.getenv("PROMPT_PRICE_PER_1K_TOKENS", "0.06"))
+    COMPLETION_PRICE_PER_1K_TOKENS = float(os.getenv("COMPLETION_PRICE_PER_1K_TOKENS", "0.06"))
+    # Ask the service for usage on the last stream chunk (needs API version 2024-09-01-preview or later)
+    AZURE_OPENAI_STREAM_USAGE = os.getenv("AZURE_OPENAI_STREAM_USAGE", "false").lower() == "true"
+
+    # Per-chat retriever/document session store
+    SESSION_MAX_CHATS = int(os.getenv("SESSION_MAX_CHATS", "500"))
+    SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))  # seconds
+    SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(512 * 1024 * 1024)))
+
+    # Content-hash embedding cache shared by all workers on the host
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # embeddings, parsed files and summaries; 0 = no limit
+    EMBEDDING_CACHE_MAX_AGE = float(os.getenv("EMBEDDING_CACHE_MAX_AGE", str(30 * 24 * 3600)))  # seconds since last use; 0 = no limit
+
+    # Per-chat vector index storage: float32, float16 or int8
+    VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "32"))  # per chat
+
+    # Retrieved-context assembly
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # 1.0 = relevance only
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))  # cosine similarity
+
+    # Conversation history compaction
+    HISTORY_VERBATIM_MESSAGES = int(os.getenv("HISTORY_VERBATIM_MESSAGES", "6"))  # newest messages kept as-is
+    HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))  # older messages folded in per update
+    HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1000"))  # chats
+
+    # Server-side conversation store (delta-only chat protocol)
+    CONVERSATION_MAX_CHATS = int(os.getenv("CONVERSATION_MAX_CHATS", "2000"))
+    CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "86400"))  # seconds
+
+    # Streaming document ingestion
+    INGEST_READ_CHUNK_BYTES = int(os.getenv("INGEST_READ_CHUNK_BYTES", str(1024 * 1024)))
+    INGEST_QUEUE_PAGES = int(os.getenv("INGEST_QUEUE_PAGES", "32"))  # parsed pages buffered ahead of the embedder
+    INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks per embedding call
+
+    # Process pool for document parsing and splitting (0 workers = parse on a thread instead)
+    PARSE_POOL_WORKERS = int(os.getenv("PARSE_POOL_WORKERS", "2"))
+    PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "8"))  # PDF pages handed to a worker at once
+    PARSE_POOL_START_METHOD = os.getenv("PARSE_POOL_START_METHOD", "spawn")
+
+    # Document summarization (stuff for small inputs, map-reduce for large ones)
+    SUMMARY_STUFF_TOKENS = int(os.getenv("SUMMARY_STUFF_TOKENS", "6000"))  # largest input summarized in one call
+    SUMMARY_MAP_TOKENS = int(os.getenv("SUMMARY_MAP_TOKENS", "3000"))  # section size for map calls
+    SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+    SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "512"))  # in-process summaries kept per worker
+    SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"  # on-disk summaries shared by workers
+
+    # Response cache for context-free questions on the LLM path
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # seconds
+    RESPONSE_CACHE_MAX_HISTORY = int(os.getenv("RESPONSE_CACHE_MAX_HISTORY", "0"))  # prior messages allowed for a cacheable question
+    RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))  # cosine similarity for a semantic hit
+
+    # Bing search client
+    BING_MAX_CONNECTIONS = int(os.getenv("BING_MAX_CONNECTIONS", "20"))
+    BING_TIMEOUT = float(os.getenv("BING_TIMEOUT", "10"))  # seconds
+    BING_CACHE_TTL = float(os.getenv("BING_CACHE_TTL", "600"))  # seconds
+    BING_CACHE_MAX_ENTRIES = int(os.getenv("BING_CACHE_MAX_ENTRIES", "512"))
+
+    # Azure AD signing keys and verified-token cache
+    JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))  # seconds between background refreshes
+    JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))  # floor between refetches on unknown kids
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+    # Startup warmup (tokenizer, signing keys, DB pool, HTTP pools); /ready reports when it is done
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_PARALLEL = os.getenv("WARMUP_PARALLEL", "true").lower() == "true"
+    WARMUP_STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "30"))  # seconds per step
+
+    # Bulk export (/export); rows fetched per keyset page
+    EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+    # Rows newer than this many seconds are left for the next export: rows reach the tables through the
+    # write-behind queue, so a just-committed row can carry a created_at earlier than rows already sent
+    EXPORT_SAFETY_LAG = int(os.getenv("EXPORT_SAFETY_LAG", "300"))
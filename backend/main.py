@@ -1,30 +1,96 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.services.chat import chat_router
 from app.services.summarize import summarize_router
 from app.services.feedback import feedback_router
 from app.services.bing_search import bing_router
 from app.services.login import login_router
-from app.services.token_validation import validate_token  # Import the token validation function from token_validation.py
+from app.services.analytics import analytics_router
+from app.services.export import export_router
+from app.services.token_validation import require_reporting_access, validate_token  # Import the token validation function from token_validation.py
 from app.database import Database
+from app.openai_client import init_client, close_client
+from app.warmup import run_warmup
+from app.write_queue import WriteBehindQueue
+from app.classifier import MessageClassifier
+from app.session_store import session_store
+from app.parse_pool import parse_pool
+from app.summarizer import summarizer
+from app.response_cache import response_cache
+from app.request_planner import request_planner
+from app.jwks import key_manager, verified_tokens
+from app.bing_client import get_bing_client, close_bing_client
+from app.embedding_cache import get_embedding_cache
+from app import context_builder
+from app.history import HistoryCompactor
+from app.conversation_store import conversation_store
+from config import Config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+_import_ms = round(1000 * (time.perf_counter() - _import_started), 2)
+
+
+# Startup and shutdown of the shared resources. Nothing here runs at import time, so importing
+# the app makes no network or database calls.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    app.state.ready = False
+    app.state.startup = {"import_ms": _import_ms}
+    loop = asyncio.get_running_loop()
+
+    # Initialize the database pool and bring the schema up to date (one query when it already is)
+    db = await loop.run_in_executor(None, Database)
+    await loop.run_in_executor(None, db.connect)
+    app.state.startup["schema"] = await loop.run_in_executor(None, db.migrate)
+    app.state.db = db  # Pass the database instance to your routes
+
+    # Create the shared Azure OpenAI client and start the background workers once per process
+    app.state.openai_client = init_client()
+    app.state.write_queue = WriteBehindQueue(db)
+    await app.state.write_queue.start()
+    app.state.classifier = MessageClassifier(db)
+    await app.state.classifier.start()
+    app.state.history_compactor = HistoryCompactor()
+    parse_pool.start()
+    await key_manager.start()
+    app.state.startup["setup_ms"] = round(1000 * (time.perf_counter() - started), 2)
 
-# Initialize database connection
-db = Database()
-db.connect()
+    # Warm the tokenizer, signing keys, DB pool and HTTP pools in the background; /ready flips once done
+    async def warmup():
+        if Config.WARMUP_ENABLED:
+            app.state.startup["warmup"] = await run_warmup(db)
+        app.state.startup["ready_ms"] = round(1000 * (time.perf_counter() - started), 2)
+        app.state.ready = True
+        logger.info("Startup complete: %s", app.state.startup)
 
-# Pass the database instance to your routes
-app.state.db = db
+    warmup_task = asyncio.create_task(warmup())
+    yield
 
-# Run migration script to add any changes to the database
-db.run_migration()
+    # Flush queued writes, then close the database connection and the shared HTTP pools on shutdown
+    warmup_task.cancel()
+    await app.state.history_compactor.stop()
+    await key_manager.stop()
+    parse_pool.stop()
+    await app.state.classifier.stop()
+    await app.state.write_queue.stop()
+    app.state.db.close()
+    await close_client()
+    await close_bing_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # CORS Configuration
@@ -43,6 +109,9 @@ app.include_router(summarize_router, prefix="/summarize", tags=["summarize"], de
 app.include_router(feedback_router, prefix="/feedback", tags=["feedback"], dependencies=[Depends(validate_token)])
 app.include_router(bing_router, prefix="/bing", tags=["bing"], dependencies=[Depends(validate_token)])
 app.include_router(login_router, prefix="/auth", tags=["auth"], dependencies=[Depends(validate_token)])
+# Analytics (per-group cost and usage) and export (every user's rows) also need a reporting role
+app.include_router(analytics_router, prefix="/analytics", tags=["analytics"], dependencies=[Depends(require_reporting_access)])
+app.include_router(export_router, prefix="/export", tags=["export"], dependencies=[Depends(require_reporting_access)])
 
 @app.get("/")
 def read_root():
@@ -50,7 +119,31 @@ def read_root():
     return {"message": "Welcome to the Azure OpenAI Chat API"}
 
 
-# Close the database connection on shutdown
-@app.on_event("shutdown")
-def shutdown():
-    app.state.db.close()
\ No newline at end of file
+# Readiness probe: 503 until the startup warmup has finished, with the startup timings
+@app.get("/ready")
+def read_ready():
+    startup = getattr(app.state, "startup", {})
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"ready": False, "startup": startup})
+    return {"ready": True, "startup": startup}
+
+
+# Runtime counters for the shared resources (DB pool, queues, caches)
+@app.get("/metrics", dependencies=[Depends(validate_token)])
+def read_metrics():
+    return {
+        "db": app.state.db.stats(),
+        "write_queue": app.state.write_queue.stats(),
+        "classifier": app.state.classifier.stats(),
+        "sessions": session_store.stats(),
+        "embedding_cache": get_embedding_cache().stats() if get_embedding_cache() else None,
+        "context": context_builder.stats(),
+        "history": app.state.history_compactor.stats(),
+        "conversations": conversation_store.stats(),
+        "parse_pool": parse_pool.stats(),
+        "summarizer": summarizer.stats(),
+        "response_cache": response_cache.stats(),
+        "bing": get_bing_client().stats(),
+        "requests": request_planner.stats(),
+        "auth": {"keys": key_manager.stats(), "verified_tokens": verified_tokens.stats()},
+    }
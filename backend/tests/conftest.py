@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Tests import the app the same way main.py does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+# tests/test_analytics.py
+from datetime import date
+from decimal import Decimal
+import pytest
+from app import analytics
+
+
+def test_summary_query_groups_and_filters_by_the_requested_dimensions():
+    query, values = analytics.summary_query(["day", "source"], start=date(2024, 1, 1), category="Other")
+    assert "SELECT day, source, SUM(message_count)" in " ".join(query.split())
+    assert "WHERE day >= %s AND category = %s" in query
+    assert "GROUP BY day, source ORDER BY day, source" in query
+    assert values == (date(2024, 1, 1), "Other")
+
+
+def test_summary_query_without_dimensions_is_one_grand_total():
+    query, values = analytics.summary_query([])
+    assert "GROUP BY" not in query and "WHERE" not in query
+    assert values == ()
+
+
+def test_summary_query_rejects_unknown_dimensions():
+    with pytest.raises(ValueError):
+        analytics.summary_query(["day", "user_id"])
+
+
+def test_summary_rows_maps_empty_keys_to_none_and_averages_ratings():
+    rows = [
+        ("", "OpenAI", Decimal(3), Decimal(30), Decimal(60), Decimal("0.12"), Decimal(9), Decimal(2)),
+        ("IRP", "Bing", Decimal(1), Decimal(0), Decimal(0), Decimal(0), Decimal(0), Decimal(0)),
+    ]
+    result = analytics.summary_rows(["group_name", "source"], rows)
+    assert result[0]["group_name"] is None and result[0]["average_rating"] == 4.5
+    assert result[0]["cost"] == 0.12 and result[0]["message_count"] == 3
+    assert result[1]["group_name"] == "IRP" and result[1]["average_rating"] is None
+    # SUM over no rows gives one all-NULL row, which means no data
+    assert analytics.summary_rows([], [(None, None, None, None, None, None)]) == []
+
+
+def test_rollup_contributions_are_applied_in_one_upsert_in_key_order():
+    query, values = analytics._upsert_query([
+        (analytics._MESSAGES, analytics._in("m.message_id", ["m1", "m2"]), ["m1", "m2"]),
+        (analytics._PRICES, analytics._in("p.price_id", ["p1"]), ["p1"]),
+        (analytics._FEEDBACK, analytics._in("f.feedback_id", []), []),
+    ], sign=-1)
+    flat = " ".join(query.split())
+    assert flat.count("INSERT INTO Analytics_Daily") == 1 and flat.count("UNION ALL") == 1
+    assert "GROUP BY day, group_name, category, source ORDER BY day, group_name, category, source ON DUPLICATE KEY UPDATE" in flat
+    assert "-1 * COUNT(*)" in flat and "Feedback" not in flat
+    assert values == ("m1", "m2", "p1")
+    assert analytics._upsert_query([(analytics._MESSAGES, "", [])]) == (None, ())
+
+
+class RecordingCursor:
+    def __init__(self, group_name):
+        self.group_name = group_name
+        self.statements = []
+
+    def execute(self, statement, values=None):
+        self.statements.append((" ".join(statement.split()), values))
+
+    def fetchone(self):
+        return (self.group_name,)
+
+
+def test_regroup_user_moves_counted_messages_out_of_the_empty_group():
+    cursor = RecordingCursor(None)
+    assert analytics.regroup_user(cursor, "u1", "IRP")
+    (lock, _), (take_out, out_values), (update, update_values), (put_back, in_values) = cursor.statements
+    assert lock.endswith("FOR UPDATE")
+    assert "-1 * COUNT(*)" in take_out and out_values == ("u1", "u1", "u1")
+    assert update.startswith("UPDATE Users SET group_name") and update_values == ("IRP", "u1")
+    assert "1 * COUNT(*)" in put_back and "-1 *" not in put_back and in_values == ("u1", "u1", "u1")
+
+    # Already grouped (e.g. a concurrent login won): nothing is moved
+    cursor = RecordingCursor("OD")
+    assert not analytics.regroup_user(cursor, "u1", "IRP")
+    assert len(cursor.statements) == 1
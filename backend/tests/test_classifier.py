@@ -0,0 +1,163 @@
+# tests/test_classifier.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app import classifier
+from app.classifier import MessageClassifier, keyword_category, _normalize_category, _parse_categories
+
+
+@pytest.mark.parametrize("message, category", [
+    ("Can you summarize this report in key points?", "Text Summarization"),
+    ("Translate this paragraph into Spanish", "Language Translation"),
+    ("Why does my C++ code segfault?", "Technical Dialogue"),
+    ("How do I declare a list in C#?", "Technical Dialogue"),
+    ("Write a short poem about spring", "Creative Content Generation"),
+])
+def test_keyword_category_matches_clear_cases(message, category):
+    assert keyword_category(message) == category
+
+
+def test_keyword_category_is_none_when_unsure():
+    assert keyword_category("hello there") is None
+    assert keyword_category("javascripting c++x") is None
+
+
+def test_parse_categories_accepts_fenced_json():
+    assert _parse_categories('```json\n["Technical Dialogue", "General Knowledge"]\n```') == ["Technical Dialogue", "General Knowledge"]
+    with pytest.raises(ValueError):
+        _parse_categories("no array here")
+
+
+def test_normalize_category():
+    assert _normalize_category(" technical dialogue. ") == "Technical Dialogue"
+    assert _normalize_category("Poetry") == "General Knowledge"
+    assert _normalize_category(None) == "General Knowledge"
+
+
+class FakeDatabase:
+    # Chat_Messages and Classifier_Claims in memory; claim_rows, write_categories and release_rows
+    # are swapped for versions working on it (the lock is taken unless `locked`)
+    def __init__(self, rows, locked=False):
+        self.rows = rows
+        self.locked = locked
+        self.categories = {}
+        self.claims = {}  # message_id -> [claimed, attempts]
+        self.lock_calls = 0
+
+    async def run_with_lock(self, name, work, timeout=0):
+        self.lock_calls += 1
+        if self.locked:
+            return False, None
+        return True, work(None)
+
+    def claim(self, limit):
+        rows = [
+            (message_id, prompt, self.claims.get(message_id, [False, 0])[1])
+            for message_id, prompt in self.rows
+            if message_id not in self.categories and not self.claims.get(message_id, [False])[0]
+        ][:limit]
+        for message_id, _, attempts in rows:
+            self.claims[message_id] = [True, attempts]
+        return rows
+
+    def write(self, results):
+        self.categories.update(results)
+        for message_id in results:
+            self.claims.pop(message_id, None)
+
+    def release(self, message_ids):
+        for message_id in message_ids:
+            self.claims[message_id] = [False, self.claims[message_id][1] + 1]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install(rows, locked=False):
+        db = FakeDatabase(rows, locked)
+        monkeypatch.setattr(classifier, "claim_rows", lambda cursor, limit, ttl: db.claim(limit))
+        monkeypatch.setattr(classifier, "write_categories", lambda cursor, results: db.write(results))
+        monkeypatch.setattr(classifier, "release_rows", lambda cursor, message_ids: db.release(message_ids))
+        return db
+    return install
+
+
+def test_fast_path_is_written_even_when_the_llm_fails(fake_db):
+    db = fake_db([("m1", "summarize this article"), ("m2", "hello there")])
+    worker = MessageClassifier(db, interval=1, batch_size=10)
+
+    async def failing_llm(messages):
+        raise RuntimeError("model unavailable")
+    worker._classify_with_llm = failing_llm
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(worker.classify_pending())
+    assert db.categories == {"m1": "Text Summarization"}
+    # Released for the next cycle with one failed attempt
+    assert db.claims == {"m2": [False, 1]}
+
+
+def test_rows_failing_repeatedly_get_the_fallback(fake_db, monkeypatch):
+    monkeypatch.setattr(classifier.Config, "CLASSIFIER_MAX_ATTEMPTS", 2)
+    db = fake_db([("m1", "hello there"), ("m2", "what is a tariff")])
+    worker = MessageClassifier(db, interval=1, batch_size=10)
+
+    async def poisoned_llm(messages):
+        if "hello there" in messages:
+            raise ValueError("No JSON array in classification response")
+        return ["General Knowledge"] * len(messages)
+    worker._classify_with_llm = poisoned_llm
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            asyncio.run(worker.classify_pending())
+    asyncio.run(worker.classify_pending())
+    assert db.categories == {"m1": classifier.FALLBACK_CATEGORY, "m2": classifier.FALLBACK_CATEGORY}
+
+    # Newer messages are no longer stuck behind them
+    db.rows.append(("m3", "who wrote hamlet"))
+    asyncio.run(worker.classify_pending())
+    assert db.categories["m3"] == "General Knowledge"
+    assert worker.stats()["fallbacks"] == 2
+
+
+def test_lock_is_not_held_during_the_llm_call(fake_db):
+    db = fake_db([("m1", "hello there"), ("m2", "what is a tariff")])
+    worker = MessageClassifier(db, interval=1, batch_size=10)
+
+    async def slow_llm(messages):
+        # Another worker running now finds the lock free but every row claimed
+        assert db.lock_calls == 1
+        await second_worker.classify_pending()
+        return ["General Knowledge"] * len(messages)
+    worker._classify_with_llm = slow_llm
+    second_worker = MessageClassifier(db, interval=1, batch_size=10)
+    second_worker._classify_with_llm = lambda messages: pytest.fail("claimed rows sent to the LLM twice")
+
+    asyncio.run(worker.classify_pending())
+    assert db.categories == {"m1": "General Knowledge", "m2": "General Knowledge"}
+    assert db.claims == {}
+
+
+def test_answer_of_the_wrong_length_is_rejected_not_assigned_by_position(fake_db, monkeypatch):
+    db = fake_db([("m1", "hello there"), ("m2", "what is a tariff")])
+    worker = MessageClassifier(db, interval=1, batch_size=10)
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='["Technical Dialogue"]'))])
+
+    def fake_client(streaming, temperature):
+        async def complete(messages):
+            return response
+        return complete
+    monkeypatch.setattr(classifier, "create_azure_client", fake_client)
+
+    with pytest.raises(ValueError):
+        asyncio.run(worker.classify_pending())
+    assert db.categories == {}
+    assert db.claims == {"m1": [False, 1], "m2": [False, 1]}
+
+
+def test_skips_the_cycle_when_another_worker_holds_the_lock(fake_db):
+    db = fake_db([("m1", "summarize this article")], locked=True)
+    worker = MessageClassifier(db, interval=1, batch_size=10)
+    asyncio.run(worker.classify_pending())
+    assert db.categories == {}
+    assert worker.stats()["skipped_cycles"] == 1
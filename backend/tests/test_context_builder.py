@@ -0,0 +1,61 @@
+# tests/test_context_builder.py
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from app import context_builder
+from app.context_builder import _merge_adjacent, _mmr_order, build_context
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word keeps the budgets in these tests easy to reason about
+    monkeypatch.setattr(context_builder, "count_tokens", lambda text: len(text.split()))
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_mmr_drops_near_duplicates_and_prefers_diverse_chunks():
+    query = unit([1, 0, 0])
+    vectors = np.stack([unit([0.9, 0.1, 0]), unit([0.9, 0.1, 0.001]), unit([0.7, 0, 0.7])])
+    order, duplicates = _mmr_order(query, vectors, lambda_mult=0.5, dedup_threshold=0.98)
+    assert order == [0, 2]
+    assert duplicates == 1
+
+
+def test_mmr_with_lambda_one_is_plain_relevance_order():
+    query = unit([1, 0])
+    vectors = np.stack([unit([0.2, 1]), unit([1, 0.1]), unit([1, 1])])
+    order, _ = _mmr_order(query, vectors, lambda_mult=1.0, dedup_threshold=1.1)
+    assert order == [1, 2, 0]
+
+
+def test_merge_adjacent_sends_overlap_once():
+    first = Document(page_content="alpha beta gamma", metadata={"source": "a.pdf", "page": 1, "start_index": 0})
+    second = Document(page_content="gamma delta", metadata={"source": "a.pdf", "page": 1, "start_index": 11})
+    other_page = Document(page_content="gamma delta", metadata={"source": "a.pdf", "page": 2, "start_index": 11})
+    merged, merges = _merge_adjacent([first, second, other_page])
+    assert merges == 1
+    assert [doc.page_content for doc in merged] == ["alpha beta gamma delta", "gamma delta"]
+
+
+def test_build_context_packs_within_budget_and_skips_what_does_not_fit():
+    query = unit([1, 0, 0])
+    candidates = [
+        (Document(page_content="one two three four five six"), 0.9, unit([1, 0, 0])),
+        (Document(page_content="seven eight"), 0.8, unit([0.8, 0.6, 0])),
+        (Document(page_content="nine"), 0.7, unit([0.6, 0, 0.8])),
+    ]
+    text, stats = build_context(query, candidates, token_budget=7)
+    assert text == "one two three four five six\n\nnine"
+    assert stats["selected"] == 2
+    assert stats["tokens_after"] <= 7
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+
+
+def test_build_context_without_candidates():
+    text, stats = build_context([1.0, 0.0], [], token_budget=10)
+    assert text == ""
+    assert stats["candidates"] == 0
@@ -0,0 +1,56 @@
+# tests/test_conversation_store.py
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from app.conversation_store import ConversationAccessError, ConversationStore, Turn
+
+
+def test_only_the_creator_can_read_or_change_a_chat():
+    store = ConversationStore(max_chats=10, idle_ttl=60)
+    store.append("chat", "alice", Turn("m1", "user", "hi"), Turn("m2", "assistant", "hello"))
+
+    assert [turn.message_id for turn in store.history("chat", "alice")] == ["m1", "m2"]
+    for access in (
+        lambda: store.history("chat", "mallory"),
+        lambda: store.page("chat", "mallory"),
+        lambda: store.truncate_after("chat", "mallory", "m1"),
+        lambda: store.append("chat", "mallory", Turn("m3", "user", "x")),
+        lambda: store.replace("chat", "mallory", []),
+    ):
+        with pytest.raises(ConversationAccessError):
+            access()
+
+    store.delete("chat", "mallory")
+    assert store.owns("chat", "alice") and not store.owns("chat", "mallory")
+    assert len(store.history("chat", "alice")) == 2
+    assert store.stats()["denied"] == 5
+
+    store.delete("chat", "alice")
+    assert store.history("chat", "alice") is None
+    assert store.owns("chat", "mallory")
+
+
+def test_page_keyset_cursor():
+    store = ConversationStore(max_chats=10, idle_ttl=60)
+    store.append("chat", "alice", *[Turn(f"m{i}", "user", str(i)) for i in range(5)])
+    turns, cursor = store.page("chat", "alice", limit=2)
+    assert [turn.message_id for turn in turns] == ["m0", "m1"] and cursor == "m1"
+    turns, cursor = store.page("chat", "alice", after=cursor, limit=3)
+    assert [turn.message_id for turn in turns] == ["m2", "m3", "m4"] and cursor is None
+    with pytest.raises(KeyError):
+        store.page("chat", "alice", after="missing")
+
+
+def test_resolve_history_hides_other_users_chats(monkeypatch):
+    from app.services import chat
+    store = ConversationStore(max_chats=10, idle_ttl=60)
+    monkeypatch.setattr(chat, "conversation_store", store)
+    store.append("chat", "alice", Turn("m1", "user", "secret"))
+
+    request = SimpleNamespace(history=None, last_message_id=None)
+    assert chat.resolve_history("chat", "alice", request)[0].content == "secret"
+    with pytest.raises(HTTPException) as error:
+        chat.resolve_history("chat", "mallory", request)
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException):
+        chat.resolve_history("chat", "mallory", SimpleNamespace(history=[], last_message_id=None))
@@ -0,0 +1,105 @@
+# tests/test_database.py
+import threading
+from contextlib import contextmanager
+import pytest
+from mysql.connector import errors
+from app import database
+from app.database import Database
+
+
+class FakeConnection:
+    def __init__(self, lock_free=True):
+        self.commits = 0
+        self.rollbacks = 0
+        self.lock_free = lock_free
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, values=None):
+        self.connection.statements.append(statement.split("(")[0])
+
+    def fetchone(self):
+        return (1 if self.connection.lock_free else 0,)
+
+    def close(self):
+        pass
+
+
+def fake_database():
+    db = Database.__new__(Database)
+    db._stats_lock = threading.Lock()
+    db._transaction_retries = 0
+    db.connection = FakeConnection()
+    db.checkouts = 0
+
+    @contextmanager
+    def checkout():
+        db.checkouts += 1
+        yield db.connection
+    db.checkout = checkout
+    return db
+
+
+def test_transaction_is_rerun_after_a_deadlock(monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    db = fake_database()
+    attempts = []
+
+    def work(cursor):
+        attempts.append(cursor)
+        if len(attempts) < 3:
+            raise errors.InternalError(msg="Deadlock found", errno=1213)
+        return "done"
+
+    assert db._transaction(work) == "done"
+    assert len(attempts) == 3
+    assert db.connection.rollbacks == 2 and db.connection.commits == 1
+    assert db._transaction_retries == 2
+
+
+def test_transaction_gives_up_on_other_errors_and_after_the_retries(monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(database.Config, "MY_SQL_TRANSACTION_RETRIES", 1)
+    db = fake_database()
+
+    def fk_failure(cursor):
+        raise errors.IntegrityError(msg="fk", errno=1452)
+    with pytest.raises(errors.IntegrityError):
+        db._transaction(fk_failure)
+    assert db._transaction_retries == 0
+
+    def lock_wait(cursor):
+        raise errors.DatabaseError(msg="Lock wait timeout", errno=1205)
+    with pytest.raises(errors.DatabaseError):
+        db._transaction(lock_wait)
+    assert db._transaction_retries == 1
+
+
+def test_locked_transaction_uses_one_connection_and_releases_the_lock():
+    db = fake_database()
+    assert db._locked_transaction("classifier", 0, lambda cursor: "claimed") == (True, "claimed")
+    assert db.checkouts == 1
+    assert db.connection.statements == ["SELECT GET_LOCK", "SELECT RELEASE_LOCK"]
+    assert db.connection.commits == 1
+
+    def failing(cursor):
+        raise errors.DatabaseError(msg="boom", errno=1064)
+    with pytest.raises(errors.DatabaseError):
+        db._locked_transaction("classifier", 0, failing)
+    assert db.connection.statements[-1] == "SELECT RELEASE_LOCK"
+
+    db.connection.lock_free = False
+    assert db._locked_transaction("classifier", 0, lambda cursor: pytest.fail("ran without the lock")) == (False, None)
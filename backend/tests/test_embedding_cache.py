@@ -0,0 +1,49 @@
+# tests/test_embedding_cache.py
+import sqlite3
+from langchain_core.documents import Document
+from app import embedding_cache
+from app.embedding_cache import EmbeddingCache
+
+
+def test_least_recently_used_rows_are_evicted_over_the_size_cap(tmp_path, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: clock[0])
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=3000, max_age=0)
+
+    cache.put_summary("old", "s" * 1000)
+    clock[0] += 10
+    cache.put_file("file", [Document(page_content="d" * 500)], [Document(page_content="c" * 500)])
+    clock[0] += 10
+    cache.put_vectors("model", [("h1", [0.5] * 250)])  # 1000 bytes
+    clock[0] += 10_000
+    # Reading the summary makes it the most recently used row
+    assert cache.get_summary("old") is not None
+
+    cache.put_vectors("model", [("h2", [0.25] * 250)])
+    assert cache.evict() > 0
+    assert cache.get_summary("old") == "s" * 1000
+    assert cache.get_file("file") is None
+    assert set(cache.get_vectors("model", ["h1", "h2"])) == {"h1", "h2"}
+    assert cache.stats()["evicted"] == 1
+
+
+def test_rows_unused_for_max_age_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=0, max_age=3600)
+    cache.put_summary("stale", "old summary")
+    cache.put_summary("fresh", "new summary")
+    cache._conn.execute("UPDATE summaries SET used_at = used_at - 7200 WHERE summary_key = 'stale'")
+    cache._conn.commit()
+    assert cache.evict() == 1
+    assert cache.get_summary("stale") is None and cache.get_summary("fresh") == "new summary"
+
+
+def test_caches_created_before_the_cap_are_upgraded(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE summaries (summary_key TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+    conn.execute("INSERT INTO summaries VALUES ('k', 'kept summary')")
+    conn.commit()
+    conn.close()
+    cache = EmbeddingCache(path, max_bytes=1000, max_age=3600)
+    assert cache.get_summary("k") == "kept summary"
+    assert cache._conn.execute("SELECT size FROM summaries").fetchone()[0] == len("kept summary")
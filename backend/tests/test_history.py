@@ -0,0 +1,78 @@
+# tests/test_history.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app import history
+from app.history import HistoryCompactor, _prefix_hash, _Summary
+
+
+def msg(type_, content):
+    return SimpleNamespace(type=type_, content=content)
+
+
+def test_covered_matches_the_whole_prefix_not_a_repeated_last_message():
+    older = [msg("human", "hi"), msg("ai", "ok")]
+    summary = _Summary("greeting", count=2, prefix_hash=_prefix_hash(older))
+    # "ok" repeats later; only the first two messages are summarized
+    grown = older + [msg("human", "tell me about tariffs"), msg("ai", "ok")]
+    assert summary.covered(grown) == 2
+
+
+def test_covered_is_none_when_history_no_longer_lines_up():
+    older = [msg("human", "hi"), msg("ai", "ok")]
+    summary = _Summary("greeting", count=2, prefix_hash=_prefix_hash(older))
+    assert summary.covered([msg("human", "hello"), msg("ai", "ok"), msg("human", "x")]) is None
+    assert summary.covered(older[:1]) is None
+    assert _Summary().covered(older) == 0
+
+
+def test_server_stored_messages_are_keyed_by_id():
+    first = SimpleNamespace(type="human", content="ok", message_id="a")
+    second = SimpleNamespace(type="human", content="ok", message_id="b")
+    summary = _Summary("s", count=1, prefix_hash=_prefix_hash([first]))
+    assert summary.covered([second, first]) is None
+    assert summary.covered([first, second]) == 1
+
+
+@pytest.mark.parametrize("use_thread", [False, True])
+def test_compact_summarizes_in_the_background_and_counts_new_messages_once(monkeypatch, use_thread):
+    calls = []
+
+    def fake_client(streaming, temperature):
+        async def complete(messages):
+            calls.append(messages)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"summary {len(calls)}"))])
+        return complete
+    monkeypatch.setattr(history, "create_azure_client", fake_client)
+
+    async def run():
+        compactor = HistoryCompactor(verbatim=2, batch=2, max_chats=10)
+        turns = [msg("human" if i % 2 == 0 else "ai", "ok" if i % 2 else f"question {i}") for i in range(6)]
+
+        async def compact(chat_id, history):
+            # acompact must give the same prompt as compact, with the work on a worker thread
+            if use_thread:
+                return await compactor.acompact(chat_id, history)
+            return compactor.compact(chat_id, history)
+
+        # 4 older messages, none summarized yet: all sent verbatim, summary scheduled
+        prompt = await compact("chat", turns)
+        assert "question 0" in prompt
+        await asyncio.gather(*compactor._pending.values())
+        assert compactor.stats()["messages_compacted"] == 4
+
+        # Same history again: the summary replaces the 4 older messages, nothing new is counted
+        prompt = await compact("chat", turns)
+        assert prompt.startswith("Summary of earlier conversation: summary 1")
+        assert "question 0" not in prompt and "question 4" in prompt
+        assert compactor.stats()["messages_compacted"] == 4
+        assert not compactor._pending
+
+        # Two more turns age out and are folded in by a second update
+        turns += [msg("human", "question 6"), msg("ai", "ok")]
+        await compact("chat", turns)
+        await asyncio.gather(*compactor._pending.values())
+        assert compactor.stats()["messages_compacted"] == 6
+        assert len(calls) == 2
+
+    asyncio.run(run())
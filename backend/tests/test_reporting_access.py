@@ -0,0 +1,46 @@
+# tests/test_reporting_access.py
+import asyncio
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.services import token_validation
+from app.services.analytics import analytics_router
+from app.services.export import export_router
+from app.services.token_validation import require_reporting_access
+
+
+@pytest.fixture(autouse=True)
+def allowlist(monkeypatch):
+    monkeypatch.setattr(token_validation.Config, "REPORTING_ALLOWED_ROLES", ["Reports.Read"])
+    monkeypatch.setattr(token_validation.Config, "REPORTING_ALLOWED_USERS", ["admin-oid"])
+
+
+def test_users_without_a_reporting_role_get_403():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(require_reporting_access({"oid": "user-oid", "roles": ["Chat.User"]}))
+    assert error.value.status_code == 403
+    with pytest.raises(HTTPException):
+        asyncio.run(require_reporting_access({"oid": "user-oid"}))
+
+
+def test_allowed_role_or_user_passes():
+    payload = {"oid": "user-oid", "roles": ["Reports.Read"]}
+    assert asyncio.run(require_reporting_access(payload)) is payload
+    assert asyncio.run(require_reporting_access({"oid": "admin-oid"}))["oid"] == "admin-oid"
+
+
+def test_export_route_returns_403_for_an_ordinary_user():
+    app = FastAPI()
+    app.include_router(export_router, prefix="/export", dependencies=[Depends(require_reporting_access)])
+    app.dependency_overrides[token_validation.validate_token] = lambda: {"oid": "user-oid", "roles": []}
+    response = TestClient(app).get("/export/chat_messages")
+    assert response.status_code == 403
+
+
+def test_analytics_routes_return_403_for_an_ordinary_user():
+    app = FastAPI()
+    app.include_router(analytics_router, prefix="/analytics", dependencies=[Depends(require_reporting_access)])
+    app.dependency_overrides[token_validation.validate_token] = lambda: {"oid": "user-oid", "roles": []}
+    client = TestClient(app)
+    assert client.get("/analytics/summary").status_code == 403
+    assert client.get("/analytics/daily").status_code == 403
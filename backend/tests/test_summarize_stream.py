@@ -0,0 +1,65 @@
+# tests/test_summarize_stream.py
+import asyncio
+import io
+import os
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sse_starlette.sse import EventSourceResponse
+from starlette.datastructures import Headers, UploadFile
+from app.conversation_store import ConversationStore, Turn
+from app.services import summarize
+
+
+def upload():
+    return UploadFile(io.BytesIO(b"some text"), filename="notes.txt", headers=Headers({"content-type": "text/plain"}))
+
+
+def test_spooled_upload_is_removed_when_the_stream_never_starts(monkeypatch):
+    spooled = []
+    original = summarize.spool_upload
+
+    async def spool(file):
+        temp_path, file_hash = await original(file)
+        spooled.append(temp_path)
+        return temp_path, file_hash
+    monkeypatch.setattr(summarize, "spool_upload", spool)
+
+    async def scenario():
+        request = SimpleNamespace(headers={})
+        response = await summarize.summarize_file(request, upload(), stream=True, stateless=True, payload={})
+        assert isinstance(response, EventSourceResponse)
+        assert os.path.exists(spooled[0])
+        # Client gone before the body was iterated: only the background task runs
+        await response.background()
+
+    asyncio.run(scenario())
+    assert not os.path.exists(spooled[0])
+
+
+def test_only_the_chat_owner_can_add_a_summary_to_it(monkeypatch):
+    store = ConversationStore(max_chats=10, idle_ttl=60)
+    store.append("chat", "alice", Turn("m1", "user", "hi"))
+    monkeypatch.setattr(summarize, "conversation_store", store)
+    monkeypatch.setattr(summarize, "spool_upload", lambda file: pytest.fail("spooled for another user's chat"))
+    stored = {}
+    monkeypatch.setattr(summarize, "store_retriever", lambda chat_id, retriever: stored.setdefault(chat_id, retriever))
+
+    async def fake_summarize(file, chat_id):
+        return {"output_text": "the summary"}, "retriever"
+    monkeypatch.setattr(summarize, "summarize", fake_summarize)
+    monkeypatch.setattr(summarize, "calculate_tokens", lambda text: 2)
+    request = SimpleNamespace(headers={"Chat-Id": "chat"})
+
+    for stream in (False, True):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(summarize.summarize_file(request, upload(), stream=stream, payload={"oid": "mallory"}))
+        assert error.value.status_code == 404
+    assert stored == {}
+
+    # The owner's summary joins the chat; a new chat id becomes the caller's
+    asyncio.run(summarize.summarize_file(request, upload(), payload={"oid": "alice"}))
+    assert stored == {"chat": "retriever"}
+    assert store.history("chat", "alice")[-1].content == "the summary"
+    asyncio.run(summarize.summarize_file(SimpleNamespace(headers={"Chat-Id": "new"}), upload(), payload={"oid": "bob"}))
+    assert store.owns("new", "bob") and not store.owns("new", "alice")
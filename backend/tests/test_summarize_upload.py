@@ -0,0 +1,59 @@
+# tests/test_summarize_upload.py
+import asyncio
+import pytest
+from langchain_core.documents import Document
+import utils
+from tests.test_vector_index import HashEmbeddings
+
+
+@pytest.fixture
+def upload(monkeypatch, tmp_path):
+    embeddings = HashEmbeddings()
+    monkeypatch.setattr(utils, "get_document_embeddings", lambda: embeddings)
+    monkeypatch.setattr(utils, "get_embedding_cache", lambda: None)
+
+    async def fake_ingest(path, extension, source, vectorstore=None, **kwargs):
+        docs = [Document(page_content=f"{source} page", metadata={"source": source})]
+        chunks = [Document(page_content=f"{source} chunk {i}", metadata={"source": source}) for i in range(3)]
+        if vectorstore is not None:
+            await vectorstore.aadd_documents(chunks)
+        return docs, chunks
+    monkeypatch.setattr(utils, "ingest_file", fake_ingest)
+
+    def run(name, chat_id="chat"):
+        path = tmp_path / name
+        path.write_text("content")
+        return asyncio.run(utils.summarize_upload(str(path), "hash-" + name, name, chat_id))
+    return run
+
+
+def test_failed_summary_leaves_the_chat_index_untouched_and_retry_indexes_once(upload, monkeypatch):
+    monkeypatch.setattr(utils.summarizer, "summarize", _summary("ok"))
+    _, retriever = upload("a.txt")
+    utils.store_retriever("chat", retriever)
+    assert len(retriever.vectorstore) == 3
+
+    monkeypatch.setattr(utils.summarizer, "summarize", _failing_summary)
+    with pytest.raises(RuntimeError):
+        upload("b.txt")
+    assert len(utils.get_retriever("chat").vectorstore) == 3
+    assert [doc.metadata["source"] for doc in utils.get_documents("chat")] == ["a.txt"]
+
+    monkeypatch.setattr(utils.summarizer, "summarize", _summary("ok"))
+    upload("b.txt")
+    upload("b.txt")
+    assert len(utils.get_retriever("chat").vectorstore) == 6
+    assert [doc.metadata["source"] for doc in utils.get_documents("chat")] == ["a.txt", "b.txt"]
+    assert utils.get_retriever("chat").vectorstore.similarity_search("b.txt chunk 1", k=1)[0].page_content == "b.txt chunk 1"
+    utils.delete_retriever("chat")
+    utils.delete_documents("chat")
+
+
+def _summary(text):
+    async def summarize(docs, on_progress=None, on_token=None):
+        return text
+    return summarize
+
+
+async def _failing_summary(docs, on_progress=None, on_token=None):
+    raise RuntimeError("completion failed")
@@ -0,0 +1,31 @@
+# tests/test_summarizer.py
+import asyncio
+from types import SimpleNamespace
+from langchain_core.documents import Document
+import utils
+from app import embedding_cache, summarizer
+from config import Config
+
+
+def test_summaries_use_the_shared_client_and_their_own_cache_flag(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_client(streaming=False, temperature=0.7, timeout=None):
+        async def complete(messages, **kwargs):
+            calls.append(messages)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" short summary "))])
+        return complete
+
+    monkeypatch.setattr(utils, "create_azure_client", fake_client)
+    monkeypatch.setattr(summarizer, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(Config, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "SUMMARY_CACHE_ENABLED", True)
+    monkeypatch.setattr(Config, "EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    docs = [Document(page_content="A short page.", metadata={"source": "a.txt"})]
+
+    assert asyncio.run(summarizer.Summarizer().summarize(docs)) == "short summary"
+    assert embedding_cache.get_embedding_cache() is None
+    # A second worker (fresh in-process cache) finds the summary on disk
+    assert asyncio.run(summarizer.Summarizer().summarize(docs)) == "short summary"
+    assert len(calls) == 1
@@ -0,0 +1,92 @@
+# tests/test_vector_index.py
+import threading
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from app.vector_index import DTYPES, NumpyVectorStore
+
+
+class HashEmbeddings(Embeddings):
+    # Deterministic pseudo-random unit vectors per text
+    def __init__(self, dim=32):
+        self.dim = dim
+
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        return rng.standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_top_k_finds_the_query_itself_first(dtype):
+    texts = [f"chunk {i}" for i in range(200)]
+    store = NumpyVectorStore.from_texts(texts, HashEmbeddings(), dtype=dtype)
+    for text in ("chunk 0", "chunk 77", "chunk 199"):
+        hits = store.similarity_search_with_score(text, k=5)
+        assert len(hits) == 5
+        assert hits[0][0].page_content == text
+        assert hits[0][1] == pytest.approx(1.0, abs=0.02)
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_vectors_returned_for_rerank_are_unit_length(dtype):
+    store = NumpyVectorStore.from_texts([f"t{i}" for i in range(10)], HashEmbeddings(), dtype=dtype)
+    hits = store.similarity_search_with_vectors_by_vector(HashEmbeddings().embed_query("t3"), k=3)
+    assert hits[0][0].page_content == "t3"
+    for _, _, vector in hits:
+        assert np.linalg.norm(vector) == pytest.approx(1.0, abs=0.02)
+
+
+def test_empty_store_and_k_larger_than_size():
+    store = NumpyVectorStore(HashEmbeddings(), dtype="float32")
+    assert store.similarity_search("anything") == []
+    assert store.similarity_search_with_vectors_by_vector(HashEmbeddings().embed_query("x"), k=3) == []
+    store.add_texts(["a", "b"])
+    assert len(store.similarity_search("a", k=10)) == 2
+
+
+def test_dimension_mismatch_is_rejected():
+    store = NumpyVectorStore(HashEmbeddings(dim=8), dtype="float32")
+    store.add_texts(["a"])
+    with pytest.raises(ValueError):
+        store.add_vectors(np.ones((1, 4)), ["b"])
+
+
+def test_concurrent_appends_keep_every_row():
+    store = NumpyVectorStore(HashEmbeddings(), dtype="int8", initial_capacity=1)
+    embeddings = HashEmbeddings()
+
+    def upload(worker):
+        for batch in range(20):
+            texts = [f"w{worker} b{batch} c{i}" for i in range(5)]
+            store.add_vectors(np.asarray(embeddings.embed_documents(texts)), texts)
+
+    threads = [threading.Thread(target=upload, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == 4 * 20 * 5
+    assert len(set(store._texts)) == len(store)
+    for text in ("w0 b0 c0", "w3 b19 c4", "w2 b7 c1"):
+        assert store.similarity_search(text, k=1)[0].page_content == text
+
+
+def test_merge_from_copies_rows_without_reembedding(monkeypatch):
+    embeddings = HashEmbeddings()
+    target = NumpyVectorStore(embeddings, dtype="float16")
+    staging = NumpyVectorStore(embeddings, dtype="float32")
+    target.add_texts(["alpha"])
+    staging.add_texts(["beta", "gamma"])
+    monkeypatch.setattr(embeddings, "embed_documents", lambda texts: pytest.fail("merge re-embedded"))
+    target.merge_from(staging)
+    assert len(target) == 3
+    assert target.similarity_search("gamma", k=1)[0].page_content == "gamma"
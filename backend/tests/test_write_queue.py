@@ -0,0 +1,89 @@
+# tests/test_write_queue.py
+import asyncio
+from mysql.connector import errors
+from app.write_queue import WriteBehindQueue
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def executemany(self, statement, rows):
+        for values in rows:
+            if values[0] in self.db.bad_ids:
+                raise errors.IntegrityError(msg="bad row", errno=1452)
+        self.db.pending.extend(values[0] for values in rows)
+
+    def execute(self, statement, values=None):
+        # Rollup upserts: recorded with the ids they count
+        self.db.rollups.append(values)
+
+
+class FakeDatabase:
+    def __init__(self, bad_ids=(), failures=()):
+        self.bad_ids = set(bad_ids)
+        self.failures = list(failures)  # errors raised by the next transactions, before any work
+        self.written = []
+        self.rollups = []
+        self.transactions = 0
+
+    async def run_in_transaction(self, work):
+        self.transactions += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        self.pending = []
+        work(FakeCursor(self))
+        self.written.extend(self.pending)
+
+
+def flush(db, batch):
+    # Flushes one batch directly, without the background worker
+    async def run():
+        queue = WriteBehindQueue(db, max_size=100, batch_size=10, flush_interval=0.01)
+        await queue._flush(batch)
+        return queue
+    return asyncio.run(run())
+
+
+def test_bad_row_is_dead_lettered_and_the_rest_written():
+    db = FakeDatabase(bad_ids={"m2"})
+    batch = [("chat_message", ("m1",)), ("chat_message", ("m2",)), ("price", ("p1",))]
+    queue = flush(db, batch)
+    assert db.written == ["m1", "p1"]
+    assert [letter[1][0] for letter in queue.dead_letters] == ["m2"]
+    assert queue.stats()["failed_rows"] == 1
+    assert queue.stats()["flushed_rows"] == 2
+
+
+def test_lost_connection_is_retried_as_a_batch():
+    db = FakeDatabase(failures=[errors.OperationalError(msg="Lost connection", errno=2013)])
+    queue = flush(db, [("chat_message", ("m1",)), ("price", ("p1",))])
+    assert db.written == ["m1", "p1"]
+    assert db.transactions == 2
+    assert queue.stats()["retries"] == 1
+    assert queue.stats()["row_fallbacks"] == 0
+    # Messages and prices of the batch go into the rollup as a single upsert
+    assert db.rollups == [("m1", "p1")]
+
+
+def test_deadlock_is_not_retried_again_by_the_queue():
+    # A deadlock reaching the queue has already used up the transaction's own retries
+    db = FakeDatabase(failures=[errors.InternalError(msg="Deadlock found", errno=1213)])
+    queue = flush(db, [("chat_message", ("m1",)), ("price", ("p1",))])
+    assert queue.stats()["retries"] == 0
+    assert queue.stats()["row_fallbacks"] == 1
+    assert db.written == ["m1", "p1"]
+
+
+def test_wait_for_message_returns_once_flushed():
+
+    async def run():
+        queue = WriteBehindQueue(FakeDatabase(), max_size=100, batch_size=10, flush_interval=0.01)
+        await queue.start()
+        await queue.enqueue("chat_message", ("m1",))
+        assert "m1" in queue._pending_messages
+        assert await queue.wait_for_message("m1", timeout=1)
+        assert "m1" not in queue._pending_messages
+        await queue.stop()
+
+    asyncio.run(run())
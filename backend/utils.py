@@ -1,76 +1,58 @@
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain_core.prompts.prompt import PromptTemplate
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings, ChatOpenAI, OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
-import json
-import tempfile
+# langchain_openai, pypdf and the text splitters are imported where they are used, so
+# importing this module (and with it the app) stays fast
+import asyncio
 import io, os, logging
-from pypdf import PdfReader
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import DocArrayInMemorySearch
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
-from typing import List
-from langchain.chains.summarize import load_summarize_chain
+from langchain_core.documents import Document
+from typing import List, Optional
 from config import Config
-import tiktoken
-import xml.etree.ElementTree as ET
-from openai import AsyncAzureOpenAI
-from app.database import Database
+from app.openai_client import get_client
+from app.token_accounting import count_tokens
+from app.session_store import session_store
+from app.embedding_cache import CachedEmbeddings, get_embedding_cache
+from app.ingestion import SUPPORTED_EXTENSIONS, ingest_file, spool_upload
+from app.vector_index import NumpyVectorStore
+from app.summarizer import summarizer
 
 logger = logging.getLogger(__name__)
 
 
-# In-memory store for retrievers (can be replaced with Redis)
-retriever_store = {}
-
+# Bounded in-memory store for per-chat retrievers and documents (LRU + idle TTL + memory ceiling)
 def store_retriever(chat_id: str, retriever):
-    retriever_store[chat_id] = retriever
+    session_store.set_retriever(chat_id, retriever)
 
 def get_retriever(chat_id: str):
-    return retriever_store.get(chat_id)
+    return session_store.get_retriever(chat_id)
 
 def delete_retriever(chat_id: str):
-    if chat_id in retriever_store:
-        del retriever_store[chat_id]
-
-# Store and retrieve documents (in-memory, can be replaced with Redis)
-document_store = {}
+    session_store.delete_retriever(chat_id)
 
 def store_documents(chat_id: str, new_documents):
-    if chat_id in document_store:
-        document_store[chat_id] += new_documents
-    else:
-        document_store[chat_id] = new_documents
+    session_store.add_documents(chat_id, new_documents)
 
 def get_documents(chat_id: str):
-    return document_store.get(chat_id, [])
+    return session_store.get_documents(chat_id)
 
 def delete_documents(chat_id: str):
-    if chat_id in document_store:
-        del document_store[chat_id]
+    session_store.delete_documents(chat_id)
 
 
 def calculate_tokens(text):
-    encoding = tiktoken.get_encoding('cl100k_base')
-    return len(encoding.encode(text))
-
-def create_azure_client(streaming: bool = False, temperature: float = 0.7):
-    client = AsyncAzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_API_ENDPOINT")
-    )
+    # Uses the process-wide cached encoder
+    return count_tokens(text)
+
+def create_azure_client(streaming: bool = False, temperature: float = 0.7, timeout: Optional[float] = None):
+    # Reuse the process-wide client (and its connection pool) instead of opening a new one per call
+    client = get_client()
     
     # Error handling during the request
     async def create_chat_completion(messages: List[dict], **kwargs):
+        # Per-call timeout, falling back to the one configured on the shared client
+        if timeout is not None:
+            kwargs.setdefault("timeout", timeout)
         try:
             # Handle streaming mode based on the flag
             return await client.chat.completions.create(
-                model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+                model=Config.AZURE_OPENAI_DEPLOYMENT_NAME,
                 messages=messages,
                 stream=streaming,
                 temperature=temperature, 
@@ -83,11 +65,13 @@ def create_azure_client(streaming: bool = False, temperature: float = 0.7):
     return create_chat_completion
 
 
-def create_embeddings_model() -> OpenAIEmbeddings:
+def create_embeddings_model():
+    from langchain_openai import OpenAIEmbeddings
     embeddings = OpenAIEmbeddings(model=Config.OPENAI_EMBEDDINGS_MODEL, dimensions=1000)
     return embeddings
 
-def create_azure_embeddings() -> AzureOpenAIEmbeddings:
+def create_azure_embeddings():
+    from langchain_openai import AzureOpenAIEmbeddings
     embeddings = AzureOpenAIEmbeddings(
         azure_endpoint=Config.AZURE_OPENAI_API_ENDPOINT,
         azure_deployment=Config.AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME,
@@ -97,83 +81,120 @@ def create_azure_embeddings() -> AzureOpenAIEmbeddings:
     )
     return embeddings
 
+_document_embeddings = None
+
+def get_document_embeddings():
+    # Process-wide embeddings client, wrapped with the content-hash cache when it is enabled
+    global _document_embeddings
+    if _document_embeddings is None:
+        embeddings = create_azure_embeddings()
+        cache = get_embedding_cache()
+        if cache is not None:
+            embeddings = CachedEmbeddings(embeddings, Config.AZURE_OPENAI_EMBEDDINGS_MODEL_NAME, cache)
+        _document_embeddings = embeddings
+    return _document_embeddings
+
 def get_docs_from_bytes(data: bytes) -> List[Document]:
+    from pypdf import PdfReader
     reader = PdfReader(io.BytesIO(initial_bytes=data))
     docs = [Document(page_content=page.extract_text(), page_number=index + 1) for index, page in enumerate(reader.pages)]
     return docs
 
 def split_docs_from_docs(docs: List[Document], chunk_size: int = 2000, chunk_overlap: int = 500) -> List[Document]:
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    # start_index lets the context builder merge overlapping neighbours back together
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, add_start_index=True)
     return text_splitter.split_documents(docs)
 
-def create_embeddings(docs: List[Document]) -> DocArrayInMemorySearch:
-    return DocArrayInMemorySearch.from_documents(documents=docs, embedding=create_azure_embeddings())
+def create_embeddings(docs: List[Document]) -> NumpyVectorStore:
+    return NumpyVectorStore.from_documents(documents=docs, embedding=get_document_embeddings())
 
 def get_retriever_from_docs(docs: List[Document], chunk_size: int = 2000, chunk_overlap: int = 200):
-    llm = create_azure_client(temperature=0.0)
     split_docs = split_docs_from_docs(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return get_retriever_from_chunks(split_docs)
+
+def get_retriever_from_chunks(split_docs: List[Document]):
     vector_store = create_embeddings(split_docs)
     db_retriever = vector_store.as_retriever(search_kwargs={"k": 20})
 
     return db_retriever
 
-def summarize(file, chat_id): 
-    file_name = file.filename
+def append_docs_to_retriever(retriever, docs: List[Document], chunk_size: int = 2000, chunk_overlap: int = 200):
+    split_docs = split_docs_from_docs(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return append_chunks_to_retriever(retriever, split_docs)
+
+def append_chunks_to_retriever(retriever, split_docs: List[Document]):
+    # Embed only the new chunks; vectors already in the index are reused as-is
+    retriever.vectorstore.add_documents(split_docs)
+    return retriever
+
+async def summarize(file, chat_id: Optional[str] = None):
+    # Stream the upload to disk in blocks; the hash is computed on the way for the file cache
+    temp_path, file_hash = await spool_upload(file)
+    return await summarize_upload(temp_path, file_hash, file.filename, chat_id)
+
+async def summarize_upload(temp_path: str, file_hash: str, file_name: str, chat_id: Optional[str] = None, on_progress=None, on_token=None):
+    # Summarizes an upload already spooled to temp_path, which is removed afterwards. With a
+    # chat_id the documents join the chat's stores and index; without one the call is
+    # stateless and nothing is embedded or kept. on_progress(stage, done, total) and
+    # on_token(text) let callers stream progress and the summary as it is generated.
     logger.info("summarize function: %s", file_name) 
     extension = os.path.splitext(file_name)[1]
     logger.info("extension: %s", extension)
-    
-    llm = AzureChatOpenAI(
-        azure_endpoint=Config.AZURE_OPENAI_API_ENDPOINT,
-        api_key=Config.AZURE_OPENAI_API_KEY,
-        model=Config.AZURE_OPENAI_MODEL_NAME,
-        azure_deployment=Config.AZURE_OPENAI_DEPLOYMENT_NAME,
-        api_version=Config.AZURE_OPENAI_API_VERSION,
-        temperature=0.7
-    )
-
-    with tempfile.NamedTemporaryFile(delete=False) as temp:      
-        temp.write(file.file.read())      
-        temp.flush()
-        temp_path = temp.name
-    temp.close()
-
-   # Process based on file type
-    if extension == '.pdf':
-        loader = PyPDFLoader(temp_path)
-        docs = loader.load_and_split()
-    elif extension == '.docx':
-        loader = Docx2txtLoader(temp_path)
-        docs = loader.load_and_split()
-    elif extension == '.txt' or extension == '.md':
-        with open(temp_path, 'r') as f:
-            content = f.read()
-        docs = [Document(page_content=content)]
-    elif extension == '.json':
-        with open(temp_path, 'r') as f:
-            json_content = json.load(f)
-        content = json.dumps(json_content, indent=2)  # Convert JSON to readable string
-        docs = [Document(page_content=content)]
-    elif extension == '.xml':
-        tree = ET.parse(temp_path)
-        root = tree.getroot()
-        content = ET.tostring(root, encoding='unicode')  # Convert XML to string
-        docs = [Document(page_content=content)]
+    loop = asyncio.get_running_loop()
+    retriever = None
+    file_key = f"{file_hash}{extension}"
+    try:
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValueError("Unsupported file type")
+
+        # The chat's index. If it was evicted but the chat still has documents, those are
+        # re-indexed into a new one first (not live until the caller stores it).
+        if chat_id:
+            retriever = get_retriever(chat_id)
+            if retriever is None:
+                retriever = NumpyVectorStore(get_document_embeddings()).as_retriever(search_kwargs={"k": 20})
+                existing_docs = get_documents(chat_id)
+                if existing_docs:
+                    existing_chunks = await loop.run_in_executor(None, split_docs_from_docs, existing_docs, 2000, 200)
+                    await retriever.vectorstore.aadd_documents(existing_chunks)
+
+        # New chunks are embedded into a staging index and only appended to the chat's index once
+        # the whole upload has succeeded, so a failure or cancellation never leaves a half-indexed
+        # document behind and a retry does not index it twice
+        already_indexed = retriever is not None and file_key in retriever.vectorstore.indexed_files
+        staging = NumpyVectorStore(get_document_embeddings(), dtype="float32") if retriever is not None and not already_indexed else None
+
+        # Identical files (same bytes and type) are parsed and split only once across all chats
+        cache = get_embedding_cache()
+        cached = await loop.run_in_executor(None, cache.get_file, file_key) if cache is not None else None
+        if cached is not None:
+            logger.info("File %s already processed, reusing parsed chunks", file_name)
+            docs, split_docs = cached
+            if staging is not None:
+                await staging.aadd_documents(split_docs)
+        else:
+            docs, split_docs = await ingest_file(temp_path, extension, file_name, staging, chunk_size=2000, chunk_overlap=200, on_progress=on_progress)
+            if cache is not None:
+                await loop.run_in_executor(None, cache.put_file, file_key, docs, split_docs)
+    finally:
+        os.remove(temp_path)
+
+    if chat_id:
+        existing_docs = get_documents(chat_id)
+        combined_docs = existing_docs if already_indexed else existing_docs + docs
     else:
-        raise ValueError("Unsupported file type")
-
-    os.remove(temp_path)
+        combined_docs = docs
 
-     # Combine with existing documents for the chat_id
-    existing_docs = get_documents(chat_id)
-    combined_docs = existing_docs + docs
-    store_documents(chat_id, docs)  # Update document store with new docs
+    # Per-document summaries are cached by content hash; only the new file costs map calls
+    result = {"output_text": await summarizer.summarize(combined_docs, on_progress, on_token)}
 
-    # Create retriever from combined documents
-    retriever = get_retriever_from_docs(combined_docs)
-
-    chain = load_summarize_chain(llm, chain_type="stuff")
-    result = chain.invoke(combined_docs)
+    # Commit the upload: staged vectors join the chat's index (no re-embedding) and the
+    # documents join its store, with no await in between
+    if staging is not None:
+        retriever.vectorstore.merge_from(staging)
+        retriever.vectorstore.indexed_files.add(file_key)
+        store_documents(chat_id, docs)
 
     logger.info("#############################")
     logger.info("result : %s", result)
@@ -181,49 +202,3 @@ def summarize(file, chat_id):
     logger.info("#############################")
 
     return result, retriever
-
-
-
-# New function to classify the message category using LLM (non-streaming)
-async def classify_message_category(user_message: str, message_id: str, db: Database):
-    try:
-        logger.info("Classifying message category for message: %s", user_message)
-
-       # Construct the prompt for message category classification
-        classification_prompt = f"""
-        Classify the following message into one of the following categories:
-        - Text Summarization
-        - Creative Content Generation
-        - Language Translation
-        - Technical Dialogue
-        - General Knowledge
-
-        Return only the category name without any numbering or punctuation.
-
-        Message: {user_message}
-        """
-        
-        # Initialize non-streaming Azure OpenAI client
-        classify_completion = create_azure_client(streaming=False)
-        messages = [
-            {"role": "system", "content": "Classify the message into one of the predefined categories."},
-            {"role": "user", "content": classification_prompt}
-        ]
-        
-        # Call the LLM for classification
-        response = await classify_completion(messages=messages)
-
-        # Extract classification result
-        if response and response.choices:
-            category = response.choices[0].message.content.strip()
-
-            # Update the chat_messages table with the category
-            db.execute_query("""
-                UPDATE Chat_Messages
-                SET category = %s
-                WHERE message_id = %s
-            """, (category, message_id))
-            logger.info("Message categorized as: %s", category)
-
-    except Exception as e:
-        logger.error(f"Error classifying message category: {str(e)}")
\ No newline at end of file